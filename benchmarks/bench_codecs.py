@@ -0,0 +1,170 @@
+from itertools import cycle
+
+from buidl.bech32 import decode_bech32, encode_bech32_checksum, encode_segwit_addresses
+from buidl.descriptor import calc_core_checksum
+from buidl.hd import HDPrivateKey, HDPublicKey, XPUB
+from buidl.helper import (
+    decode_base58,
+    decode_gcs,
+    encode_base58_checksum,
+    encode_base58_many,
+    encode_gcs,
+    hash256,
+    raw_decode_base58,
+    sha256,
+)
+from buidl.mnemonic import mnemonic_to_seed
+from buidl.shamir import ShareSet
+
+from benchmarks.bench_hd import p2wsh_sorted_multi
+from benchmarks.runner import benchmark
+
+
+# how many items are in the compact block filter
+NUM_GCS_ITEMS = 1000
+
+
+@benchmark("codec.base58_encode", ecc=False)
+def codec_base58_encode():
+    raw = b"\x6f" + hash256(b"buidl")[:20]
+
+    def run():
+        encode_base58_checksum(raw)
+
+    return run
+
+
+# more strings than HDPublicKey.parse caches, so none of them are cached
+NUM_BASE58_STRINGS = 2048
+
+
+@benchmark("codec.base58_decode", ecc=False)
+def codec_base58_decode():
+    addresses = cycle(
+        encode_base58_checksum(b"\x6f" + hash256(i.to_bytes(2, "big"))[:20])
+        for i in range(NUM_BASE58_STRINGS)
+    )
+
+    def run():
+        decode_base58(next(addresses))
+
+    return run
+
+
+def xpub_strings():
+    # the same layout as an xpub: version, depth, parent fingerprint,
+    # child number, chain code and sec
+    strings = []
+    for i in range(NUM_BASE58_STRINGS):
+        chain_code = hash256(i.to_bytes(2, "big"))
+        sec = b"\x02" + hash256(chain_code)
+        raw = XPUB["mainnet"] + bytes(9) + chain_code + sec
+        strings.append(encode_base58_checksum(raw))
+    return strings
+
+
+@benchmark("codec.base58_decode_xpub", ecc=False)
+def codec_base58_decode_xpub():
+    strings = cycle(xpub_strings())
+
+    def run():
+        raw_decode_base58(next(strings))
+
+    return run
+
+
+@benchmark("codec.xpub_parse_cached")
+def codec_xpub_parse_cached():
+    """The same xpub over and over, like the cosigners of a descriptor"""
+    xpub = HDPrivateKey.from_seed(b"buidl").xpub()
+
+    def run():
+        HDPublicKey.parse(xpub)
+
+    return run
+
+
+@benchmark("codec.base58_encode_many", ecc=False)
+def codec_base58_encode_many():
+    """100 p2pkh addresses"""
+    raws = [b"\x00" + hash256(bytes([i]))[:20] for i in range(100)]
+
+    def run():
+        encode_base58_many(raws)
+
+    return run
+
+
+@benchmark("codec.bech32_encode", ecc=False)
+def codec_bech32_encode():
+    # p2wsh witness program
+    witness_program = b"\x00\x20" + sha256(b"buidl")
+
+    def run():
+        encode_bech32_checksum(witness_program, network="testnet")
+
+    return run
+
+
+@benchmark("codec.bech32_decode", ecc=False)
+def codec_bech32_decode():
+    address = encode_bech32_checksum(b"\x00\x20" + sha256(b"buidl"), "testnet")
+
+    def run():
+        decode_bech32(address)
+
+    return run
+
+
+@benchmark("codec.bech32_encode_many", ecc=False)
+def codec_bech32_encode_many():
+    """100 p2wpkh addresses"""
+    scripts = [b"\x00\x14" + hash256(bytes([i]))[:20] for i in range(100)]
+
+    def run():
+        encode_segwit_addresses(scripts, network="testnet")
+
+    return run
+
+
+@benchmark("codec.descriptor_checksum", ecc=False)
+def codec_descriptor_checksum():
+    descriptor = repr(p2wsh_sorted_multi()).split("#")[0]
+
+    def run():
+        calc_core_checksum(descriptor)
+
+    return run
+
+
+@benchmark("codec.gcs_decode", ecc=False)
+def codec_gcs_decode():
+    key = hash256(b"block")[:16]
+    items = [hash256(i.to_bytes(4, "little")) for i in range(NUM_GCS_ITEMS)]
+    gcs = encode_gcs(key, items)
+
+    def run():
+        decode_gcs(key, gcs)
+
+    return run
+
+
+@benchmark("shamir.recover", ecc=False)
+def shamir_recover():
+    mnemonic = " ".join(["abandon"] * 11 + ["about"])
+    shares = ShareSet.generate_shares(mnemonic, 2, 3)
+
+    def run():
+        ShareSet.recover_mnemonic(shares[1:])
+
+    return run
+
+
+@benchmark("mnemonic.seed", ecc=False)
+def mnemonic_seed():
+    mnemonic = " ".join(["abandon"] * 11 + ["about"])
+
+    def run():
+        mnemonic_to_seed(mnemonic, b"TREZOR")
+
+    return run
@@ -0,0 +1,69 @@
+from itertools import cycle
+
+from buidl.ecc import PrivateKey, S256Point, verify_batch
+from buidl.helper import hash256
+
+from benchmarks.runner import benchmark
+
+
+# secrets spread out over the whole range so the timings aren't flattered
+SECRETS = [int.from_bytes(hash256(bytes([i])), "big") for i in range(16)]
+
+
+@benchmark("ecc.private_key")
+def ecc_private_key():
+    secrets = cycle(SECRETS)
+
+    def run():
+        PrivateKey(next(secrets)).point.sec()
+
+    return run
+
+
+@benchmark("ecc.sign")
+def ecc_sign():
+    private_key = PrivateKey(SECRETS[0])
+    zs = cycle(SECRETS)
+
+    def run():
+        private_key.sign(next(zs))
+
+    return run
+
+
+@benchmark("ecc.verify")
+def ecc_verify():
+    private_key = PrivateKey(SECRETS[0])
+    sec = private_key.point.sec()
+    sigs = [(z, private_key.sign(z)) for z in SECRETS]
+    signed = cycle(sigs)
+
+    def run():
+        z, sig = next(signed)
+        # parse every time so nothing is cached on the point
+        S256Point.parse(sec).verify(z, sig)
+
+    return run
+
+
+@benchmark("ecc.point_mul")
+def ecc_point_mul():
+    point = PrivateKey(SECRETS[1]).point
+    secrets = cycle(SECRETS)
+
+    def run():
+        next(secrets) * point
+
+    return run
+
+
+@benchmark("ecc.verify_batch")
+def ecc_verify_batch():
+    """100 signatures from 10 keys, like the inputs of a few multisig txs"""
+    keys = [PrivateKey(secret) for secret in SECRETS[:10]]
+    items = [(key.point, z, key.sign(z)) for key in keys for z in SECRETS[:10]]
+
+    def run():
+        verify_batch(items)
+
+    return run
@@ -0,0 +1,130 @@
+from itertools import count
+
+from buidl import hd
+from buidl.descriptor import P2WSHSortedMulti
+from buidl.hd import HDPrivateKey, HDPublicKey
+from buidl.helper import LRUCache
+
+from benchmarks.runner import benchmark
+
+
+ACCOUNT_PATH = "m/48h/1h/0h/2h"
+
+
+def hd_priv(seed_byte):
+    return HDPrivateKey.from_seed(bytes([seed_byte]) * 32, network="testnet")
+
+
+@benchmark("hd.public_child")
+def hd_public_child():
+    xpub = hd_priv(1).traverse(ACCOUNT_PATH).xpub()
+
+    def run():
+        # parse every time so nothing is cached on the object
+        HDPublicKey.parse(xpub).child(0).child(7)
+
+    return run
+
+
+@benchmark("hd.private_child")
+def hd_private_child():
+    xprv = hd_priv(1).xprv()
+
+    def run():
+        HDPrivateKey.parse(xprv).child(0x80000000)
+
+    return run
+
+
+@benchmark("hd.traverse")
+def hd_traverse():
+    xprv = hd_priv(1).xprv()
+
+    def run():
+        HDPrivateKey.parse(xprv).traverse(ACCOUNT_PATH + "/0/7")
+
+    return run
+
+
+# how many children the range benchmarks derive
+RANGE_SIZE = 1000
+
+
+@benchmark("hd.child_loop")
+def hd_child_loop():
+    """What derive_range replaces"""
+    xpub = hd_priv(1).traverse(ACCOUNT_PATH + "/0").xpub()
+
+    def run():
+        node = HDPublicKey.parse(xpub)
+        for i in range(RANGE_SIZE):
+            child = node.child(i)
+            child.sec(), child.hash160()
+
+    return run
+
+
+@benchmark("hd.derive_range")
+def hd_derive_range():
+    xpub = hd_priv(1).traverse(ACCOUNT_PATH + "/0").xpub()
+
+    def run():
+        for _ in HDPublicKey.parse(xpub).derive_range(0, RANGE_SIZE):
+            pass
+
+    return run
+
+
+def p2wsh_sorted_multi():
+    key_records = []
+    for seed_byte in (1, 2, 3):
+        root = hd_priv(seed_byte)
+        key_records.append(
+            {
+                "xfp": root.fingerprint().hex(),
+                "path": ACCOUNT_PATH,
+                "xpub_parent": root.traverse(ACCOUNT_PATH).xpub(),
+                "account_index": 0,
+            }
+        )
+    return P2WSHSortedMulti(quorum_m=2, key_records=key_records)
+
+
+@benchmark("descriptor.get_address")
+def descriptor_get_address():
+    descriptor = p2wsh_sorted_multi()
+
+    def run():
+        descriptor.get_address(offset=7)
+
+    return run
+
+
+@benchmark("descriptor.get_address_cached")
+def descriptor_get_address_cached():
+    """A new address each time, the account nodes come from the cache"""
+    descriptor = p2wsh_sorted_multi()
+    offsets = count()
+    cache = LRUCache(1024)
+
+    def run():
+        # only this benchmark uses the cache
+        hd._derivation_cache = cache
+        try:
+            descriptor.get_address(offset=next(offsets))
+        finally:
+            hd._derivation_cache = None
+
+    return run
+
+
+@benchmark("descriptor.get_addresses")
+def descriptor_get_addresses():
+    """25 receive addresses, what multiwallet's validate_address shows"""
+    descriptor = repr(p2wsh_sorted_multi())
+
+    def run():
+        # parse every time so nothing is cached on the object
+        P2WSHSortedMulti.parse(descriptor).get_addresses(start=0, count=25)
+
+    return run
@@ -0,0 +1,33 @@
+from buidl.hd import HDPrivateKey
+from buidl.psbt import PSBT
+
+from benchmarks.runner import benchmark
+
+
+# unsigned 1-of-2 p2sh multisig PSBT from test_psbt_helper.py
+PSBT_B64 = "cHNidP8BAFUBAAAAAdqnfIGkXTXKLaTGZ2BD7mDxrJqeNQpKeLsBTWan0hJEAAAAAAD/////AUxADwAAAAAAGXapFDRKD0jKFQ7CuQOBdmC5tosTpnAmiKwAAAAATwEENYfPAheO+c4AAAAALjD5unTcevzcKaWlkg/+xoU+FD5bJ+iltDa2WE1bTngCfSOd3kkScA1e4OGM3MJ/Oqg+nxEHlwuV7YBCuoT745YMg48/+S0AAIAAAAAATwEENYfPAuBIVlUAAAAAHnpWPWgBnfWu2tzv9Ujws27ps0hOBHMQbZlpQ6c5m4MDN4/ffnc3ejfVlqkEgG7tlPX4aTS92pfU5LAvGDQQKHoM4MWVxS0AAIAAAAAAAAEA4AIAAAAAAQE4C/+dtnbRWa00hJB5x34NXB35yEG2pmQMupv8FQd+6gEAAAAA/v///wIAgxIAAAAAABepFNlrucWIj0c9vQd9dwCftJui/aJCh2EckqABAAAAF6kUhyLwf7zw/FBupLqdqoEdETlrvP2HAkcwRAIgL+PC8Y4UhkB78Lqr0rM3YQLwhEp1TY4vuN5xs5s/dscCIAwf6Pf571Flkp7VG/dU7dfdPlkZIZec9biRyEGh/RnYASEDfI/h+hrk3/9SLFMpF8c8SIRGnjtqKE6aA57GEtynju/SnB4AAQRHUSECE59xZ/F9qU0k32/ihozbXtq9DP+Dq0h8lC6i8HVw2fAhAjy3HGmZkHaMAY3xejZsTrdL3hafKeiEJhwQyXPsJq06Uq4iBgITn3Fn8X2pTSTfb+KGjNte2r0M/4OrSHyULqLwdXDZ8BSDjz/5LQAAgAAAAAAAAAAAAAAAACIGAjy3HGmZkHaMAY3xejZsTrdL3hafKeiEJhwQyXPsJq06FODFlcUtAACAAAAAAAAAAAAAAAAAAAA="
+SIGNER_MNEMONIC = "action " * 12
+SIGNER_PATH = "m/45'/0/0/0"
+
+
+@benchmark("psbt.parse")
+def psbt_parse():
+    def run():
+        PSBT.parse_base64(PSBT_B64)
+
+    return run
+
+
+@benchmark("psbt.sign_finalize")
+def psbt_sign_finalize():
+    hd_priv = HDPrivateKey.from_mnemonic(SIGNER_MNEMONIC, network="testnet")
+    private_keys = [hd_priv.traverse(SIGNER_PATH).private_key]
+
+    def run():
+        psbt_obj = PSBT.parse_base64(PSBT_B64)
+        if not psbt_obj.sign_with_private_keys(private_keys):
+            raise RuntimeError("could not sign the PSBT")
+        psbt_obj.finalize()
+        psbt_obj.final_tx().serialize()
+
+    return run
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+from os.path import dirname, realpath
+
+from benchmarks.runner import benchmark
+
+
+ROOT = dirname(dirname(realpath(__file__)))
+
+
+def startup_benchmark(code):
+    """Times a fresh interpreter running code from the repository root,
+    with the same ecc backend as this process"""
+
+    def setup():
+        from buidl.ecc import S256Point
+
+        prefix = ""
+        if S256Point.__module__ == "buidl.pecc":
+            prefix = "import sys; sys.modules['buidl.cecc'] = None; "
+        command = [sys.executable, "-c", prefix + code]
+
+        def run():
+            subprocess.run(command, cwd=ROOT, check=True)
+
+        return run
+
+    return setup
+
+
+# the interpreter's own startup, to compare the others against
+benchmark("startup.python", ecc=False)(startup_benchmark("pass"))
+benchmark("startup.import_buidl")(startup_benchmark("import buidl"))
+benchmark("startup.multiwallet")(startup_benchmark("import multiwallet"))
+benchmark("startup.singlesweep")(startup_benchmark("import singlesweep"))
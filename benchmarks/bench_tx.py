@@ -0,0 +1,161 @@
+from io import BytesIO
+from os.path import dirname, join, realpath
+
+from buidl.ecc import PrivateKey
+from buidl.helper import hash160, hash256
+from buidl.script import P2PKHScriptPubKey, P2WPKHScriptPubKey
+from buidl.tx import Tx, TxFetcher, TxIn, TxOut
+
+from benchmarks.runner import benchmark
+
+
+CACHE_FILE = join(dirname(dirname(realpath(__file__))), "buidl", "test", "tx.cache")
+
+# transactions from the tests whose previous outputs are in the cache
+VERIFY_TXS = {
+    "p2pkh": (
+        "452c629d67e41baec3ac6f04fe744b4b9617f8f859c63b3002f8684e7a4fee03",
+        "mainnet",
+    ),
+    "p2sh": (
+        "46df1a9484d0a81d03ce0ee543ab6e1a23ed06175c104a178268fad381216c2b",
+        "mainnet",
+    ),
+    "p2wpkh": (
+        "d869f854e1f8788bcff294cc83b280942a8c728de71eb709a2c29d10bfe21b7c",
+        "testnet",
+    ),
+    "p2sh_p2wpkh": (
+        "c586389e5e4b3acb9d6c8be1c19ae8ab2795397633176f5a6442a261bbdefc3a",
+        "mainnet",
+    ),
+    "p2wsh": (
+        "78457666f82c28aa37b74b506745a7c7684dc7842a52a457b09f09446721e11c",
+        "testnet",
+    ),
+}
+
+# how many inputs and outputs the synthetic transactions have
+NUM_INPUTS = 50
+NUM_OUTPUTS = 20
+
+
+def load_cache():
+    if not TxFetcher.cache:
+        TxFetcher.load_cache(CACHE_FILE)
+
+
+def raw_verify_tx(kind):
+    load_cache()
+    tx_id, network = VERIFY_TXS[kind]
+    return TxFetcher.fetch(tx_id, network=network).serialize(), network
+
+
+def synthetic_tx(script_pubkey_class):
+    """A transaction with NUM_INPUTS inputs spending outputs of
+    script_pubkey_class and NUM_OUTPUTS p2pkh outputs"""
+    h160 = hash160(PrivateKey(12345).point.sec())
+    tx_ins = []
+    for i in range(NUM_INPUTS):
+        tx_in = TxIn(hash256(i.to_bytes(4, "little")), i % 3)
+        # fill in the previous output so nothing gets fetched
+        tx_in._value = 100000 + i
+        tx_in._script_pubkey = script_pubkey_class(h160)
+        tx_ins.append(tx_in)
+    tx_outs = [TxOut(90000 + i, P2PKHScriptPubKey(h160)) for i in range(NUM_OUTPUTS)]
+    segwit = script_pubkey_class is P2WPKHScriptPubKey
+    return Tx(1, tx_ins, tx_outs, 0, segwit=segwit)
+
+
+@benchmark("tx.parse_legacy", ecc=False)
+def tx_parse_legacy():
+    raw, network = raw_verify_tx("p2pkh")
+
+    def run():
+        Tx.parse(BytesIO(raw), network=network)
+
+    return run
+
+
+@benchmark("tx.parse_segwit", ecc=False)
+def tx_parse_segwit():
+    raw, network = raw_verify_tx("p2wsh")
+
+    def run():
+        Tx.parse(BytesIO(raw), network=network)
+
+    return run
+
+
+@benchmark("tx.serialize", ecc=False)
+def tx_serialize():
+    raw = synthetic_tx(P2WPKHScriptPubKey).serialize()
+
+    def run():
+        # a fresh object each time so nothing is cached
+        Tx.parse(BytesIO(raw)).serialize()
+
+    return run
+
+
+@benchmark("tx.hash", ecc=False)
+def tx_hash():
+    raw, network = raw_verify_tx("p2wsh")
+
+    def run():
+        Tx.parse(BytesIO(raw), network=network).hash()
+
+    return run
+
+
+@benchmark("tx.sig_hash_legacy", ecc=False)
+def tx_sig_hash_legacy():
+    tx = synthetic_tx(P2PKHScriptPubKey)
+
+    def run():
+        # a new Tx so the shared parts of the sighash get recomputed
+        tx_obj = Tx(tx.version, tx.tx_ins, tx.tx_outs, tx.locktime)
+        for i in range(NUM_INPUTS):
+            tx_obj.sig_hash(i)
+
+    return run
+
+
+@benchmark("tx.sig_hash_bip143", ecc=False)
+def tx_sig_hash_bip143():
+    tx = synthetic_tx(P2WPKHScriptPubKey)
+
+    def run():
+        tx_obj = Tx(tx.version, tx.tx_ins, tx.tx_outs, tx.locktime, segwit=True)
+        for i in range(NUM_INPUTS):
+            tx_obj.sig_hash_bip143(i)
+
+    return run
+
+
+def verify_benchmark(kind):
+    def setup():
+        raw, network = raw_verify_tx(kind)
+
+        def run():
+            Tx.parse(BytesIO(raw), network=network).verify()
+
+        return run
+
+    return setup
+
+
+for kind in VERIFY_TXS:
+    benchmark(f"tx.verify_{kind}")(verify_benchmark(kind))
+
+
+@benchmark("tx.sign_p2wpkh")
+def tx_sign_p2wpkh():
+    private_key = PrivateKey(12345)
+    tx = synthetic_tx(P2WPKHScriptPubKey)
+
+    def run():
+        tx_obj = Tx(tx.version, tx.tx_ins, tx.tx_outs, tx.locktime, segwit=True)
+        tx_obj.get_sig_segwit(0, private_key)
+
+    return run
@@ -0,0 +1,279 @@
+"""
+Runs the benchmarks in this directory and compares them against a baseline.
+
+Each ecc backend (cecc and pecc) is benchmarked in its own process since
+buidl picks the backend the first time buidl.ecc is imported.
+
+Timings only compare on the same machine, so no baseline is committed
+(benchmarks/baseline.json is ignored by git). Store one from the tree
+before a change, then run the changed tree against it:
+
+    git stash && python -m benchmarks --update-baseline && git stash pop
+    python -m benchmarks
+
+CI does the same with two checkouts on one runner, passing --baseline
+a path outside the checkouts.
+
+The exit status is 0 when nothing regressed, 1 when something did and
+2 when there is no baseline, so nothing was compared.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from importlib import import_module
+from os.path import dirname, exists, join, realpath
+
+
+BENCHMARK_MODULES = (
+    "benchmarks.bench_tx",
+    "benchmarks.bench_hd",
+    "benchmarks.bench_psbt",
+    "benchmarks.bench_codecs",
+    "benchmarks.bench_ecc",
+    "benchmarks.bench_startup",
+)
+BACKENDS = ("cecc", "pecc")
+DEFAULT_BASELINE = join(dirname(realpath(__file__)), "baseline.json")
+# exit status when there's no baseline to compare against
+NOT_COMPARED = 2
+
+# name: (setup function, whether it depends on the ecc backend)
+REGISTRY = {}
+
+
+def benchmark(name, ecc=True):
+    """Registers a benchmark.
+    The decorated function does the setup and returns a function that
+    runs one operation, which is what gets timed.
+    Benchmarks with ecc=True are run once for each ecc backend."""
+
+    def register(setup):
+        if name in REGISTRY:
+            raise ValueError(f"benchmark {name} is already registered")
+        REGISTRY[name] = (setup, ecc)
+        return setup
+
+    return register
+
+
+def time_operation(run, min_time=0.2, repeat=5):
+    """Times run, looping it enough times that each measurement takes
+    at least min_time seconds. Returns the seconds per operation."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        # aim a little past min_time so we don't have to come back here
+        if elapsed > 0:
+            loops = max(loops * 2, int(loops * min_time * 1.2 / elapsed))
+        else:
+            loops *= 10
+    per_op = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        per_op.append((time.perf_counter() - start) / loops)
+    return {
+        "best": min(per_op),
+        "median": statistics.median(per_op),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def run_worker(backend, pattern, min_time, repeat, include_ecc_free):
+    """Runs the matching benchmarks in this process with the given backend.
+    Prints the results as JSON to stdout."""
+    if backend == "pecc":
+        # make buidl.ecc fall back to the pure python implementation
+        sys.modules["buidl.cecc"] = None
+    from buidl.ecc import S256Point
+
+    actual = S256Point.__module__.split(".")[-1]
+    if actual != backend:
+        raise SystemExit(f"{backend} is not available")
+    for module in BENCHMARK_MODULES:
+        import_module(module)
+    results = {}
+    for name, (setup, ecc) in sorted(REGISTRY.items()):
+        if pattern and pattern not in name:
+            continue
+        if ecc:
+            key = f"{name}[{backend}]"
+        elif include_ecc_free:
+            key = name
+        else:
+            continue
+        print(f"running {key}", file=sys.stderr)
+        result = time_operation(setup(), min_time=min_time, repeat=repeat)
+        result["backend"] = backend if ecc else None
+        results[key] = result
+    json.dump(results, sys.stdout)
+
+
+def run_all(backends, pattern, min_time, repeat):
+    """Runs the benchmarks, one process per backend.
+    The ones that don't use the ecc backend run with the first backend."""
+    results = {}
+    include_ecc_free = True
+    for backend in backends:
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks",
+            "--worker",
+            backend,
+            "--min-time",
+            str(min_time),
+            "--repeat",
+            str(repeat),
+        ]
+        if pattern:
+            command += ["-k", pattern]
+        if not include_ecc_free:
+            command.append("--ecc-only")
+        completed = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            cwd=dirname(dirname(realpath(__file__))),
+        )
+        if completed.returncode != 0:
+            print(f"skipping {backend}", file=sys.stderr)
+            continue
+        results.update(json.loads(completed.stdout))
+        include_ecc_free = False
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "min_time": min_time,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Compares the best time of each benchmark against the baseline.
+    Returns the names of those that are more than threshold
+    (a fraction, 0.1 is 10%) slower."""
+    regressions = []
+    base_results = baseline["results"]
+    print(f"{'benchmark':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in sorted(current["results"].items()):
+        if name not in base_results:
+            print(
+                f"{name:<45} {'-':>12} {format_time(result['best']):>12} not compared"
+            )
+            continue
+        base = base_results[name]["best"]
+        change = result["best"] / base - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = " REGRESSION"
+        print(
+            f"{name:<45} {format_time(base):>12} {format_time(result['best']):>12} {change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f}{unit}"
+    return f"{seconds / 1e-9:.1f}ns"
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark buidl's hot paths")
+    parser.add_argument(
+        "-k",
+        dest="pattern",
+        default="",
+        help="only run benchmarks whose name contains this",
+    )
+    parser.add_argument(
+        "--backends",
+        default=",".join(BACKENDS),
+        help="comma separated ecc backends to run (default: %(default)s)",
+    )
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write the results as JSON here")
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help="results to compare against (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown that counts as a regression (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store these results as the baseline",
+    )
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--ecc-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+
+    if args.worker:
+        run_worker(
+            args.worker,
+            args.pattern,
+            args.min_time,
+            args.repeat,
+            include_ecc_free=not args.ecc_only,
+        )
+        return
+
+    backends = [b for b in args.backends.split(",") if b]
+    for backend in backends:
+        if backend not in BACKENDS:
+            parser.error(f"unknown backend {backend}")
+    current = run_all(backends, args.pattern, args.min_time, args.repeat)
+    if not current["results"]:
+        raise SystemExit("no benchmarks were run")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+    if args.update_baseline:
+        if exists(args.baseline):
+            # keep the stored results of benchmarks that weren't run
+            with open(args.baseline, "r") as f:
+                results = json.load(f)["results"]
+            results.update(current["results"])
+            current["results"] = results
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return
+    if not exists(args.baseline):
+        compare({"results": {}}, current, args.threshold)
+        print(
+            f"NOT COMPARED: no baseline at {args.baseline}, "
+            "use --update-baseline to store one",
+            file=sys.stderr,
+        )
+        raise SystemExit(NOT_COMPARED)
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        raise SystemExit(
+            f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}"
+        )
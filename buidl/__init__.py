@@ -1,21 +1,454 @@
-# TODO: specify what specifically to import
-from .bcur import *
-from .bech32 import *
-from .blinding import *
-from .block import *
-from .bloomfilter import *
-from .descriptor import *
-from .ecc import *
-from .hd import *
-from .helper import *
-from .merkleblock import *
-from .mnemonic import *
-from .network import *
-from .op import *
-from .pbkdf2 import *
-from .psbt import *
-from .psbt_helper import *
-from .script import *
-from .shamir import *
-from .tx import *
-from .witness import *
+"""
+buidl's API is loaded lazily: `from buidl import HDPrivateKey` or
+`buidl.HDPrivateKey` only imports buidl.hd (and what it needs), not every
+submodule. See __getattr__.
+"""
+
+import sys
+
+from importlib import import_module
+
+
+# the submodules whose public names make up the package's API, in the order
+# they used to be star imported (when two export the same name, the last one
+# wins)
+_SUBMODULES = (
+    "bcur",
+    "bech32",
+    "blinding",
+    "block",
+    "bloomfilter",
+    "descriptor",
+    "ecc",
+    "hd",
+    "helper",
+    "kdf",
+    "merkleblock",
+    "mnemonic",
+    "network",
+    "op",
+    "pbkdf2",
+    "psbt",
+    "psbt_helper",
+    "recovery",
+    "script",
+    "shamir",
+    "tx",
+    "witness",
+)
+
+# submodule: the names it defines, so each can be loaded by itself
+_API = {
+    "bcur": (
+        "bcur_decode",
+        "bcur_encode",
+        "BCURMulti",
+        "BCURSingle",
+        "BCURStringFormatError",
+    ),
+    "bech32": (
+        "bc32decode",
+        "bc32encode",
+        "BECH32_ALPHABET",
+        "bech32_create_checksum",
+        "bech32_hrp_expand",
+        "bech32_polymod",
+        "bech32_verify_checksum",
+        "cbor_decode",
+        "cbor_encode",
+        "convertbits",
+        "decode_bech32",
+        "decode_segwit_addresses",
+        "encode_bech32",
+        "encode_bech32_checksum",
+        "encode_segwit_addresses",
+        "GEN",
+        "group_32",
+        "uses_only_bech32_chars",
+    ),
+    "blinding": (
+        "blind_xpub",
+        "combine_bip32_paths",
+        "secure_secret_path",
+    ),
+    "block": (
+        "Block",
+        "BlockFileReader",
+        "GENESIS_BLOCK_HASH",
+        "LazyBlock",
+        "map_block_files",
+        "scan_block_files",
+    ),
+    "bloomfilter": (
+        "BIP37_CONSTANT",
+        "BloomFilter",
+    ),
+    "descriptor": (
+        "calc_core_checksum",
+        "calc_poly_mod",
+        "DESCRIPTOR_CHECKSUM_CHARSET",
+        "DESCRIPTOR_INPUT_CHARSET",
+        "is_valid_xfp_hex",
+        "P2WSHSortedMulti",
+        "parse_any_key_record",
+        "parse_full_key_record",
+        "parse_partial_key_record",
+    ),
+    "ecc": (
+        "DER_CACHE",
+        "G",
+        "N",
+        "P",
+        "PrivateKey",
+        "S256Point",
+        "SEC_CACHE",
+        "Signature",
+        "tweak_add_batch",
+        "verify_batch",
+    ),
+    "hd": (
+        "ALL_MAINNET_XPRVS",
+        "ALL_MAINNET_XPUBS",
+        "ALL_TESTNET_XPRVS",
+        "ALL_TESTNET_XPUBS",
+        "calc_num_valid_seedpicker_checksums",
+        "calc_valid_seedpicker_checksums",
+        "DEFAULT_P2WSH_PATH",
+        "disable_derivation_cache",
+        "enable_derivation_cache",
+        "get_unhardened_child_path",
+        "HDPrivateKey",
+        "HDPublicKey",
+        "is_valid_bip32_path",
+        "ltrim_path",
+        "XPRV",
+        "XPUB",
+    ),
+    "helper": (
+        "BASE58_ALPHABET",
+        "base64_decode",
+        "base64_encode",
+        "big_endian_to_int",
+        "Bip32Path",
+        "bit_field_to_bytes",
+        "bits_to_target",
+        "byte_to_int",
+        "bytes_to_bit_field",
+        "bytes_to_str",
+        "calculate_new_bits",
+        "child_to_path",
+        "decode_base58",
+        "decode_base58_many",
+        "decode_gcs",
+        "decode_golomb",
+        "encode_base58",
+        "encode_base58_checksum",
+        "encode_base58_many",
+        "encode_gcs",
+        "encode_golomb",
+        "encode_varint",
+        "encode_varstr",
+        "filter_null",
+        "GOLOMB_M",
+        "GOLOMB_P",
+        "hash160",
+        "hash256",
+        "hash_to_range",
+        "hashed_items",
+        "hmac_sha512",
+        "hmac_sha512_kdf",
+        "int_to_big_endian",
+        "int_to_byte",
+        "int_to_little_endian",
+        "is_intable",
+        "little_endian_to_int",
+        "LRUCache",
+        "MAX_TARGET",
+        "merkle_parent",
+        "merkle_parent_level",
+        "merkle_root",
+        "murmur3",
+        "pack_bits",
+        "parse_binary_path",
+        "ParseCache",
+        "path_network",
+        "PBKDF2_ROUNDS",
+        "raw_decode_base58",
+        "read_varint",
+        "read_varint_at",
+        "read_varstr",
+        "serialize_key_value",
+        "sha256",
+        "SIGHASH_ALL",
+        "SIGHASH_NONE",
+        "SIGHASH_SINGLE",
+        "str_to_bytes",
+        "target_to_bits",
+        "TWO_WEEKS",
+        "unpack_bits",
+        "uses_only_hex_chars",
+    ),
+    "kdf": (
+        "get_kdf",
+        "KDFS",
+        "pbkdf2_hmac",
+        "pbkdf2_hmac_python",
+        "register_kdf",
+    ),
+    "merkleblock": (
+        "MerkleBlock",
+        "MerkleTree",
+    ),
+    "mnemonic": (
+        "BIP39",
+        "bytes_to_mnemonic",
+        "InvalidBIP39Length",
+        "InvalidChecksumWordsError",
+        "mnemonic_to_bytes",
+        "mnemonic_to_seed",
+        "secure_mnemonic",
+        "seeds_from_mnemonics",
+        "valid_checksum_words",
+        "WordList",
+    ),
+    "network": (
+        "BASIC_FILTER_TYPE",
+        "BLOCK_DATA_TYPE",
+        "CFCheckPointMessage",
+        "CFHeadersMessage",
+        "CFilterMessage",
+        "COMPACT_BLOCK_DATA_TYPE",
+        "FILTERED_BLOCK_DATA_TYPE",
+        "GenericMessage",
+        "GetCFCheckPointMessage",
+        "GetCFHeadersMessage",
+        "GetCFiltersMessage",
+        "GetDataMessage",
+        "GetHeadersMessage",
+        "HeadersMessage",
+        "MAGIC",
+        "NetworkEnvelope",
+        "PingMessage",
+        "PongMessage",
+        "PORT",
+        "SimpleNode",
+        "TX_DATA_TYPE",
+        "VerAckMessage",
+        "VersionMessage",
+        "WITNESS_BLOCK_DATA_TYPE",
+        "WITNESS_TX_DATA_TYPE",
+    ),
+    "op": (
+        "decode_num",
+        "encode_num",
+        "number_to_op_code",
+        "number_to_op_code_byte",
+        "op_0",
+        "op_0notequal",
+        "op_1",
+        "op_10",
+        "op_11",
+        "op_12",
+        "op_13",
+        "op_14",
+        "op_15",
+        "op_16",
+        "op_1add",
+        "op_1negate",
+        "op_1sub",
+        "op_2",
+        "op_2drop",
+        "op_2dup",
+        "op_2over",
+        "op_2rot",
+        "op_2swap",
+        "op_3",
+        "op_3dup",
+        "op_4",
+        "op_5",
+        "op_6",
+        "op_7",
+        "op_8",
+        "op_9",
+        "op_abs",
+        "op_add",
+        "op_booland",
+        "op_boolor",
+        "op_checklocktimeverify",
+        "op_checkmultisig",
+        "op_checkmultisigverify",
+        "op_checksequenceverify",
+        "op_checksig",
+        "op_checksigverify",
+        "OP_CODE_FUNCTIONS",
+        "OP_CODE_NAMES",
+        "op_code_to_number",
+        "op_depth",
+        "op_drop",
+        "op_dup",
+        "op_equal",
+        "op_equalverify",
+        "op_fromaltstack",
+        "op_greaterthan",
+        "op_greaterthanorequal",
+        "op_hash160",
+        "op_hash256",
+        "op_if",
+        "op_ifdup",
+        "op_lessthan",
+        "op_lessthanorequal",
+        "op_max",
+        "op_min",
+        "op_negate",
+        "op_nip",
+        "op_nop",
+        "op_not",
+        "op_notif",
+        "op_numequal",
+        "op_numequalverify",
+        "op_numnotequal",
+        "op_over",
+        "op_pick",
+        "op_return",
+        "op_ripemd160",
+        "op_roll",
+        "op_rot",
+        "op_sha1",
+        "op_sha256",
+        "op_size",
+        "op_sub",
+        "op_swap",
+        "op_toaltstack",
+        "op_tuck",
+        "op_verify",
+        "op_within",
+    ),
+    "pbkdf2": (
+        "crypt",
+        "PBKDF2",
+    ),
+    "psbt": (
+        "MixedNetwork",
+        "NamedHDPublicKey",
+        "NamedPublicKey",
+        "path_to_child",
+        "PSBT",
+        "PSBT_DELIMITER",
+        "PSBT_GLOBAL_UNSIGNED_TX",
+        "PSBT_GLOBAL_XPUB",
+        "PSBT_IN_BIP32_DERIVATION",
+        "PSBT_IN_FINAL_SCRIPTSIG",
+        "PSBT_IN_FINAL_SCRIPTWITNESS",
+        "PSBT_IN_NON_WITNESS_UTXO",
+        "PSBT_IN_PARTIAL_SIG",
+        "PSBT_IN_POR_COMMITMENT",
+        "PSBT_IN_REDEEM_SCRIPT",
+        "PSBT_IN_SIGHASH_TYPE",
+        "PSBT_IN_WITNESS_SCRIPT",
+        "PSBT_IN_WITNESS_UTXO",
+        "PSBT_MAGIC",
+        "PSBT_OUT_BIP32_DERIVATION",
+        "PSBT_OUT_REDEEM_SCRIPT",
+        "PSBT_OUT_WITNESS_SCRIPT",
+        "PSBT_SEPARATOR",
+        "PSBTIn",
+        "PSBTOut",
+        "serialize_binary_path",
+        "SuspiciousTransaction",
+    ),
+    "psbt_helper": ("create_p2sh_multisig_psbt",),
+    "recovery": (
+        "mask_candidates",
+        "MASK_CHARSETS",
+        "PassphraseRecovery",
+        "RECOVERY_BATCH",
+        "typo_candidates",
+        "TYPO_ALPHABET",
+        "wordlist_candidates",
+    ),
+    "script": (
+        "address_to_script_pubkey",
+        "P2PKHScriptPubKey",
+        "P2SHScriptPubKey",
+        "P2WPKHScriptPubKey",
+        "P2WSHScriptPubKey",
+        "RedeemScript",
+        "Script",
+        "ScriptPubKey",
+        "SegwitPubKey",
+        "WitnessScript",
+    ),
+    "shamir": (
+        "rs1024_create_checksum",
+        "rs1024_polymod",
+        "rs1024_verify_checksum",
+        "Share",
+        "ShareSet",
+        "SLIP39",
+    ),
+    "tx": (
+        "LazyTxIn",
+        "LazyTxOut",
+        "SQLiteTxCache",
+        "Tx",
+        "TxFetcher",
+        "TxIn",
+        "TxOut",
+        "URL",
+        "verify_inputs",
+    ),
+    "witness": ("Witness",),
+}
+_NAME_TO_SUBMODULE = {name: module for module, names in _API.items() for name in names}
+
+__all__ = sorted(_NAME_TO_SUBMODULE)
+
+
+def _find(name):
+    """Looks for name among everything the submodules export, the way the
+    star imports would have found it"""
+    for module in reversed(_SUBMODULES):
+        namespace = import_module(f"{__name__}.{module}")
+        if name in getattr(namespace, "__all__", ()) or (
+            not hasattr(namespace, "__all__") and hasattr(namespace, name)
+        ):
+            return getattr(namespace, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __getattr__(name):
+    """Loads name the first time it's used (PEP 562)"""
+    if name.startswith("_"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = _NAME_TO_SUBMODULE.get(name)
+    if module is not None:
+        namespace = import_module(f"{__name__}.{module}")
+        # some names only exist depending on what's installed
+        value = getattr(namespace, name, None)
+        if value is None:
+            value = _find(name)
+    else:
+        try:
+            # a submodule that hasn't been imported yet
+            return import_module(f"{__name__}.{name}")
+        except ModuleNotFoundError as e:
+            if e.name != f"{__name__}.{name}":
+                raise
+        value = _find(name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_NAME_TO_SUBMODULE) | set(_SUBMODULES))
+
+
+if sys.version_info < (3, 7):
+    # modules can't have a __getattr__ before python 3.7, load everything
+    for _module in _SUBMODULES:
+        _namespace = import_module(f"{__name__}.{_module}")
+        globals().update(
+            (name, getattr(_namespace, name))
+            for name in getattr(_namespace, "__all__", vars(_namespace))
+            if not name.startswith("_")
+        )
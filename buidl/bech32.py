@@ -14,16 +14,39 @@ def uses_only_bech32_chars(string):
     return bool(BECH32_CHARS_RE.match(string.lower()))
 
 
+def _gen_table():
+    table = []
+    for b in range(32):
+        contribution = 0
+        for i in range(5):
+            if (b >> i) & 1:
+                contribution ^= GEN[i]
+        table.append(contribution)
+    return table
+
+
+# _GEN_TABLE[b] is the xor of the GEN[i] for each bit i that is set in b,
+# which is what the top 5 bits of the checksum contribute in one step
+_GEN_TABLE = _gen_table()
+# 5-bit value of each bech32 character
+_BECH32_VALUES = {c: i for i, c in enumerate(BECH32_ALPHABET)}
+# the shifts that split 5 bytes into 8 groups of 5 bits, see group_32
+_GROUP_SHIFTS = (35, 30, 25, 20, 15, 10, 5, 0)
+
+
+def _polymod(values, chk=1):
+    """bech32_polymod, continuing from chk"""
+    table = _GEN_TABLE
+    for v in values:
+        chk = (chk & 0x1FFFFFF) << 5 ^ v ^ table[chk >> 25]
+    return chk
+
+
 # next four functions are straight from BIP0173:
 # https://github.com/bitcoin/bips/blob/master/bip-0173.mediawiki
+# (the polymod looks its generator xor up in _GEN_TABLE)
 def bech32_polymod(values):
-    chk = 1
-    for v in values:
-        b = chk >> 25
-        chk = (chk & 0x1FFFFFF) << 5 ^ v
-        for i in range(5):
-            chk ^= GEN[i] if ((b >> i) & 1) else 0
-    return chk
+    return _polymod(values)
 
 
 def bech32_hrp_expand(s):
@@ -44,17 +67,17 @@ def bech32_create_checksum(hrp, data):
 def group_32(s):
     """Convert from 8-bit bytes to 5-bit array of integers"""
     result = []
-    unused_bits = 0
-    current = 0
-    for c in s:
-        unused_bits += 8
-        current = (current << 8) + c
-        while unused_bits > 5:
-            unused_bits -= 5
-            result.append(current >> unused_bits)
-            mask = (1 << unused_bits) - 1
-            current &= mask
-    result.append(current << (5 - unused_bits))
+    # every 5 bytes are exactly 8 groups
+    end = len(s) - len(s) % 5
+    for i in range(0, end, 5):
+        current = int.from_bytes(s[i : i + 5], "big")
+        result += [(current >> shift) & 31 for shift in _GROUP_SHIFTS]
+    if end < len(s) or not result:
+        # the rest is padded with 0 bits to a multiple of 5
+        bits = (len(s) - end) * 8
+        groups = bits // 5 + 1
+        current = int.from_bytes(s[end:], "big") << (groups * 5 - bits)
+        result += [(current >> (5 * i)) & 31 for i in range(groups - 1, -1, -1)]
     return result
 
 
@@ -141,26 +164,46 @@ def cbor_decode(data):
 
 def encode_bech32(nums):
     """Convert from 5-bit array of integers to bech32 format"""
-    result = ""
-    for n in nums:
-        result += BECH32_ALPHABET[n]
-    return result
+    return "".join([BECH32_ALPHABET[n] for n in nums])
 
 
-def encode_bech32_checksum(s, network="mainnet"):
-    """Convert a segwit ScriptPubKey to a bech32 address"""
+def _segwit_hrp(network):
     if network == "mainnet":
-        prefix = "bc"
+        return "bc"
     else:
-        prefix = "tb"
+        return "tb"
+
+
+def _encode_segwit(s, hrp, chk):
+    """The bech32 address of the segwit ScriptPubKey s, chk is the
+    polymod of the expanded hrp"""
     version = s[0]
     if version > 0:
         version -= 0x50
     length = s[1]
     data = [version] + group_32(s[2 : 2 + length])
-    checksum = bech32_create_checksum(prefix, data)
-    bech32 = encode_bech32(data + checksum)
-    return prefix + "1" + bech32
+    polymod = _polymod(data + [0, 0, 0, 0, 0, 0], chk) ^ 1
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + encode_bech32(data + checksum)
+
+
+def encode_bech32_checksum(s, network="mainnet"):
+    """Convert a segwit ScriptPubKey to a bech32 address"""
+    hrp = _segwit_hrp(network)
+    return _encode_segwit(s, hrp, _polymod(bech32_hrp_expand(hrp)))
+
+
+def encode_segwit_addresses(programs, network="mainnet"):
+    """Returns the bech32 address of each segwit ScriptPubKey (raw
+    serialization) in programs, like encode_bech32_checksum.
+    The human readable part goes into the checksum once for all of them."""
+    hrp = _segwit_hrp(network)
+    chk = _polymod(bech32_hrp_expand(hrp))
+    return [_encode_segwit(s, hrp, chk) for s in programs]
+
+
+# the polymod of each segwit human readable part, expanded
+_HRP_POLYMODS = {hrp: _polymod(bech32_hrp_expand(hrp)) for hrp in ("bc", "tb")}
 
 
 def decode_bech32(s):
@@ -172,8 +215,11 @@ def decode_bech32(s):
         network = "testnet"
     else:
         raise ValueError("unknown human readable part: {}".format(hrp))
-    data = [BECH32_ALPHABET.index(c) for c in raw_data]
-    if not bech32_verify_checksum(hrp, data):
+    try:
+        data = [_BECH32_VALUES[c] for c in raw_data]
+    except KeyError:
+        raise ValueError("not a bech32 string: {}".format(s))
+    if _polymod(data, _HRP_POLYMODS[hrp]) != 1:
         raise ValueError("bad address: {}".format(s))
     version = data[0]
     number = 0
@@ -186,3 +232,9 @@ def decode_bech32(s):
     if num_bytes < 2 or num_bytes > 40:
         raise ValueError("bytes out of range: {}".format(num_bytes))
     return [network, version, hash]
+
+
+def decode_segwit_addresses(strings):
+    """Returns [network, segwit version, hash] for each of the bech32
+    addresses in strings, like decode_bech32"""
+    return [decode_bech32(s) for s in strings]
@@ -1,4 +1,5 @@
 from buidl.hd import HDPublicKey, is_valid_bip32_path
+from buidl.helper import Bip32Path
 from secrets import randbelow
 
 
@@ -65,15 +66,5 @@ def combine_bip32_paths(first_path, second_path):
         if not is_valid_bip32_path(bip32_path):
             raise ValueError(f"Invalid bip32 path: {bip32_path}")
 
-    # be forgiving
-    first_path = first_path.lower().strip().replace("'", "h").replace("//", "/")
-    second_path = second_path.lower().strip().replace("'", "h").replace("//", "/")
-
-    if first_path == "m":
-        return second_path
-
-    if second_path == "m":
-        return first_path
-
-    # Trim of leading "m/" from second path:
-    return f"{first_path}/{second_path[2:]}"
+    combined = Bip32Path.parse(first_path) + second_path
+    return combined.to_string("h")
@@ -1,3 +1,8 @@
+from io import BytesIO
+from multiprocessing import Pool
+
+import mmap
+
 from buidl.helper import (
     bits_to_target,
     hash256,
@@ -5,6 +10,7 @@ from buidl.helper import (
     little_endian_to_int,
     merkle_root,
     read_varint,
+    read_varint_at,
 )
 from buidl.tx import Tx
 
@@ -177,3 +183,182 @@ Num txs: {"unknown" if self.txs is None else len(self.txs)}
             for tx_out in t.tx_outs:
                 if not tx_out.script_pubkey.has_op_return():
                     yield (tx_out.script_pubkey.raw_serialize())
+
+
+class LazyBlock(Block):
+    """A Block that lives in a buffer (see BlockFileReader).
+    The header is parsed right away but the transactions are only
+    decoded when txs, tx_hashes or iter_txs is used."""
+
+    @classmethod
+    def parse_buffer(cls, buf, offset=0, network="mainnet"):
+        """Parses the block at offset in buf without copying the transactions"""
+        buf = memoryview(buf)
+        if offset + 80 > len(buf):
+            raise IOError("buffer ends before the block header does")
+        block = cls.parse_header(BytesIO(buf[offset : offset + 80]))
+        block._buf = buf
+        # the number of transactions comes right after the header
+        block._txs_offset = offset + 80
+        block.network = network
+        return block
+
+    def __init__(self, *args, **kwargs):
+        self._txs = None
+        self._tx_hashes = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def txs(self):
+        if self._txs is None and getattr(self, "_buf", None) is not None:
+            self._txs = list(self.iter_txs())
+        return self._txs
+
+    @txs.setter
+    def txs(self, value):
+        self._txs = value
+
+    @property
+    def tx_hashes(self):
+        if self._tx_hashes is None and getattr(self, "_buf", None) is not None:
+            self._tx_hashes = [tx_hash for _, tx_hash in self.iter_tx_hashes()]
+        return self._tx_hashes
+
+    @tx_hashes.setter
+    def tx_hashes(self, value):
+        self._tx_hashes = value
+
+    def num_txs(self):
+        """Returns the number of transactions in the block"""
+        return read_varint_at(self._buf, self._txs_offset)[0]
+
+    def iter_txs(self):
+        """Yields the transactions one at a time (see Tx.parse_buffer)"""
+        num_txs, offset = read_varint_at(self._buf, self._txs_offset)
+        for _ in range(num_txs):
+            tx, length = Tx.parse_buffer(self._buf, offset, network=self.network)
+            offset += length
+            yield tx
+
+    def iter_tx_hashes(self):
+        """Yields (offset in the buffer, hash) for each transaction
+        without decoding them"""
+        num_txs, offset = read_varint_at(self._buf, self._txs_offset)
+        for _ in range(num_txs):
+            tx_hash, length = Tx.hash_buffer(self._buf, offset)
+            yield offset, tx_hash
+            offset += length
+
+
+class BlockFileReader:
+    """Reads the blocks in a Bitcoin Core block file (blk*.dat).
+    Each block is stored as the network magic, the block size (4 bytes,
+    little endian) and then the block itself. The file is memory-mapped
+    so nothing is read until it's used.
+    Files obfuscated by newer versions of Bitcoin Core (blocks/xor.dat)
+    have to be de-obfuscated first."""
+
+    def __init__(self, filename, network="mainnet"):
+        # network imports this module so it can't be imported at the top
+        from buidl.network import MAGIC
+
+        self.filename = filename
+        self.network = network
+        self.magic = MAGIC[network]
+        with open(filename, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can't be mapped
+                self._map = None
+        if self._map is None:
+            self._buf = memoryview(b"")
+        else:
+            self._buf = memoryview(self._map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._map is None:
+            return
+        self._buf = memoryview(b"")
+        try:
+            self._map.close()
+        except BufferError:
+            # blocks we handed out still point into the file, the mapping
+            # goes away once they're garbage collected
+            pass
+        self._map = None
+
+    def __iter__(self):
+        return self.blocks()
+
+    def records(self):
+        """Yields the offset and size of each block in the file"""
+        buf = self._buf
+        offset = 0
+        while offset + 8 <= len(buf):
+            magic = bytes(buf[offset : offset + 4])
+            if magic == b"\x00\x00\x00\x00":
+                # Bitcoin Core pre-allocates the files, the rest is zeros
+                break
+            if magic != self.magic:
+                raise RuntimeError(
+                    "magic is not right {} vs {} at offset {}".format(
+                        magic.hex(), self.magic.hex(), offset
+                    )
+                )
+            size = little_endian_to_int(buf[offset + 4 : offset + 8])
+            offset += 8
+            if offset + size > len(buf):
+                raise IOError("block at offset {} is truncated".format(offset))
+            yield offset, size
+            offset += size
+
+    def blocks(self):
+        """Yields a LazyBlock for each block in the file"""
+        for offset, _ in self.records():
+            yield LazyBlock.parse_buffer(self._buf, offset, network=self.network)
+
+    def tx_hashes(self):
+        """Yields (block hash, offset of the transaction in the file, tx hash)
+        for each transaction in the file without building any Tx objects"""
+        for offset, _ in self.records():
+            block = LazyBlock.parse_buffer(self._buf, offset, network=self.network)
+            block_hash = hash256(self._buf[offset : offset + 80])[::-1]
+            for tx_offset, tx_hash in block.iter_tx_hashes():
+                yield block_hash, tx_offset, tx_hash
+
+
+def _map_block_file(args):
+    func, filename, network = args
+    with BlockFileReader(filename, network=network) as reader:
+        return filename, func(reader)
+
+
+def map_block_files(func, filenames, network="mainnet", processes=None):
+    """Calls func with a BlockFileReader for each of the files, spread
+    across a pool of processes (one per core by default).
+    func has to be a module-level function and return something that can
+    be pickled. Yields (filename, result) in the order of filenames."""
+    jobs = [(func, filename, network) for filename in filenames]
+    with Pool(processes) as pool:
+        for result in pool.imap(_map_block_file, jobs, chunksize=1):
+            yield result
+
+
+def _list_tx_hashes(reader):
+    return list(reader.tx_hashes())
+
+
+def scan_block_files(filenames, network="mainnet", processes=None):
+    """Yields (filename, block hash, tx offset, tx hash) for every
+    transaction in the files, reading the files in parallel"""
+    results = map_block_files(_list_tx_hashes, filenames, network, processes)
+    for filename, tx_hashes in results:
+        for block_hash, tx_offset, tx_hash in tx_hashes:
+            yield filename, block_hash, tx_offset, tx_hash
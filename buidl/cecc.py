@@ -1,7 +1,10 @@
 import hashlib
 import hmac
 
+from concurrent.futures import ThreadPoolExecutor
+
 from buidl.helper import (
+    ParseCache,
     big_endian_to_int,
     encode_base58_checksum,
     hash160,
@@ -18,9 +21,17 @@ GLOBAL_CTX = ffi.gc(
     ),
     lib.secp256k1_context_destroy,
 )
+# a _libsec built from an older libsec.h doesn't have these, then
+# the tweak functions or pecc are used instead
+_HAS_PUBKEY_CREATE = hasattr(lib, "secp256k1_ec_pubkey_create")
+_HAS_PUBKEY_COMBINE = hasattr(lib, "secp256k1_ec_pubkey_combine")
 P = 2 ** 256 - 2 ** 32 - 977
 N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
 
+# parsed S256Points by SEC and Signatures by DER, see parse_cached
+SEC_CACHE = ParseCache()
+DER_CACHE = ParseCache()
+
 
 class S256Point:
     def __init__(self, csec=None, usec=None):
@@ -46,32 +57,52 @@ class S256Point:
     def __repr__(self):
         return "S256Point({})".format(self.sec(compressed=False).hex())
 
+    @classmethod
+    def _from_pubkey(cls, c):
+        """Wraps a secp256k1_pubkey, the SEC serializations are only
+        computed when they're asked for"""
+        point = cls.__new__(cls)
+        point.c = c
+        point.csec = None
+        point.usec = None
+        return point
+
     def __rmul__(self, coefficient):
-        coef = coefficient % N
-        new_key = ffi.new("secp256k1_pubkey *")
-        s = self.sec(compressed=False)
-        lib.secp256k1_ec_pubkey_parse(GLOBAL_CTX, new_key, s, len(s))
-        lib.secp256k1_ec_pubkey_tweak_mul(GLOBAL_CTX, new_key, coef.to_bytes(32, "big"))
-        serialized = ffi.new("unsigned char [65]")
-        output_len = ffi.new("size_t *", 65)
-        lib.secp256k1_ec_pubkey_serialize(
-            GLOBAL_CTX, serialized, output_len, new_key, lib.SECP256K1_EC_UNCOMPRESSED
-        )
-        return self.__class__(usec=bytes(serialized))
-
-    def __add__(self, scalar):
-        """Multiplies scalar by generator, adds result to current point"""
-        coef = scalar % N
-        new_key = ffi.new("secp256k1_pubkey *")
-        s = self.sec(compressed=False)
-        lib.secp256k1_ec_pubkey_parse(GLOBAL_CTX, new_key, s, len(s))
-        lib.secp256k1_ec_pubkey_tweak_add(GLOBAL_CTX, new_key, coef.to_bytes(32, "big"))
-        serialized = ffi.new("unsigned char [65]")
-        output_len = ffi.new("size_t *", 65)
-        lib.secp256k1_ec_pubkey_serialize(
-            GLOBAL_CTX, serialized, output_len, new_key, lib.SECP256K1_EC_UNCOMPRESSED
-        )
-        return self.__class__(usec=bytes(serialized))
+        coef = (coefficient % N).to_bytes(32, "big")
+        if self is G and _HAS_PUBKEY_CREATE:
+            # coefficient * G is the public key of coefficient
+            new_key = ffi.new("secp256k1_pubkey *")
+            result = lib.secp256k1_ec_pubkey_create(GLOBAL_CTX, new_key, coef)
+        else:
+            # tweak a copy of our key
+            new_key = ffi.new("secp256k1_pubkey *", self.c[0])
+            result = lib.secp256k1_ec_pubkey_tweak_mul(GLOBAL_CTX, new_key, coef)
+        if not result:
+            raise ValueError("libsecp256k1 produced error")
+        return self._from_pubkey(new_key)
+
+    def __add__(self, other):
+        """If other is an int, multiplies scalar by generator, adds result to current point"""
+        if type(other) == int:
+            # tweak a copy of our key
+            new_key = ffi.new("secp256k1_pubkey *", self.c[0])
+            coef = (other % N).to_bytes(32, "big")
+            result = lib.secp256k1_ec_pubkey_tweak_add(GLOBAL_CTX, new_key, coef)
+        elif _HAS_PUBKEY_COMBINE:
+            new_key = ffi.new("secp256k1_pubkey *")
+            keys = ffi.new("secp256k1_pubkey *[2]", [self.c, other.c])
+            result = lib.secp256k1_ec_pubkey_combine(GLOBAL_CTX, new_key, keys, 2)
+        else:
+            # no way to add two points with the tweak functions
+            from buidl import pecc
+
+            total = pecc.S256Point.parse(self.sec()) + pecc.S256Point.parse(other.sec())
+            if total.x is None:
+                raise ValueError("libsecp256k1 produced error")
+            return self.parse(total.sec())
+        if not result:
+            raise ValueError("libsecp256k1 produced error")
+        return self._from_pubkey(new_key)
 
     def verify(self, z, sig):
         msg = z.to_bytes(32, "big")
@@ -165,6 +196,12 @@ class S256Point:
         else:
             return S256Point(csec=sec_bin)
 
+    @classmethod
+    def parse_cached(cls, sec_bin):
+        """Like parse but returns the same S256Point for the same SEC,
+        see SEC_CACHE. Don't modify the returned point."""
+        return SEC_CACHE.get(sec_bin, cls.parse)
+
 
 G = S256Point(
     usec=bytes.fromhex(
@@ -173,6 +210,55 @@ G = S256Point(
 )
 
 
+def _verify_chunk(items):
+    # the pubkeys and signatures are already parsed into their cffi structs
+    # and cffi passes the message bytes without copying them
+    verify = lib.secp256k1_ecdsa_verify
+    return [
+        bool(verify(GLOBAL_CTX, sig.c, z.to_bytes(32, "big"), point.c))
+        for point, z, sig in items
+    ]
+
+
+def verify_batch(items, threads=None):
+    """Verifies a list of (point, z, sig) and returns a list of whether
+    each signature is valid.
+    If threads is set, the items are split across a thread pool of that
+    size. cffi releases the GIL during the call into libsecp256k1 and
+    verifying only reads the context, so the threads can share it."""
+    items = list(items)
+    if threads is None or threads < 2 or len(items) < 2:
+        return _verify_chunk(items)
+    size = -(-len(items) // threads)
+    chunks = [items[i : i + size] for i in range(0, len(items), size)]
+    results = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for chunk_results in executor.map(_verify_chunk, chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def tweak_add_batch(point, tweaks):
+    """Returns the compressed SEC of point + tweak*G for each tweak.
+    The same cffi structs are reused for every tweak and no S256Points
+    are made."""
+    tweak_add = lib.secp256k1_ec_pubkey_tweak_add
+    serialize = lib.secp256k1_ec_pubkey_serialize
+    key = ffi.new("secp256k1_pubkey *")
+    serialized = ffi.new("unsigned char [33]")
+    output_len = ffi.new("size_t *")
+    secs = []
+    for tweak in tweaks:
+        # start from a copy of the point each time
+        key[0] = point.c[0]
+        if not tweak_add(GLOBAL_CTX, key, (tweak % N).to_bytes(32, "big")):
+            raise ValueError("libsecp256k1 produced error")
+        output_len[0] = 33
+        serialize(GLOBAL_CTX, serialized, output_len, key, lib.SECP256K1_EC_COMPRESSED)
+        secs.append(bytes(ffi.buffer(serialized, 33)))
+    return secs
+
+
 class Signature:
     def __init__(self, der=None, c=None):
         if der:
@@ -211,14 +297,28 @@ class Signature:
     def parse(cls, der):
         return cls(der=der)
 
+    @classmethod
+    def parse_cached(cls, der):
+        """Like parse but returns the same Signature for the same DER,
+        see DER_CACHE. Don't modify the returned signature."""
+        return DER_CACHE.get(der, cls.parse)
+
 
 class PrivateKey:
     def __init__(self, secret, network="mainnet", compressed=True):
         self.secret = secret
-        self.point = secret * G
+        # the public point is only computed when it's needed, see point
+        self._point = None
         self.network = network
         self.compressed = compressed
 
+    @property
+    def point(self):
+        """The public point, secret * G"""
+        if self._point is None:
+            self._point = self.secret * G
+        return self._point
+
     def hex(self):
         return "{:x}".format(self.secret).zfill(64)
 
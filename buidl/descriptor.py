@@ -12,37 +12,46 @@ DESCRIPTOR_INPUT_CHARSET = "0123456789()[],'/*abcdefgh@:$%{}IJKLMNOPQRSTUVWXYZ&+
 DESCRIPTOR_CHECKSUM_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
 
 
+def _poly_mod_table():
+    generators = (0xF5DEE51989, 0xA9FDCA3312, 0x1BAB10E32D, 0x3706B1677A, 0x644D626FFD)
+    table = []
+    for c0 in range(32):
+        contribution = 0
+        for i, generator in enumerate(generators):
+            if (c0 >> i) & 1:
+                contribution ^= generator
+        table.append(contribution)
+    return table
+
+
+# _POLY_MOD_TABLE[c0] is what the top 5 bits (c0) xor into the checksum
+_POLY_MOD_TABLE = _poly_mod_table()
+# position of each character in DESCRIPTOR_INPUT_CHARSET
+_DESCRIPTOR_INPUT_POSITIONS = {c: i for i, c in enumerate(DESCRIPTOR_INPUT_CHARSET)}
+
+
 def calc_poly_mod(c, val):
-    c0 = c >> 35
-    c = ((c & 0x7FFFFFFFF) << 5) ^ val
-    if c0 & 1:
-        c ^= 0xF5DEE51989
-    if c0 & 2:
-        c ^= 0xA9FDCA3312
-    if c0 & 4:
-        c ^= 0x1BAB10E32D
-    if c0 & 8:
-        c ^= 0x3706B1677A
-    if c0 & 16:
-        c ^= 0x644D626FFD
-    return c
+    return ((c & 0x7FFFFFFFF) << 5) ^ val ^ _POLY_MOD_TABLE[c >> 35]
 
 
 def calc_core_checksum(output_descriptor):
     """
     A 40-bit (!) digest that bitcoin core uses for output descriptors
     """
+    table = _POLY_MOD_TABLE
+    positions = _DESCRIPTOR_INPUT_POSITIONS
 
     c = 1
     cls = 0
     clscount = 0
     for ch in output_descriptor:
-        pos = DESCRIPTOR_INPUT_CHARSET.find(ch)
-        if pos == -1:
+        pos = positions.get(ch)
+        if pos is None:
             raise ValueError(
                 f"Invalid character `{ch}` in output descriptor: {output_descriptor}"
             )
-        c = calc_poly_mod(c, pos & 31)
+        # calc_poly_mod(c, pos & 31), inlined
+        c = ((c & 0x7FFFFFFFF) << 5) ^ (pos & 31) ^ table[c >> 35]
         cls = cls * 3 + (pos >> 5)
         clscount += 1
         if clscount == 3:
@@ -235,6 +244,8 @@ class P2WSHSortedMulti:
         self.descriptor_text = descriptor_text
         self.key_records = key_records_to_save
         self.network = network
+        # branch keys by is_change, see _branch_keys
+        self._branches = {}
 
         calculated_checksum = calc_core_checksum(descriptor_text)
 
@@ -302,32 +313,29 @@ class P2WSHSortedMulti:
             checksum=checksum,
         )
 
-    def get_address(self, offset=0, is_change=False, sort_keys=True):
-        """
-        If is_change=True, then we display change addresses.
-        If is_change=False we display receive addresses.
-
-        sort_keys is for expert users only and should be left as True
-        """
-        assert type(is_change) is bool, is_change
-        assert type(offset) is int and offset >= 0, offset
-
-        sec_hexes_to_use = []
-        for key_record in self.key_records:
-            hdpubkey = HDPublicKey.parse(key_record["xpub_parent"])
-            if is_change is True:
-                account = key_record["account_index"] + 1
-            else:
-                account = key_record["account_index"]
-            leaf_xpub = hdpubkey.child(account).child(offset)
-            sec_hexes_to_use.append(leaf_xpub.sec().hex())
-
+    def _branch_keys(self, is_change):
+        """The HDPublicKey of each key record's receive (or change) branch.
+        They're parsed and derived the first time they're needed."""
+        branch_keys = self._branches.get(is_change)
+        if branch_keys is None:
+            branch_keys = []
+            for key_record in self.key_records:
+                hdpubkey = HDPublicKey.parse(key_record["xpub_parent"])
+                if is_change is True:
+                    account = key_record["account_index"] + 1
+                else:
+                    account = key_record["account_index"]
+                branch_keys.append(hdpubkey.child(account))
+            self._branches[is_change] = branch_keys
+        return branch_keys
+
+    def _secs_to_address(self, secs, sort_keys=True):
         commands = [number_to_op_code(self.quorum_m)]
         if sort_keys:
             # BIP67 lexicographical sorting for sortedmulti
-            commands.extend([bytes.fromhex(x) for x in sorted(sec_hexes_to_use)])
+            commands.extend(sorted(secs))
         else:
-            commands.extend([bytes.fromhex(x) for x in sec_hexes_to_use])
+            commands.extend(secs)
 
         commands.append(number_to_op_code(len(self.key_records)))
         commands.append(174)  # OP_CHECKMULTISIG
@@ -336,6 +344,55 @@ class P2WSHSortedMulti:
         redeem_script = P2WSHScriptPubKey(sha256(witness_script.raw_serialize()))
         return redeem_script.address(network=self.network)
 
+    def get_address(self, offset=0, is_change=False, sort_keys=True):
+        """
+        If is_change=True, then we display change addresses.
+        If is_change=False we display receive addresses.
+
+        sort_keys is for expert users only and should be left as True
+        """
+        assert type(is_change) is bool, is_change
+        assert type(offset) is int and offset >= 0, offset
+
+        secs = [
+            branch_key.child(offset).sec()
+            for branch_key in self._branch_keys(is_change)
+        ]
+        return self._secs_to_address(secs, sort_keys=sort_keys)
+
+    def get_addresses(self, start=0, count=1, is_change=False, sort_keys=True):
+        """
+        Returns the count addresses from offset start on, same as calling
+        get_address for each of them but the keys are derived in bulk
+        (see HDPublicKey.derive_range).
+        """
+        assert type(is_change) is bool, is_change
+        assert type(start) is int and start >= 0, start
+        assert type(count) is int and count >= 0, count
+
+        secs_by_key = []
+        for branch_key in self._branch_keys(is_change):
+            children = branch_key.derive_range(start, start + count)
+            secs_by_key.append([sec for _, sec, _ in children])
+        # one sec per key record for each address
+        return [
+            self._secs_to_address(list(secs), sort_keys=sort_keys)
+            for secs in zip(*secs_by_key)
+        ]
+
+    def get_address_index(self, count=1000, start=0):
+        """
+        Returns a dict of address: (is_change, offset) for the count
+        receive and count change addresses from offset start on, so that
+        an address can be looked up without deriving anything.
+        """
+        address_index = {}
+        for is_change in (False, True):
+            addresses = self.get_addresses(start, count, is_change=is_change)
+            for offset, address in enumerate(addresses, start):
+                address_index[address] = (is_change, offset)
+        return address_index
+
     def caravan_export(self, wallet_name="p2wsh", key_record_names=[]):
         if key_record_names and len(key_record_names) != len(self.key_records):
             raise ValueError(
@@ -1,22 +1,27 @@
+import hashlib
+import hmac
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
-from buidl.ecc import N, PrivateKey, S256Point
+from buidl.ecc import N, PrivateKey, S256Point, tweak_add_batch
 from buidl.helper import (
     big_endian_to_int,
+    Bip32Path,
     byte_to_int,
     encode_base58_checksum,
+    hash160,
     hmac_sha512,
-    hmac_sha512_kdf,
     int_to_big_endian,
     int_to_byte,
-    is_intable,
+    LRUCache,
     raw_decode_base58,
 )
 from buidl.mnemonic import (
-    BIP39,
-    InvalidChecksumWordsError,
+    mnemonic_to_seed,
     secure_mnemonic,
-    mnemonic_to_bytes,
+    valid_checksum_words,
 )
 from buidl.shamir import ShareSet
 
@@ -60,6 +65,101 @@ DEFAULT_P2WSH_PATH = {
 }
 
 
+# derived children shared by every HDPrivateKey and HDPublicKey, see
+# enable_derivation_cache
+_derivation_cache = None
+
+
+def enable_derivation_cache(maxsize=1024):
+    """Starts caching derived children (HDPrivateKey.child and
+    HDPublicKey.child) in memory, at most maxsize of them.
+    Returns the cache, whose hits, misses and hit_rate() show how useful
+    it is. Private keys get cached too, call disable_derivation_cache
+    to drop them."""
+    global _derivation_cache
+    if _derivation_cache is None:
+        _derivation_cache = LRUCache(maxsize)
+    else:
+        with _derivation_cache.lock:
+            _derivation_cache.maxsize = maxsize
+    return _derivation_cache
+
+
+def disable_derivation_cache():
+    """Stops caching derived children and drops the cached ones"""
+    global _derivation_cache
+    if _derivation_cache is not None:
+        _derivation_cache.clear()
+    _derivation_cache = None
+
+
+# bytes of extended public keys that were parsed recently, like an xpub
+# that's parsed over and over. Private keys are never kept, see _decode_xpub
+_XPUB_CACHE = LRUCache(1024)
+
+
+def _decode_xpub(s):
+    """Returns the bytes of the extended public key s, raises a ValueError
+    if s is something else (so it doesn't end up in _XPUB_CACHE)"""
+    raw = raw_decode_base58(s)
+    if raw[:4] not in ALL_MAINNET_XPUBS and raw[:4] not in ALL_TESTNET_XPUBS:
+        raise ValueError(f"not a valid [t-z]pub pub_version: {raw[:4].hex()}")
+    return raw
+
+
+# how many children derive_range computes at a time (and hands to each process)
+DERIVE_RANGE_CHUNK = 1000
+
+
+def _derive_chunk(sec, chain_code, start, stop, address_type, network):
+    """Returns (index, sec, hash160) or, with an address_type,
+    (index, sec, hash160, address) for the children start..stop-1
+    of the public key sec and chain_code"""
+    point = S256Point.parse(sec)
+    # the HMAC key and the parent's SEC are the same for every child
+    base = hmac.new(chain_code, sec, hashlib.sha512)
+    tweaks = []
+    for index in range(start, stop):
+        h = base.copy()
+        h.update(int_to_big_endian(index, 4))
+        tweaks.append(big_endian_to_int(h.digest()[:32]))
+    secs = tweak_add_batch(point, tweaks)
+    hash160s = [hash160(child_sec) for child_sec in secs]
+    if address_type is None:
+        return list(zip(range(start, stop), secs, hash160s))
+    # avoid circular dependency
+    from buidl.script import P2PKHScriptPubKey, P2WPKHScriptPubKey
+
+    if address_type == "p2pkh":
+        addresses = [P2PKHScriptPubKey(h).address(network) for h in hash160s]
+    elif address_type == "p2wpkh":
+        addresses = [P2WPKHScriptPubKey(h).address(network) for h in hash160s]
+    else:
+        addresses = [P2WPKHScriptPubKey(h).p2sh_address(network) for h in hash160s]
+    return list(zip(range(start, stop), secs, hash160s, addresses))
+
+
+def _derive_private(private_key, chain_code, index):
+    """Returns the PrivateKey and chain code of the child at index of the
+    key with private_key and chain_code"""
+    # if index >= 0x80000000
+    if index >= 0x80000000:
+        # the message data is the private key secret in 33 bytes in
+        #  big-endian and the index in 4 bytes big-endian.
+        data = int_to_big_endian(private_key.secret, 33) + int_to_big_endian(index, 4)
+    else:
+        # the message data is the public key compressed SEC
+        #  and the index in 4 bytes big-endian.
+        data = private_key.point.sec() + int_to_big_endian(index, 4)
+    # get the hmac_sha512 with chain code and data
+    h = hmac_sha512(chain_code, data)
+    # the new secret is the first 32 bytes as a big-endian integer
+    #  plus the secret mod N
+    secret = (big_endian_to_int(h[:32]) + private_key.secret) % N
+    # create the PrivateKey object, the chain code is the last 32 bytes
+    return PrivateKey(secret=secret), h[32:]
+
+
 class HDPrivateKey:
     def __init__(
         self,
@@ -80,6 +180,8 @@ class HDPrivateKey:
         # level the current key is at in the heirarchy
         self.depth = depth
         # fingerprint of the parent key
+        if parent_fingerprint is None or len(parent_fingerprint) != 4:
+            raise ValueError(f"Invalid parent_fingerprint: {parent_fingerprint}")
         self.parent_fingerprint = parent_fingerprint
         # what order child this is
         self.child_number = child_number
@@ -90,16 +192,25 @@ class HDPrivateKey:
             priv_version = XPRV[self.network]
         self.priv_version = priv_version
 
-        # keep a copy of the corresponding public key
-        self.pub = HDPublicKey(
-            point=private_key.point,
-            chain_code=chain_code,
-            depth=depth,
-            parent_fingerprint=parent_fingerprint,
-            child_number=child_number,
-            network=network,
-            pub_version=pub_version,  # HDPublicKey handles the case where pub_version is None
-        )
+        # the corresponding public key, see pub
+        self._pub = None
+        self._pub_version = pub_version
+
+    @property
+    def pub(self):
+        """The corresponding HDPublicKey. It needs the public point, so it's
+        only built when it's asked for."""
+        if self._pub is None:
+            self._pub = HDPublicKey(
+                point=self.private_key.point,
+                chain_code=self.chain_code,
+                depth=self.depth,
+                parent_fingerprint=self.parent_fingerprint,
+                child_number=self.child_number,
+                network=self.network,
+                pub_version=self._pub_version,  # HDPublicKey handles the case where pub_version is None
+            )
+        return self._pub
 
     def wif(self):
         return self.private_key.wif()
@@ -152,26 +263,26 @@ class HDPrivateKey:
         """Returns the child HDPrivateKey at a particular index.
         Hardened children return for indices >= 0x8000000.
         """
-        # if index >= 0x80000000
-        if index >= 0x80000000:
-            # the message data is the private key secret in 33 bytes in
-            #  big-endian and the index in 4 bytes big-endian.
-            data = int_to_big_endian(self.private_key.secret, 33) + int_to_big_endian(
-                index, 4
-            )
-        else:
-            # the message data is the public key compressed SEC
-            #  and the index in 4 bytes big-endian.
-            data = self.private_key.point.sec() + int_to_big_endian(index, 4)
-        # get the hmac_sha512 with chain code and data
-        h = hmac_sha512(self.chain_code, data)
-        # the new secret is the first 32 bytes as a big-endian integer
-        #  plus the secret mod N
-        secret = (big_endian_to_int(h[:32]) + self.private_key.secret) % N
-        # create the PrivateKey object
-        private_key = PrivateKey(secret=secret)
-        # the chain code is the last 32 bytes
-        chain_code = h[32:]
+        cache = _derivation_cache
+        if cache is None:
+            return self._child(index)
+        # everything the child depends on
+        key = (
+            self.private_key.secret,
+            self.chain_code,
+            index,
+            self.depth,
+            self.network,
+            self.priv_version,
+            self._pub_version,
+        )
+
+        return cache.get(key, lambda key: self._child(index))
+
+    def _child(self, index):
+        private_key, chain_code = _derive_private(
+            self.private_key, self.chain_code, index
+        )
         # depth is whatever the current depth + 1
         depth = self.depth + 1
         # parent_fingerprint is the fingerprint of this node
@@ -187,37 +298,40 @@ class HDPrivateKey:
             child_number=child_number,
             network=self.network,
             priv_version=self.priv_version,
-            pub_version=self.pub.pub_version,
+            pub_version=self._pub_version,
         )
 
     def traverse(self, path):
         """Returns the HDPrivateKey at the path indicated.
-        Path should be in the form of m/x/y/z where x' means
-        hardened"""
-
-        # accept path in uppercase and/or using h instead of '
-        path = path.lower().replace("h", "'")
-
-        if not path.startswith("m"):
-            raise ValueError(f"Invalid Path: {path}")
-
-        # keep track of the current node starting with self
-        current = self
-        # split up the path by the '/' splitter, ignore the first
-        components = path.split("/")[1:]
-        # iterate through the path components
-        for child in components:
-            # if the child ends with a ', we have a hardened child
-            if child.endswith("'"):
-                # index is the integer representation + 0x80000000
-                index = int(child[:-1]) + 0x80000000
-            # else the index is the integer representation
-            else:
-                index = int(child)
-            # grab the child at the index calculated
-            current = current.child(index)
-        # return the current child
-        return current
+        Path should be a Bip32Path or in the form of m/x/y/z where x'
+        (or xh) means hardened"""
+        path = Bip32Path.parse(path)
+        if _derivation_cache is not None or len(path) < 2:
+            # keep track of the current node starting with self
+            current = self
+            # grab the child at each child number of the path
+            for index in path:
+                current = current.child(index)
+            # return the current child
+            return current
+        # the keys on the way aren't returned, so only their private keys
+        #  and chain codes are needed (their parent fingerprints, which need
+        #  the points of their parents, aren't)
+        private_key, chain_code = self.private_key, self.chain_code
+        for index in path[:-1]:
+            private_key, chain_code = _derive_private(private_key, chain_code, index)
+        parent_fingerprint = private_key.point.hash160()[:4]
+        private_key, chain_code = _derive_private(private_key, chain_code, path[-1])
+        return HDPrivateKey(
+            private_key=private_key,
+            chain_code=chain_code,
+            depth=self.depth + len(path),
+            parent_fingerprint=parent_fingerprint,
+            child_number=path[-1],
+            network=self.network,
+            priv_version=self.priv_version,
+            pub_version=self._pub_version,
+        )
 
     def raw_serialize(self, priv_version):
         # version + depth + parent_fingerprint + child number + chain code + private key
@@ -247,7 +361,8 @@ class HDPrivateKey:
 
     # passthrough methods
     def fingerprint(self):
-        return self.pub.fingerprint()
+        # straight from the point, building pub would need parent_fingerprint
+        return self.private_key.point.hash160()[:4]
 
     @classmethod
     def parse(cls, s):
@@ -381,13 +496,7 @@ class HDPrivateKey:
     ):
         """Returns a HDPrivateKey object from the mnemonic."""
         # this will check that the mnemonic is valid
-        mnemonic_to_bytes(mnemonic)
-        # normalize in case we got a mnemonic that's just the first 4 letters
-        normalized = " ".join([BIP39.normalize(word) for word in mnemonic.split()])
-        # salt is b'mnemonic' + password
-        salt = b"mnemonic" + password
-        # the seed is the hmac_sha512_kdf with normalized mnemonic and salt
-        seed = hmac_sha512_kdf(normalized, salt)
+        seed = mnemonic_to_seed(mnemonic, password)
         # return the HDPrivateKey at the path specified
         return cls.from_seed(
             seed, network=network, priv_version=priv_version, pub_version=pub_version
@@ -483,7 +592,7 @@ class HDPublicKey:
         return self.point.p2wpkh_script()
 
     def p2sh_p2wpkh_script(self):
-        return self.point.p2sh_p2wpkh_script()
+        return self.point.p2sh_p2wpkh_redeem_script().script_pubkey()
 
     def address(self):
         return self.point.address(network=self.network)
@@ -502,6 +611,21 @@ class HDPublicKey:
         """Returns the child HDPrivateKey at a particular index.
         Raises ValueError for indices >= 0x8000000.
         """
+        cache = _derivation_cache
+        if cache is None:
+            return self._child(index)
+        # everything the child depends on
+        key = (
+            self.point.sec(),
+            self.chain_code,
+            index,
+            self.depth,
+            self.network,
+            self.pub_version,
+        )
+        return cache.get(key, lambda key: self._child(index))
+
+    def _child(self, index):
         # if index >= 0x80000000, raise a ValueError
         if index >= 0x80000000:
             raise ValueError("child number should always be less than 2^31")
@@ -531,27 +655,65 @@ class HDPublicKey:
             pub_version=self.pub_version,
         )
 
+    def derive_range(self, start, stop, workers=None, address_type=None):
+        """Yields (index, sec, hash160) for the children start..stop-1,
+        in order, without making an HDPublicKey for each of them.
+        address_type can be "p2pkh", "p2wpkh" or "p2sh_p2wpkh" to add
+        that address to each tuple.
+        The children are computed DERIVE_RANGE_CHUNK at a time. If
+        workers is more than 1, the chunks are spread over that many
+        processes."""
+        if not 0 <= start <= stop <= 0x80000000:
+            raise ValueError("child numbers should be in [0, 2^31)")
+        if address_type not in (None, "p2pkh", "p2wpkh", "p2sh_p2wpkh"):
+            raise ValueError(f"unknown address type {address_type}")
+        args = (self.point.sec(), self.chain_code)
+        chunks = [
+            (i, min(i + DERIVE_RANGE_CHUNK, stop))
+            for i in range(start, stop, DERIVE_RANGE_CHUNK)
+        ]
+        if workers is None or workers < 2 or len(chunks) < 2:
+            for i, j in chunks:
+                yield from _derive_chunk(*args, i, j, address_type, self.network)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # keep a couple of chunks per process in flight so that the
+            # results don't pile up in memory ahead of the consumer
+            pending = deque()
+            for i, j in chunks:
+                pending.append(
+                    executor.submit(
+                        _derive_chunk, *args, i, j, address_type, self.network
+                    )
+                )
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def derive_range_packed(self, start, stop, workers=None):
+        """Returns the SECs and hash160s of the children start..stop-1
+        (see derive_range) packed into two bytes objects. The SEC of
+        child start + i is secs[33 * i : 33 * i + 33] and its hash160 is
+        hash160s[20 * i : 20 * i + 20]."""
+        secs, hash160s = [], []
+        for _, sec, h160 in self.derive_range(start, stop, workers=workers):
+            secs.append(sec)
+            hash160s.append(h160)
+        return b"".join(secs), b"".join(hash160s)
+
     def traverse(self, path):
         """Returns the HDPublicKey at the path indicated.
-        Path should be in the form of m/x/y/z."""
-
-        if not path.startswith("m"):
-            raise ValueError(f"Invalid Path: {path}")
-
-        # accept path in uppercase and/or using h instead of '
-        path = path.lower().replace("h", "'")
-
+        Path should be a Bip32Path or in the form of m/x/y/z."""
+        path = Bip32Path.parse(path)
+        # raise a ValueError if the path has a hardened child
+        if path.is_hardened():
+            raise ValueError("HDPublicKey cannot get hardened child")
         # start current node at self
         current = self
-        # get components of the path split at '/', ignoring the first
-        components = path.split("/")[1:]
-        # iterate through the components
-        for child in components:
-            # raise a ValueError if the path ends with a '
-            if child[-1:] == "'":
-                raise ValueError("HDPublicKey cannot get hardened child")
+        for index in path:
             # traverse the next child at the index
-            current = current.child(int(child))
+            current = current.child(index)
         # return the current node
         return current
 
@@ -589,8 +751,8 @@ class HDPublicKey:
     @classmethod
     def parse(cls, s):
         """Returns a HDPublicKey from an extended key string"""
-        # get the bytes from the base58 using raw_decode_base58
-        raw = raw_decode_base58(s)
+        # get the bytes from the base58, recently parsed ones are cached
+        raw = _XPUB_CACHE.get(s, _decode_xpub)
         # check that the length of the raw is 78 bytes, otherwise raise ValueError
         if len(raw) != 78:
             raise ValueError("Not a proper extended key")
@@ -640,12 +802,7 @@ def calc_valid_seedpicker_checksums(first_words):
 
     For normal useage, just grab the first one only
     """
-    for word in BIP39:
-        try:
-            HDPrivateKey.from_mnemonic(first_words + " " + word)
-            yield (word)
-        except InvalidChecksumWordsError:
-            pass
+    return valid_checksum_words(first_words)
 
 
 def calc_num_valid_seedpicker_checksums(num_first_words):
@@ -663,31 +820,11 @@ def calc_num_valid_seedpicker_checksums(num_first_words):
 
 
 def is_valid_bip32_path(path):
-    path = path.lower().strip().replace("'", "h").replace("//", "/")  # be forgiving
-
-    if path == "m":
-        # Not really a path, but since this is valid in the library (traverses to itself) we're counting it as valid
-        return True
-
-    if not path.startswith("m/"):
-        return False
-
-    sub_paths = path[2:].split("/")
-    if len(sub_paths) >= 256:
-        # https://bitcoin.stackexchange.com/a/92057
+    """Whether path (a string or Bip32Path) parses, see Bip32Path.parse"""
+    try:
+        Bip32Path.parse(path)
+    except ValueError:
         return False
-
-    for sub_path in sub_paths:
-        if sub_path.endswith("h"):
-            sub_path = sub_path[:-1]
-        if not is_intable(sub_path):
-            return False
-        if int(sub_path) < 0:
-            return False
-        if int(sub_path) >= 2 ** 31:
-            # https://bitcoin.stackexchange.com/a/92057
-            return False
-
     return True
 
 
@@ -695,19 +832,15 @@ def ltrim_path(bip32_path, depth):
     """
     Left trim off a path by a given depth
     """
-    if not is_valid_bip32_path(bip32_path):
-        raise ValueError(f"Invalid bip32 path: {bip32_path}")
+    path = Bip32Path.parse(bip32_path)
 
-    # be forgiving
-    path = bip32_path.lower().strip().replace("'", "h").replace("//", "/")
-
-    if path.count("/") < depth:
+    if len(path) < depth:
         raise ValueError(
             f"Cannot left trim off a depth of {depth} from a path this short: {bip32_path}"
         )
 
-    to_return = path.split("/")[depth + 1 :]
-    return "m/" + "/".join(to_return)
+    # the trimmed path always has the slash, even if it's empty
+    return "m/" + path[depth:].to_string("h")[2:]
 
 
 def get_unhardened_child_path(base_path, root_path):
@@ -716,13 +849,6 @@ def get_unhardened_child_path(base_path, root_path):
 
     Return None if there is no child_path (or it require hardened derivation).
     """
-    if not is_valid_bip32_path(root_path):
-        raise ValueError(f"Invalid bip32_path: {root_path}")
-
-    base_path = base_path.strip().lower().replace("h", "'")
-    root_path = root_path.strip().lower().replace("h", "'")
-
-    if root_path.startswith(base_path):
-        child_path = root_path[len(base_path) :]
-        if "'" not in child_path:
-            return f"m{child_path}"
+    child_path = Bip32Path.parse(root_path).relative_to(base_path)
+    if child_path is not None and not child_path.is_hardened():
+        return str(child_path)
@@ -3,8 +3,10 @@ import hmac
 import re
 
 from base64 import b64decode, b64encode
-from buidl.pbkdf2 import PBKDF2
+from buidl.kdf import pbkdf2_hmac
+from collections import OrderedDict
 from io import BytesIO
+from threading import Lock
 
 try:
     from csiphash import siphash24
@@ -106,22 +108,35 @@ def sha256(s):
     return hashlib.sha256(s).digest()
 
 
+# base58 digit of each character
+_BASE58_VALUES = {c: i for i, c in enumerate(BASE58_ALPHABET)}
+# the base58 strings of 0 to 58**2 - 1, padded to 2 characters
+_BASE58_PAIRS = [a + b for a in BASE58_ALPHABET for b in BASE58_ALPHABET]
+# numbers are converted 10 base58 digits at a time, so the big integer
+# only gets divided (or multiplied) once for every 10 characters
+_BASE58_LIMB = 58 ** 10
+
+
 def encode_base58(s):
     # determine how many 0 bytes (b'\x00') s starts with
-    count = 0
-    for c in s:
-        if c == 0:
-            count += 1
-        else:
-            break
-    # convert from binary to hex, then hex to integer
-    num = int(s.hex(), 16)
-    result = ""
-    prefix = "1" * count
+    count = len(s) - len(s.lstrip(b"\x00"))
+    num = int.from_bytes(s, "big")
+    # split num into 10 digit limbs, least significant first
+    limbs = []
     while num > 0:
-        num, mod = divmod(num, 58)
-        result = BASE58_ALPHABET[mod] + result
-    return prefix + result
+        num, limb = divmod(num, _BASE58_LIMB)
+        limbs.append(limb)
+    pairs = _BASE58_PAIRS
+    chunks = [
+        pairs[limb // 58 ** 8]
+        + pairs[limb // 58 ** 6 % 3364]
+        + pairs[limb // 58 ** 4 % 3364]
+        + pairs[limb // 3364 % 3364]
+        + pairs[limb % 3364]
+        for limb in reversed(limbs)
+    ]
+    # the most significant limb is padded with zeros (1's)
+    return "1" * count + "".join(chunks).lstrip("1")
 
 
 def encode_base58_checksum(raw):
@@ -132,31 +147,58 @@ def encode_base58_checksum(raw):
     return encode_base58(raw + checksum)
 
 
-def raw_decode_base58(s):
+def _decode_base58(s):
+    # each leading 1 is a 0 byte
+    count = len(s) - len(s.lstrip("1"))
+    values = _BASE58_VALUES
     num = 0
-    # see how many leading 0's we are starting with
-    prefix = b""
-    for c in s:
-        if num == 0 and c == "1":
-            prefix += b"\x00"
-        else:
-            num = 58 * num + BASE58_ALPHABET.index(c)
-    # put everything into base64
-    byte_array = []
-    while num > 0:
-        byte_array.insert(0, num & 255)
-        num >>= 8
-    combined = prefix + bytes(byte_array)
+    try:
+        for i in range(count, len(s), 10):
+            limb = 0
+            chunk = s[i : i + 10]
+            for c in chunk:
+                limb = limb * 58 + values[c]
+            num = num * 58 ** len(chunk) + limb
+    except KeyError:
+        raise ValueError(f"not a base58 string: {s}")
+    return b"\x00" * count + num.to_bytes((num.bit_length() + 7) // 8, "big")
+
+
+def _decode_base58_checksum(s):
+    combined = _decode_base58(s)
     checksum = combined[-4:]
     if hash256(combined[:-4])[:4] != checksum:
         raise RuntimeError("bad address: {} {}".format(checksum, hash256(combined)[:4]))
     return combined[:-4]
 
 
+def raw_decode_base58(s):
+    """Returns the bytes of a base58 string with a checksum (the checksum
+    is checked and dropped)"""
+    return _decode_base58_checksum(s)
+
+
 def decode_base58(s):
     return raw_decode_base58(s)[1:]
 
 
+def encode_base58_many(items, checksum=True):
+    """Returns the base58 string of each of items (bytes), with a checksum
+    unless checksum is False"""
+    if checksum:
+        return [encode_base58(raw + hash256(raw)[:4]) for raw in items]
+    return [encode_base58(raw) for raw in items]
+
+
+def decode_base58_many(strings, checksum=True):
+    """Returns the bytes of each of the base58 strings. By default they
+    have a checksum, which is checked and dropped like raw_decode_base58
+    does."""
+    if checksum:
+        return [_decode_base58_checksum(s) for s in strings]
+    return [_decode_base58(s) for s in strings]
+
+
 def read_varint(s):
     """reads a variable integer from a stream"""
     b = s.read(1)
@@ -177,6 +219,29 @@ def read_varint(s):
         return i
 
 
+def read_varint_at(b, offset):
+    """reads a variable integer from a bytes-like object at offset
+    returns the integer and the offset right after it"""
+    if offset >= len(b):
+        raise IOError("buffer has too few bytes")
+    i = b[offset]
+    if i == 0xFD:
+        # 0xfd means the next two bytes are the number
+        end = offset + 3
+    elif i == 0xFE:
+        # 0xfe means the next four bytes are the number
+        end = offset + 5
+    elif i == 0xFF:
+        # 0xff means the next eight bytes are the number
+        end = offset + 9
+    else:
+        # anything else is just the integer
+        return i, offset + 1
+    if end > len(b):
+        raise IOError("buffer has too few bytes")
+    return little_endian_to_int(b[offset + 1 : end]), end
+
+
 def encode_varint(i):
     """encodes an integer as a varint"""
     if i < 0xFD:
@@ -326,13 +391,11 @@ def hmac_sha512(key, msg):
 
 
 def hmac_sha512_kdf(msg, salt):
-    return PBKDF2(
-        msg,
-        salt,
-        iterations=PBKDF2_ROUNDS,
-        macmodule=hmac,
-        digestmodule=hashlib.sha512,
-    ).read(64)
+    if isinstance(msg, str):
+        msg = msg.encode("utf-8")
+    if isinstance(salt, str):
+        salt = salt.encode("utf-8")
+    return pbkdf2_hmac("sha512", msg, salt, PBKDF2_ROUNDS, 64)
 
 
 def base64_encode(b):
@@ -358,25 +421,18 @@ def child_to_path(child_number):
 
 
 def path_network(root_path):
-    components = root_path.split("/")
-    if len(components) < 2:
+    path = Bip32Path.parse(root_path)
+    if len(path) < 2:
         return "mainnet"
-    elif components[1] in ("44'", "84'", "48'") and components[2] == "1'":
+    elif path[0] in (0x8000002C, 0x80000054, 0x80000030) and path[1] == 0x80000001:
+        # 44', 84' or 48' followed by 1'
         return "testnet"
     else:
         return "mainnet"
 
 
 def parse_binary_path(bin_path):
-    if len(bin_path) % 4 != 0:
-        raise ValueError("Not a valid binary path: {}".format(bin_path.hex()))
-    path_data = bin_path
-    path = "m"
-    while len(path_data):
-        child_number = little_endian_to_int(path_data[:4])
-        path += child_to_path(child_number)
-        path_data = path_data[4:]
-    return path
+    return str(Bip32Path.parse_binary(bin_path))
 
 
 def bits_to_target(bits):
@@ -538,3 +594,233 @@ def is_intable(int_as_string):
         return True
     except ValueError:
         return False
+
+
+class LRUCache:
+    """Bounded cache that drops the least recently used entries once it
+    has maxsize of them. hits and misses count the lookups.
+    Safe to share between threads."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, make):
+        """Returns the value for key, calling make(key) and storing the
+        result if it isn't cached. Errors aren't cached."""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = make(key)
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def hit_rate(self):
+        """The fraction of lookups that were hits"""
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def clear(self):
+        """Empties the cache and resets the counters"""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class ParseCache(LRUCache):
+    """LRUCache of objects parsed from their serialization"""
+
+    def get(self, serialized, parse):
+        """Returns the object for serialized (bytes), calling
+        parse(serialized) if it isn't cached. Errors aren't cached."""
+        if type(serialized) != bytes:
+            # bytearrays and the like can't be keys
+            return parse(serialized)
+        return super().get(serialized, parse)
+
+
+# Bip32Paths by their child numbers, string and binary forms, see Bip32Path
+_BIP32_PATHS = LRUCache(4096)
+_BIP32_PATH_STRINGS = LRUCache(4096)
+_BIP32_PATH_BINARIES = ParseCache(4096)
+
+
+class Bip32Path:
+    """An immutable BIP32 path: the child numbers from the root, where
+    hardened ones are 0x80000000 and up.
+    Paths are interned, so parsing or deriving a path that was used
+    recently is a dict lookup and the string and binary forms are only
+    computed once."""
+
+    __slots__ = ("child_numbers", "_binary", "_strings")
+
+    def __new__(cls, child_numbers=()):
+        return _BIP32_PATHS.get(tuple(child_numbers), cls._make)
+
+    @classmethod
+    def _make(cls, child_numbers):
+        if len(child_numbers) >= 256:
+            # https://bitcoin.stackexchange.com/a/92057
+            raise ValueError("BIP32 paths can be at most 255 deep")
+        for child_number in child_numbers:
+            if type(child_number) is not int or not 0 <= child_number < 2 ** 32:
+                raise ValueError(f"Invalid child number: {child_number}")
+        path = super().__new__(cls)
+        object.__setattr__(path, "child_numbers", child_numbers)
+        object.__setattr__(
+            path,
+            "_binary",
+            b"".join(int_to_little_endian(c, 4) for c in child_numbers),
+        )
+        # string forms by the hardened marker, see to_string
+        object.__setattr__(path, "_strings", {})
+        return path
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Bip32Path is immutable")
+
+    def __reduce__(self):
+        return (Bip32Path, (self.child_numbers,))
+
+    def __eq__(self, other):
+        if not isinstance(other, Bip32Path):
+            return NotImplemented
+        return self.child_numbers == other.child_numbers
+
+    def __hash__(self):
+        return hash(self.child_numbers)
+
+    def __len__(self):
+        return len(self.child_numbers)
+
+    def __iter__(self):
+        return iter(self.child_numbers)
+
+    def __getitem__(self, index):
+        """A child number, or a Bip32Path for a slice: path[2:] is the
+        rest of the path after the first 2 levels"""
+        if isinstance(index, slice):
+            return Bip32Path(self.child_numbers[index])
+        return self.child_numbers[index]
+
+    def __add__(self, other):
+        """The path other (a Bip32Path or a string) continuing from this one"""
+        return Bip32Path(self.child_numbers + Bip32Path.parse(other).child_numbers)
+
+    def __str__(self):
+        return self.to_string()
+
+    def __repr__(self):
+        return f'Bip32Path("{self}")'
+
+    def to_string(self, hardened="'"):
+        """Returns the path as m/x/y/z, hardened children are marked with
+        hardened (' or h)"""
+        string = self._strings.get(hardened)
+        if string is None:
+            string = "m"
+            for child_number in self.child_numbers:
+                if child_number >= 0x80000000:
+                    string += f"/{child_number - 0x80000000}{hardened}"
+                else:
+                    string += f"/{child_number}"
+            self._strings[hardened] = string
+        return string
+
+    def serialize(self):
+        """The child numbers as 4 byte little-endian integers, which is
+        how PSBTs store paths"""
+        return self._binary
+
+    def is_hardened(self):
+        """Whether any of the children is hardened"""
+        return any(child_number >= 0x80000000 for child_number in self.child_numbers)
+
+    def child(self, child_number):
+        return Bip32Path(self.child_numbers + (child_number,))
+
+    def parent(self):
+        """The path one level up, raises ValueError for m"""
+        if not self.child_numbers:
+            raise ValueError("m has no parent")
+        return Bip32Path(self.child_numbers[:-1])
+
+    def is_ancestor_of(self, other):
+        """Whether other goes through this path (a path is its own ancestor)"""
+        depth = len(self.child_numbers)
+        return other.child_numbers[:depth] == self.child_numbers
+
+    def relative_to(self, ancestor):
+        """The rest of this path after ancestor, None if ancestor isn't
+        an ancestor of this path"""
+        ancestor = Bip32Path.parse(ancestor)
+        if not ancestor.is_ancestor_of(self):
+            return None
+        return self[len(ancestor) :]
+
+    @classmethod
+    def parse(cls, path):
+        """Returns the Bip32Path of a string like m/48h/1h/0h/2h or
+        m/44'/1'/0', which is case insensitive and forgiving of
+        surrounding whitespace and double slashes.
+        A Bip32Path is returned as is. Raises ValueError for invalid paths."""
+        if isinstance(path, Bip32Path):
+            return path
+        if type(path) is not str:
+            raise TypeError(f"Not a BIP32 path: {path!r}")
+        return _BIP32_PATH_STRINGS.get(path, cls._parse_string)
+
+    @classmethod
+    def _parse_string(cls, path):
+        # be forgiving
+        normalized = path.lower().strip().replace("'", "h").replace("//", "/")
+        if normalized == "m":
+            return cls()
+        if not normalized.startswith("m/"):
+            raise ValueError(f"Invalid BIP32 path: {path}")
+        child_numbers = []
+        for component in normalized[2:].split("/"):
+            if component.endswith("h"):
+                offset = 0x80000000
+                component = component[:-1]
+            else:
+                offset = 0
+            try:
+                index = int(component)
+            except ValueError:
+                raise ValueError(f"Invalid BIP32 path: {path}")
+            if not 0 <= index < 0x80000000:
+                # https://bitcoin.stackexchange.com/a/92057
+                raise ValueError(f"Invalid BIP32 path: {path}")
+            child_numbers.append(index + offset)
+        return cls(child_numbers)
+
+    @classmethod
+    def parse_binary(cls, bin_path):
+        """Returns the Bip32Path of 4 byte little-endian child numbers"""
+        return _BIP32_PATH_BINARIES.get(bin_path, cls._parse_binary)
+
+    @classmethod
+    def _parse_binary(cls, bin_path):
+        if len(bin_path) % 4 != 0:
+            raise ValueError("Not a valid binary path: {}".format(bin_path.hex()))
+        return cls(
+            little_endian_to_int(bin_path[i : i + 4])
+            for i in range(0, len(bin_path), 4)
+        )
@@ -0,0 +1,60 @@
+"""
+Key derivation functions, with the fastest implementation available.
+
+PBKDF2 uses hashlib's pbkdf2_hmac (OpenSSL) when Python has it and the
+pure python PBKDF2 in buidl.pbkdf2 otherwise. Other KDFs (scrypt, argon2,
+...) are looked up by name with get_kdf and can be plugged in with
+register_kdf.
+"""
+
+import hashlib
+
+from buidl.pbkdf2 import PBKDF2
+
+
+def pbkdf2_hmac_python(hash_name, password, salt, iterations, dklen=None):
+    """Same as hashlib.pbkdf2_hmac, computed with buidl.pbkdf2"""
+    if dklen is None:
+        dklen = hashlib.new(hash_name).digest_size
+    return PBKDF2(password, salt, iterations=iterations, digestmodule=hash_name).read(
+        dklen
+    )
+
+
+# name: function. The functions take the same arguments as the
+# implementation they're named after (hashlib.pbkdf2_hmac, hashlib.scrypt)
+KDFS = {}
+
+try:
+    # hashlib only has pbkdf2_hmac when Python is built with OpenSSL
+    from hashlib import pbkdf2_hmac as _pbkdf2_hmac
+
+    KDFS["pbkdf2_hmac"] = _pbkdf2_hmac
+except ImportError:
+    KDFS["pbkdf2_hmac"] = pbkdf2_hmac_python
+
+if hasattr(hashlib, "scrypt"):
+    KDFS["scrypt"] = hashlib.scrypt
+
+
+def register_kdf(name, function):
+    """Makes function the implementation of the KDF name,
+    replacing the current one if there is one"""
+    if not callable(function):
+        raise TypeError(f"{function} is not callable")
+    KDFS[name] = function
+
+
+def get_kdf(name):
+    """Returns the implementation of the KDF name"""
+    try:
+        return KDFS[name]
+    except KeyError:
+        raise ValueError(
+            f"KDF {name} is not available, add it with register_kdf"
+        ) from None
+
+
+def pbkdf2_hmac(hash_name, password, salt, iterations, dklen=None):
+    """PBKDF2 with the registered implementation, see hashlib.pbkdf2_hmac"""
+    return KDFS["pbkdf2_hmac"](hash_name, password, salt, iterations, dklen)
@@ -1,8 +1,11 @@
+import hashlib
+
+from concurrent.futures import ProcessPoolExecutor
 from os import path
 from secrets import randbits
 from time import time
 
-from buidl.helper import big_endian_to_int, int_to_big_endian, sha256
+from buidl.helper import big_endian_to_int, hmac_sha512_kdf, int_to_big_endian, sha256
 
 
 class InvalidBIP39Length(Exception):
@@ -98,6 +101,72 @@ def bytes_to_mnemonic(b, num_bits):
     return " ".join(mnemonic)
 
 
+def valid_checksum_words(first_words):
+    """
+    Generator of the words that complete first_words (all but the last word
+    of a mnemonic) into a mnemonic with a valid checksum, in wordlist order.
+    Only the checksums are computed, there's no seed derivation involved.
+    """
+    words = first_words.split()
+    num_words = len(words) + 1
+    if num_words not in (12, 15, 18, 21, 24):
+        raise InvalidBIP39Length(
+            f"{num_words} words (you need 12, 15, 18, 21, or 24 words)"
+        )
+    prefix = 0
+    for word in words:
+        prefix <<= 11
+        prefix += BIP39[word]
+    num_checksum_bits = num_words // 3
+    # the last word is free_bits of entropy followed by the checksum
+    free_bits = 11 - num_checksum_bits
+    num_bytes = (num_words * 11 - num_checksum_bits) // 8
+    # free_bits is at most 7, so only the last byte of the entropy changes
+    #  and we can hash everything before it just once
+    entropy = int_to_big_endian(prefix << free_bits, num_bytes)
+    base = hashlib.sha256(entropy[:-1])
+    last_byte = entropy[-1]
+    for free in range(1 << free_bits):
+        h = base.copy()
+        h.update(bytes([last_byte | free]))
+        checksum = h.digest()[0] >> (8 - num_checksum_bits)
+        yield BIP39[(free << num_checksum_bits) | checksum]
+
+
+def mnemonic_to_seed(mnemonic, password=b""):
+    """returns the BIP39 seed of the mnemonic, which is checked first"""
+    mnemonic_to_bytes(mnemonic)
+    # normalize in case we got a mnemonic that's just the first 4 letters
+    normalized = " ".join([BIP39.normalize(word) for word in mnemonic.split()])
+    # salt is b'mnemonic' + password
+    return hmac_sha512_kdf(normalized, b"mnemonic" + password)
+
+
+def seeds_from_mnemonics(mnemonics, passphrases=None, workers=None):
+    """
+    Returns the seeds of the mnemonics (see mnemonic_to_seed) in order.
+    passphrases has the password of each mnemonic, they're all b"" if it's None.
+    If workers is more than 1, the seeds are computed in that many processes.
+    """
+    mnemonics = list(mnemonics)
+    if passphrases is None:
+        passphrases = [b""] * len(mnemonics)
+    else:
+        passphrases = list(passphrases)
+        if len(passphrases) != len(mnemonics):
+            raise ValueError(
+                f"{len(mnemonics)} mnemonics but {len(passphrases)} passphrases"
+            )
+    if workers is None or workers < 2 or len(mnemonics) < 2:
+        return [mnemonic_to_seed(m, p) for m, p in zip(mnemonics, passphrases)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # a few chunks per process so that they all finish around the same time
+        chunksize = max(1, len(mnemonics) // (4 * workers))
+        return list(
+            executor.map(mnemonic_to_seed, mnemonics, passphrases, chunksize=chunksize)
+        )
+
+
 class WordList:
     def __init__(self, filename, num_words):
         word_file = path.join(path.dirname(__file__), filename)
@@ -662,9 +662,9 @@ def op_checksig(stack, z):
     # get the der_signature with stack.pop()[:-1] (last byte is removed)
     der_signature = stack.pop()[:-1]
     # parse the sec format pubkey with S256Point
-    point = S256Point.parse(sec_pubkey)
+    point = S256Point.parse_cached(sec_pubkey)
     # parse the der format signature with Signature
-    sig = Signature.parse(der_signature)
+    sig = Signature.parse_cached(der_signature)
     # verify using the point, z and signature
     # if verified add encode_num(1) to the end, otherwise encode_num(0)
     if point.verify(z, sig):
@@ -697,24 +697,25 @@ def op_checkmultisig(stack, z):
     # OP_CHECKMULTISIG bug
     stack.pop()
     try:
-        # parse the sec pubkeys into an array of points
-        points = [S256Point.parse(sec) for sec in sec_pubkeys]
+        # the sec pubkeys, parsed only when a signature is checked against them
+        secs = list(sec_pubkeys)
         # parse the der_signatures into an array of signatures
-        sigs = [Signature.parse(der) for der in der_signatures]
+        sigs = [Signature.parse_cached(der) for der in der_signatures]
         # loop through the signatures
-        for sig in sigs:
-            # bail early if we don't have any points left
-            if len(points) == 0:
-                print("signatures no good or not in right order")
-                return False
-            # while we have points
-            while points:
-                # get the point at the front (points.pop(0))
-                point = points.pop(0)
+        for i, sig in enumerate(sigs):
+            # the signatures are in the same order as the pubkeys, so this
+            # one can't match any of the pubkeys the ones after it need
+            while len(secs) >= len(sigs) - i:
+                # get the point at the front (secs.pop(0))
+                point = S256Point.parse_cached(secs.pop(0))
                 # see if this point can verify this sig with this z
                 if point.verify(z, sig):
                     # break if so, this sig is valid!
                     break
+            else:
+                # not enough points left
+                print("signatures no good or not in right order")
+                return False
         # if we made it this far, we have to add a 1 to the stack
         # use encode_num(1)
         stack.append(encode_num(1))
@@ -2,8 +2,10 @@ from io import BytesIO
 
 import hmac
 import hashlib
+import sys
 
 from buidl.helper import (
+    ParseCache,
     big_endian_to_int,
     encode_base58_checksum,
     hash160,
@@ -191,6 +193,344 @@ B = 7
 P = 2 ** 256 - 2 ** 32 - 977
 N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
 
+# parsed S256Points by SEC and Signatures by DER, see parse_cached
+SEC_CACHE = ParseCache()
+DER_CACHE = ParseCache()
+
+
+# The S256Point arithmetic below works on plain integers instead of
+# S256Field objects. Points are kept in Jacobian coordinates (X, Y, Z),
+# which stand for the affine point (X/Z^2, Y/Z^3), so additions and
+# doublings don't need a modular inversion. None is the point at infinity.
+# Affine points are (x, y) tuples.
+
+
+# python 3.8+ can invert with pow, which is much faster than Fermat's little theorem
+_POW_INVERSE = sys.version_info >= (3, 8)
+
+
+def _inverse(a, m=P):
+    """Returns 1/a mod m, m has to be prime"""
+    if _POW_INVERSE:
+        return pow(a, -1, m)
+    return pow(a, m - 2, m)
+
+
+def _jacobian_double(p):
+    """Returns 2*p, using the a=0 doubling formulas"""
+    if p is None:
+        return None
+    x1, y1, z1 = p
+    if not y1:
+        return None
+    yy = y1 * y1 % P
+    s = 4 * x1 * yy % P
+    m = 3 * x1 * x1 % P
+    x3 = (m * m - 2 * s) % P
+    y3 = (m * (s - x3) - 8 * yy * yy) % P
+    z3 = 2 * y1 * z1 % P
+    return (x3, y3, z3)
+
+
+def _jacobian_add_affine(p, x2, y2):
+    """Returns p + (x2, y2) where p is Jacobian and (x2, y2) is affine"""
+    if p is None:
+        return (x2, y2, 1)
+    x1, y1, z1 = p
+    zz = z1 * z1 % P
+    h = (x2 * zz - x1) % P
+    r = (y2 * z1 * zz - y1) % P
+    if not h:
+        if not r:
+            return _jacobian_double(p)
+        return None
+    hh = h * h % P
+    hhh = h * hh % P
+    v = x1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - y1 * hhh) % P
+    z3 = z1 * h % P
+    return (x3, y3, z3)
+
+
+def _jacobian_add(p, q):
+    """Returns p + q where both are Jacobian"""
+    if p is None:
+        return q
+    if q is None:
+        return p
+    x1, y1, z1 = p
+    x2, y2, z2 = q
+    z1z1 = z1 * z1 % P
+    z2z2 = z2 * z2 % P
+    u1 = x1 * z2z2 % P
+    s1 = y1 * z2 * z2z2 % P
+    h = (x2 * z1z1 - u1) % P
+    r = (y2 * z1 * z1z1 - s1) % P
+    if not h:
+        if not r:
+            return _jacobian_double(p)
+        return None
+    hh = h * h % P
+    hhh = h * hh % P
+    v = u1 * hh % P
+    x3 = (r * r - hhh - 2 * v) % P
+    y3 = (r * (v - x3) - s1 * hhh) % P
+    z3 = z1 * z2 * h % P
+    return (x3, y3, z3)
+
+
+def _to_affine(p):
+    """Returns the (x, y) of a Jacobian point, None for infinity"""
+    if p is None:
+        return None
+    x, y, z = p
+    z_inv = _inverse(z)
+    zz_inv = z_inv * z_inv % P
+    return (x * zz_inv % P, y * zz_inv * z_inv % P)
+
+
+def _batch_to_affine(points):
+    """Converts a list of Jacobian points (none of them infinity) to affine
+    with a single inversion (Montgomery's trick)"""
+    # products[i] is the product of the first i z's
+    products = [1]
+    for _, _, z in points:
+        products.append(products[-1] * z % P)
+    inv = _inverse(products[-1])
+    result = [None] * len(points)
+    for i in range(len(points) - 1, -1, -1):
+        x, y, z = points[i]
+        # the inverse of this z is inv times the product of the z's before it
+        z_inv = inv * products[i] % P
+        inv = inv * z % P
+        zz_inv = z_inv * z_inv % P
+        result[i] = (x * zz_inv % P, y * zz_inv * z_inv % P)
+    return result
+
+
+# Fixed-base multiplication of G: the scalar is split into 6-bit windows
+# and _G_TABLE[i][j] is (j+1) * 64^i * G in affine coordinates, so k*G
+# takes at most 43 additions and no doublings.
+_G_WINDOW = 6
+_G_TABLE = None
+
+
+def _g_table():
+    global _G_TABLE
+    if _G_TABLE is None:
+        size = (1 << _G_WINDOW) - 1
+        points = []
+        base = (G.x.num, G.y.num, 1)
+        for _ in range(0, 256, _G_WINDOW):
+            current = base
+            for _ in range(size):
+                points.append(current)
+                current = _jacobian_add(current, base)
+            # current is now 64 times base
+            base = current
+        points = _batch_to_affine(points)
+        _G_TABLE = [points[i : i + size] for i in range(0, len(points), size)]
+    return _G_TABLE
+
+
+def _mul_g(k):
+    """Returns k*G in Jacobian coordinates, k should be in [0, N)"""
+    result = None
+    mask = (1 << _G_WINDOW) - 1
+    for row in _g_table():
+        digit = k & mask
+        if digit:
+            x, y = row[digit - 1]
+            result = _jacobian_add_affine(result, x, y)
+        k >>= _G_WINDOW
+        if not k:
+            break
+    return result
+
+
+def _add_mul_g_batch(x, y, scalars):
+    """Returns the affine (x, y) + k*G for each k in scalars (in [0, N)),
+    None where that's the point at infinity.
+    Same windows as _mul_g, but the sums are kept in affine coordinates
+    and each round of additions (one per row of _G_TABLE) shares a
+    single inversion (Montgomery's trick), which is cheaper than a mixed
+    Jacobian addition per point once there are more than a few."""
+    count = len(scalars)
+    xs = [x] * count
+    ys = [y] * count
+    mask = (1 << _G_WINDOW) - 1
+    remaining = list(scalars)
+    # sums that ran into doubling (or infinity) are done with _mul_g instead
+    special = []
+    for row in _g_table():
+        additions = []
+        # products[j] is the product of the first j denominators
+        products = [1]
+        product = 1
+        for i, k in enumerate(remaining):
+            digit = k & mask
+            if digit:
+                x2, y2 = row[digit - 1]
+                denominator = x2 - xs[i]
+                if not denominator % P:
+                    special.append(i)
+                    remaining[i] = 0
+                    continue
+                additions.append((i, x2, y2, denominator))
+                product = product * denominator % P
+                products.append(product)
+        inv = _inverse(product)
+        for j in range(len(additions) - 1, -1, -1):
+            i, x2, y2, denominator = additions[j]
+            x1 = xs[i]
+            # inv * products[j] is 1 / denominator
+            slope = (y2 - ys[i]) * inv * products[j] % P
+            inv = inv * denominator % P
+            x3 = (slope * slope - x1 - x2) % P
+            ys[i] = (slope * (x1 - x3) - ys[i]) % P
+            xs[i] = x3
+        remaining = [k >> _G_WINDOW for k in remaining]
+    sums = list(zip(xs, ys))
+    for i in special:
+        sums[i] = _to_affine(_jacobian_add_affine(_mul_g(scalars[i]), x, y))
+    return sums
+
+
+# secp256k1 has an efficient endomorphism: lambda*(x, y) == (beta*x, y).
+# A scalar k splits into k1 + k2*lambda where k1 and k2 are about
+# 128 bits, which halves the number of doublings.
+_BETA = 0x7AE96A2B657C07106E64479EAC3434E99CF0497512F58995C1396C28719501EE
+_LAMBDA = 0x5363AD4CC05C30E0A5261C028812645A122E22EA20816678DF02967C1B23BD72
+# short basis of the lattice {(a, b): a + b*lambda == 0 mod N}
+_GLV_A1 = 0x3086D221A7D46BCDE86C90E49284EB15
+_GLV_B1 = -0xE4437ED6010E88286F547FA90ABFE4C3
+_GLV_A2 = 0x114CA50F7A8E2F3F657C1108D9D44CFD8
+_GLV_B2 = _GLV_A1
+
+
+def _glv_split(k):
+    """Returns (k1, k2) such that k1 + k2*lambda == k mod N"""
+    c1 = (_GLV_B2 * k + N // 2) // N
+    c2 = (-_GLV_B1 * k + N // 2) // N
+    k1 = k - c1 * _GLV_A1 - c2 * _GLV_A2
+    k2 = -c1 * _GLV_B1 - c2 * _GLV_B2
+    return k1, k2
+
+
+# window width for the wNAF of variable-base scalars
+_WNAF_WIDTH = 5
+
+
+def _wnaf(k, width=_WNAF_WIDTH):
+    """Returns the width-w non-adjacent form of k >= 0, least significant
+    digit first. Every non-zero digit is odd, less than 2^(w-1) in absolute
+    value and followed by at least w-1 zeros."""
+    digits = []
+    window = 1 << width
+    half = window >> 1
+    while k:
+        if k & 1:
+            digit = k & (window - 1)
+            if digit >= half:
+                digit -= window
+            k -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        k >>= 1
+    return digits
+
+
+def _odd_multiples(x, y, width=_WNAF_WIDTH):
+    """Returns [P, 3P, 5P, ..., (2^(w-1)-1)P] in affine coordinates"""
+    base = (x, y, 1)
+    double = _jacobian_double(base)
+    points = [base]
+    for _ in range((1 << (width - 2)) - 1):
+        points.append(_jacobian_add(points[-1], double))
+    return _batch_to_affine(points)
+
+
+def _point_tables(x, y, width=_WNAF_WIDTH):
+    """Returns the odd multiples of (x, y) and of lambda*(x, y)"""
+    table = _odd_multiples(x, y, width)
+    # the endomorphism only changes x, so the same multiples work
+    return table, [(_BETA * tx % P, ty) for tx, ty in table]
+
+
+# G is also used in Strauss multiplications (see verify) with wider windows
+# since its tables are only built once
+_G_WNAF_WIDTH = 8
+_G_WNAF_TABLES = None
+
+
+def _g_wnaf_tables():
+    global _G_WNAF_TABLES
+    if _G_WNAF_TABLES is None:
+        _G_WNAF_TABLES = _point_tables(G.x.num, G.y.num, _G_WNAF_WIDTH)
+    return _G_WNAF_TABLES
+
+
+def _glv_terms(k, tables, width=_WNAF_WIDTH):
+    """Returns the (wNAF digits, table) terms for k times the point whose
+    _point_tables are tables"""
+    terms = []
+    for scalar, table in zip(_glv_split(k), tables):
+        digits = _wnaf(abs(scalar), width)
+        if scalar < 0:
+            digits = [-digit for digit in digits]
+        terms.append((digits, table))
+    return terms
+
+
+def _strauss(terms):
+    """Returns the sum of the (wNAF digits, table) terms in Jacobian
+    coordinates. This is Straus's (Shamir's trick) multi-scalar
+    multiplication: all the terms share one chain of doublings."""
+    # the points to add after doubling, by bit position
+    adds = [[] for _ in range(max((len(digits) for digits, _ in terms), default=0))]
+    for digits, table in terms:
+        for i, digit in enumerate(digits):
+            if digit > 0:
+                adds[i].append(table[digit >> 1])
+            elif digit < 0:
+                tx, ty = table[-digit >> 1]
+                adds[i].append((tx, P - ty))
+    result = None
+    for points in reversed(adds):
+        result = _jacobian_double(result)
+        for tx, ty in points:
+            result = _jacobian_add_affine(result, tx, ty)
+    return result
+
+
+def _mul(k, x, y):
+    """Returns k*(x, y) in Jacobian coordinates, k should be in [0, N)"""
+    return _strauss(_glv_terms(k, _point_tables(x, y)))
+
+
+def _verify(z, r, s, tables):
+    """Checks the signature (r, s) of z for the point whose _point_tables
+    are tables"""
+    if not (0 < r < N and 0 < s < N):
+        return False
+    # remember 1/s = pow(s, N-2, N)
+    s_inv = _inverse(s, N)
+    # u = z / s
+    u = z * s_inv % N
+    # v = r / s
+    v = r * s_inv % N
+    # u*G + v*P should have as the x coordinate, r
+    terms = _glv_terms(u, _g_wnaf_tables(), _G_WNAF_WIDTH)
+    terms += _glv_terms(v, tables)
+    total = _strauss(terms)
+    if total is None:
+        return False
+    # compare r*Z^2 against X so we don't have to convert to affine
+    x, _, z = total
+    return x == r * z * z % P
+
 
 class S256Field(FieldElement):
     def __init__(self, num, prime=None):
@@ -223,17 +563,39 @@ class S256Point(Point):
         else:
             return "S256Point({},{})".format(hex(self.x.num), hex(self.y.num))
 
+    @classmethod
+    def _from_jacobian(cls, p):
+        """Makes an S256Point out of the integer Jacobian coordinates.
+        The point is known to be on the curve so that isn't checked again."""
+        affine = _to_affine(p)
+        if affine is None:
+            return cls(None, None)
+        point = cls.__new__(cls)
+        point.a, point.b = S256Field(A), S256Field(B)
+        point.x, point.y = S256Field(affine[0]), S256Field(affine[1])
+        return point
+
+    def _jacobian(self):
+        if self.x is None:
+            return None
+        return (self.x.num, self.y.num, 1)
+
     def __rmul__(self, coefficient):
         # we want to mod by N to make this simple
         coef = coefficient % N
-        return super().__rmul__(coef)
+        if self is G:
+            return self._from_jacobian(_mul_g(coef))
+        if self.x is None:
+            return self
+        return self._from_jacobian(_mul(coef, self.x.num, self.y.num))
 
     def __add__(self, other):
         """If other is an int, multiplies scalar by generator, adds result to current point"""
         if type(other) == int:
-            return super().__add__(other * G)
+            total = _mul_g(other % N)
         else:
-            return super().__add__(other)
+            total = other._jacobian()
+        return self._from_jacobian(_jacobian_add(self._jacobian(), total))
 
     def sec(self, compressed=True):
         # returns the binary version of the sec format, NOT hex
@@ -289,17 +651,19 @@ class S256Point(Point):
         """Returns the p2sh-p2wpkh base58 address string"""
         return self.p2wpkh_script().p2sh_address(network)
 
+    def _tables(self):
+        """The _point_tables of this point, kept so that points that are
+        verified against more than once (see parse_cached) build them once"""
+        tables = self.__dict__.get("_wnaf_tables")
+        if tables is None:
+            tables = self._wnaf_tables = _point_tables(self.x.num, self.y.num)
+        return tables
+
     def verify(self, z, sig):
-        # remember sig.r and sig.s are the main things we're checking
-        # remember 1/s = pow(s, N-2, N)
-        s_inv = pow(sig.s, N - 2, N)
-        # u = z / s
-        u = z * s_inv % N
-        # v = r / s
-        v = sig.r * s_inv % N
-        # u*G + v*P should have as the x coordinate, r
-        total = u * G + v * self
-        return total.x.num == sig.r
+        if self.x is None:
+            return False
+        # u*G + v*P is done in one go, see _verify
+        return _verify(z, sig.r, sig.s, self._tables())
 
     def verify_message(self, message, sig):
         """Verify a message in the form of bytes. Assumes that the z
@@ -335,6 +699,12 @@ class S256Point(Point):
         else:
             return S256Point(x, odd_beta)
 
+    @classmethod
+    def parse_cached(cls, sec_bin):
+        """Like parse but returns the same S256Point for the same SEC,
+        see SEC_CACHE. Don't modify the returned point."""
+        return SEC_CACHE.get(sec_bin, cls.parse)
+
 
 G = S256Point(
     0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
@@ -342,6 +712,42 @@ G = S256Point(
 )
 
 
+def verify_batch(items, threads=None):
+    """Verifies a list of (point, z, sig) and returns a list of whether
+    each signature is valid.
+    Points that show up more than once (even as different S256Point
+    objects) build their precomputed tables once. threads is accepted for
+    compatibility with cecc and ignored since pure python arithmetic
+    doesn't run in parallel."""
+    # _point_tables by (x, y)
+    tables = {}
+    results = []
+    for point, z, sig in items:
+        if point.x is None:
+            results.append(False)
+            continue
+        key = (point.x.num, point.y.num)
+        point_tables = tables.get(key)
+        if point_tables is None:
+            point_tables = tables[key] = point._tables()
+        results.append(_verify(z, sig.r, sig.s, point_tables))
+    return results
+
+
+def tweak_add_batch(point, tweaks):
+    """Returns the compressed SEC of point + tweak*G for each tweak.
+    See _add_mul_g_batch. Raises a ValueError if one of the sums is the
+    point at infinity, like cecc does."""
+    sums = _add_mul_g_batch(point.x.num, point.y.num, [t % N for t in tweaks])
+    secs = []
+    for tweak, xy in zip(tweaks, sums):
+        if xy is None:
+            raise ValueError(f"tweak {tweak} makes the point at infinity")
+        x, y = xy
+        secs.append((b"\x03" if y & 1 else b"\x02") + x.to_bytes(32, "big"))
+    return secs
+
+
 class Signature:
     def __init__(self, r, s):
         self.r = r
@@ -397,14 +803,28 @@ class Signature:
             raise RuntimeError("Signature too long")
         return cls(r, s)
 
+    @classmethod
+    def parse_cached(cls, der):
+        """Like parse but returns the same Signature for the same DER,
+        see DER_CACHE. Don't modify the returned signature."""
+        return DER_CACHE.get(der, cls.parse)
+
 
 class PrivateKey:
     def __init__(self, secret, network="mainnet", compressed=True):
         self.secret = secret
-        self.point = secret * G
+        # the public point is only computed when it's needed, see point
+        self._point = None
         self.network = network
         self.compressed = compressed
 
+    @property
+    def point(self):
+        """The public point, secret * G"""
+        if self._point is None:
+            self._point = self.secret * G
+        return self._point
+
     def hex(self):
         return "{:x}".format(self.secret).zfill(64)
 
@@ -414,7 +834,7 @@ class PrivateKey:
         # r is the x coordinate of the resulting point k*G
         r = (k * G).x.num
         # remember 1/k = pow(k, N-2, N)
-        k_inv = pow(k, N - 2, N)
+        k_inv = _inverse(k, N)
         # s = (z+r*secret) / k
         s = (z + r * self.secret) * k_inv % N
         if s > N / 2:
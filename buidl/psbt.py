@@ -6,11 +6,10 @@ from buidl.hd import HDPublicKey, ltrim_path
 from buidl.helper import (
     base64_decode,
     base64_encode,
-    child_to_path,
+    Bip32Path,
     encode_varstr,
     int_to_little_endian,
     little_endian_to_int,
-    parse_binary_path,
     path_network,
     read_varint,
     read_varstr,
@@ -71,11 +70,7 @@ def path_to_child(path_component):
 
 
 def serialize_binary_path(path):
-    path = path.lower().replace("h", "'")
-    bin_path = b""
-    for component in path.split("/")[1:]:
-        bin_path += int_to_little_endian(path_to_child(component), 4)
-    return bin_path
+    return Bip32Path.parse(path).serialize()
 
 
 class NamedPublicKey(S256Point):
@@ -86,16 +81,17 @@ class NamedPublicKey(S256Point):
 
     def add_raw_path_data(self, raw_path, network=None):
         self.root_fingerprint = raw_path[:4]
-        self.root_path = parse_binary_path(raw_path[4:])
+        self.bip32_path = Bip32Path.parse_binary(raw_path[4:])
+        self.root_path = str(self.bip32_path)
         self.raw_path = raw_path
         if network is None:
-            self.network = path_network(self.root_path)
+            self.network = path_network(self.bip32_path)
         else:
             self.network = network
 
     def replace_xfp(self, new_xfp):
         self.add_raw_path_data(
-            raw_path=bytes.fromhex(new_xfp) + serialize_binary_path(self.root_path),
+            raw_path=bytes.fromhex(new_xfp) + self.bip32_path.serialize(),
             network=self.network,
         )
 
@@ -118,12 +114,12 @@ class NamedHDPublicKey(HDPublicKey):
 
     def add_raw_path_data(self, raw_path, network=None):
         self.root_fingerprint = raw_path[:4]
-        bin_path = raw_path[4:]
-        self.root_path = parse_binary_path(bin_path)
-        if self.depth != len(bin_path) // 4:
+        self.bip32_path = Bip32Path.parse_binary(raw_path[4:])
+        self.root_path = str(self.bip32_path)
+        if self.depth != len(self.bip32_path):
             raise ValueError("raw path calculated depth and depth are different")
         if network is None:
-            self.network = path_network(self.root_path)
+            self.network = path_network(self.bip32_path)
         else:
             self.network = network
         self.raw_path = raw_path
@@ -132,6 +128,7 @@ class NamedHDPublicKey(HDPublicKey):
     def sync_point(self):
         self.point.__class__ = NamedPublicKey
         self.point.root_fingerprint = self.root_fingerprint
+        self.point.bip32_path = self.bip32_path
         self.point.root_path = self.root_path
         self.point.raw_path = self.raw_path
         self.point.network = self.network
@@ -140,8 +137,9 @@ class NamedHDPublicKey(HDPublicKey):
         child = super().child(index)
         child.__class__ = self.__class__
         child.root_fingerprint = self.root_fingerprint
-        child.root_path = self.root_path + child_to_path(index)
-        child.network = path_network(child.root_path)
+        child.bip32_path = self.bip32_path.child(index)
+        child.root_path = str(child.bip32_path)
+        child.network = path_network(child.bip32_path)
         child.raw_path = self.raw_path + int_to_little_endian(index, 4)
         child.sync_point()
         return child
@@ -379,6 +377,8 @@ class PSBT:
             psbt_in = PSBTIn(tx_in, script_sig=script_sig, witness=witness)
             # add PSBTIn to array
             psbt_ins.append(psbt_in)
+        # the inputs were changed in place
+        tx_obj.clear_caches()
 
         # create an array of PSBTOuts
         psbt_outs = []
@@ -428,7 +428,7 @@ class PSBT:
                 # if the fingerprints match
                 if named_pub.root_fingerprint == fingerprint:
                     # get the private key at the root_path of the NamedPublicKey
-                    private_key = hd_priv.traverse(named_pub.root_path).private_key
+                    private_key = hd_priv.traverse(named_pub.bip32_path).private_key
                     if psbt_in.use_segwit_signature():
                         sig = self.tx_obj.get_sig_segwit(
                             i,
@@ -516,6 +516,8 @@ class PSBT:
             if tx_obj.segwit:
                 # witness should be the PSBTIn witness or an empty Witness()
                 tx_in.witness = psbt_in.witness or Witness()
+        # the inputs were changed in place
+        tx_obj.clear_caches()
         # check to see that the transaction verifies
         if not tx_obj.verify():
             raise RuntimeError("transaction invalid")
@@ -704,7 +706,7 @@ class PSBT:
                         f"Root fingerprint {xfp} for input #{cnt} not in the hdpubkey_map you supplied"
                     )
 
-                trimmed_path = ltrim_path(named_pub.root_path, depth=hdpub.depth)
+                trimmed_path = ltrim_path(named_pub.bip32_path, depth=hdpub.depth)
                 if hdpub.traverse(trimmed_path).sec() != named_pub.sec():
                     raise SuspiciousTransaction(
                         f"xpub {hdpub} with path {named_pub.root_path} does not appear to be part of input # {cnt}"
@@ -815,7 +817,7 @@ class PSBT:
                             "Do a sweep transaction (1-output) if you want this wallet to cosign."
                         )
 
-                    trimmed_path = ltrim_path(named_pub.root_path, depth=hdpub.depth)
+                    trimmed_path = ltrim_path(named_pub.bip32_path, depth=hdpub.depth)
                     if hdpub.traverse(trimmed_path).sec() != named_pub.sec():
                         raise SuspiciousTransaction(
                             f"xpub {hdpub} with path {named_pub.root_path} does not appear to be part of output # {cnt}"
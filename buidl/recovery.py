@@ -0,0 +1,315 @@
+"""
+Recovers a forgotten BIP39 passphrase by trying candidates against
+something known about the wallet: its master fingerprint, an xpub or one
+of its addresses.
+
+Candidates can come from any iterable of strings. wordlist_candidates,
+typo_candidates and mask_candidates build the usual ones.
+"""
+
+import json
+import os
+import string
+import time
+import unicodedata
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, product
+
+from buidl.hd import HDPrivateKey, HDPublicKey
+from buidl.helper import hash256
+from buidl.mnemonic import BIP39, mnemonic_to_bytes, mnemonic_to_seed
+from buidl.script import (
+    address_to_script_pubkey,
+    P2PKHScriptPubKey,
+    P2SHScriptPubKey,
+    P2WPKHScriptPubKey,
+)
+
+
+# how many candidates are tried at a time by a process, which is also how
+# often progress is reported and the checkpoint is saved
+RECOVERY_BATCH = 100
+
+# the characters typo_candidates puts in
+TYPO_ALPHABET = string.ascii_letters + string.digits + string.punctuation + " "
+
+# what the placeholders of mask_candidates stand for, like hashcat's
+MASK_CHARSETS = {
+    "l": string.ascii_lowercase,
+    "u": string.ascii_uppercase,
+    "d": string.digits,
+    "s": string.punctuation + " ",
+    "a": TYPO_ALPHABET,
+    "?": "?",
+}
+
+
+def wordlist_candidates(filename):
+    """Yields each line of the file (without the line break)"""
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def _typos(word, alphabet):
+    """Yields the strings one typo away from word, likeliest kinds first"""
+    # wrong case
+    for i, c in enumerate(word):
+        if c.swapcase() != c:
+            yield word[:i] + c.swapcase() + word[i + 1 :]
+    # neighbours swapped
+    for i in range(len(word) - 1):
+        yield word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+    # missing character
+    for i in range(len(word)):
+        yield word[:i] + word[i + 1 :]
+    # wrong character
+    for i in range(len(word)):
+        for c in alphabet:
+            yield word[:i] + c + word[i + 1 :]
+    # extra character
+    for i in range(len(word) + 1):
+        for c in alphabet:
+            yield word[:i] + c + word[i:]
+
+
+def _more_typos(words, typos, alphabet):
+    """Yields the strings typos typos away from each of words. They're
+    not remembered, so the same string can come up more than once."""
+    for word in words:
+        # the strings one typo away from a single word are few
+        neighbours = dict.fromkeys(_typos(word, alphabet))
+        if typos == 1:
+            yield from neighbours
+        else:
+            yield from _more_typos(neighbours, typos - 1, alphabet)
+
+
+def typo_candidates(base, max_typos=1, alphabet=TYPO_ALPHABET):
+    """
+    Yields base and then the strings that are at most max_typos typos away
+    from it (a wrong case, swapped neighbours, or a missing, wrong or extra
+    character from alphabet), fewer typos first.
+    Only base and the strings one typo away are remembered and yielded once,
+    a string with more typos can come up again (say from two typos done in
+    the other order).
+    Each typo allowed multiplies the count by ~2 * len(alphabet) * len(base).
+    """
+    yield base
+    if max_typos < 1:
+        return
+    one_typo = dict.fromkeys(_typos(base, alphabet))
+    one_typo.pop(base, None)
+    yield from one_typo
+    for typos in range(1, max_typos):
+        for candidate in _more_typos(one_typo, typos, alphabet):
+            if candidate != base and candidate not in one_typo:
+                yield candidate
+
+
+def mask_candidates(mask):
+    """
+    Returns a generator of the strings that match mask, where ?l, ?u, ?d,
+    ?s and ?a stand for a lowercase letter, an uppercase letter, a digit,
+    a symbol and any of those (see MASK_CHARSETS) and ?? is a ?.
+    For example "Satoshi?d?d" gives Satoshi00 through Satoshi99.
+    """
+    positions = []
+    i = 0
+    while i < len(mask):
+        if mask[i] == "?":
+            key = mask[i + 1 : i + 2]
+            if key not in MASK_CHARSETS:
+                raise ValueError(f"unknown placeholder ?{key} in mask {mask}")
+            positions.append(MASK_CHARSETS[key])
+            i += 2
+        else:
+            positions.append(mask[i])
+            i += 1
+    return ("".join(chars) for chars in product(*positions))
+
+
+def _batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _check_batch(recovery, batch):
+    """Returns the index of the first passphrase in batch that matches"""
+    for i, passphrase in enumerate(batch):
+        if recovery.matches(passphrase):
+            return i
+    return None
+
+
+class PassphraseRecovery:
+    """
+    Looks for the passphrase that, with mnemonic, makes the wallet with the
+    master fingerprint (hex or bytes), the xpub or the address given. Only
+    one of them is needed. The xpub and the address are looked for at path,
+    which defaults to "m" for an xpub and to the first receive address
+    (BIP44/49/84 depending on the address type) for an address.
+    """
+
+    def __init__(self, mnemonic, fingerprint=None, xpub=None, address=None, path=None):
+        # this will check that the mnemonic is valid
+        mnemonic_to_bytes(mnemonic)
+        if [fingerprint, xpub, address].count(None) != 2:
+            raise ValueError("Need exactly one of fingerprint, xpub or address")
+        self.mnemonic = mnemonic
+        self.path = path
+        self.fingerprint = None
+        self.sec = None
+        self.chain_code = None
+        self.script_pubkey = None
+        self._script = None
+        if fingerprint is not None:
+            if type(fingerprint) is str:
+                fingerprint = bytes.fromhex(fingerprint)
+            if len(fingerprint) != 4:
+                raise ValueError(f"Fingerprint should be 4 bytes: {fingerprint.hex()}")
+            self.fingerprint = fingerprint
+            target = f"fingerprint {fingerprint.hex()}"
+        elif xpub is not None:
+            hd_pub = HDPublicKey.parse(xpub)
+            if path is None:
+                if hd_pub.depth != 0:
+                    raise ValueError(f"Need the path of {xpub}")
+                self.path = "m"
+            self.sec = hd_pub.sec()
+            self.chain_code = hd_pub.chain_code
+            target = f"xpub {xpub} at {self.path}"
+        else:
+            script_pubkey = address_to_script_pubkey(address)
+            if isinstance(script_pubkey, P2PKHScriptPubKey):
+                purpose, self._script = 44, "p2pkh_script"
+            elif isinstance(script_pubkey, P2SHScriptPubKey):
+                # the only single key p2sh
+                purpose, self._script = 49, "p2sh_p2wpkh_script"
+            elif isinstance(script_pubkey, P2WPKHScriptPubKey):
+                purpose, self._script = 84, "p2wpkh_script"
+            else:
+                raise ValueError(f"{address} is not a single key address")
+            if path is None:
+                mainnet = address[:1] in ("1", "3") or address[:3] == "bc1"
+                self.path = f"m/{purpose}h/{0 if mainnet else 1}h/0h/0/0"
+            self.script_pubkey = script_pubkey.raw_serialize()
+            target = f"address {address} at {self.path}"
+        # identifies this search in checkpoints without putting the
+        #  mnemonic in them
+        normalized = " ".join([BIP39.normalize(word) for word in mnemonic.split()])
+        self.search_id = hash256(f"{normalized} {target}".encode()).hex()
+        # progress of the current search
+        self.tested = 0
+        self.resumed_at = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        """Candidates tried per second since the search (re)started"""
+        if not self.elapsed:
+            return 0.0
+        return (self.tested - self.resumed_at) / self.elapsed
+
+    def matches(self, passphrase):
+        """Whether passphrase (a string) is the one we're looking for"""
+        # BIP39 has the passphrase NFKD normalized before it is encoded
+        passphrase = unicodedata.normalize("NFKD", passphrase)
+        seed = mnemonic_to_seed(self.mnemonic, passphrase.encode("utf-8"))
+        hd_priv = HDPrivateKey.from_seed(seed)
+        if self.fingerprint is not None:
+            return hd_priv.fingerprint() == self.fingerprint
+        hd_pub = hd_priv.traverse(self.path).pub
+        if self.sec is not None:
+            return hd_pub.sec() == self.sec and hd_pub.chain_code == self.chain_code
+        return getattr(hd_pub, self._script)().raw_serialize() == self.script_pubkey
+
+    def save_checkpoint(self, filename):
+        """Saves how many candidates have been tried to filename"""
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump({"search": self.search_id, "tested": self.tested}, f)
+        # so that an interruption never leaves a half written checkpoint
+        os.replace(tmp_filename, filename)
+
+    def load_checkpoint(self, filename):
+        """Returns how many candidates have been tried according to the
+        checkpoint filename, 0 if there's no such file"""
+        if not os.path.exists(filename):
+            return 0
+        with open(filename, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("search") != self.search_id:
+            raise ValueError(f"{filename} is the checkpoint of another search")
+        return checkpoint["tested"]
+
+    def _results(self, batches, workers):
+        """Yields each batch with the result of _check_batch, in order"""
+        if workers is None or workers < 2:
+            for batch in batches:
+                yield batch, _check_batch(self, batch)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # keep a couple of batches per process in flight so that the
+            # candidates aren't all read ahead of the results
+            pending = deque()
+            try:
+                for batch in batches:
+                    pending.append((batch, executor.submit(_check_batch, self, batch)))
+                    if len(pending) >= 2 * workers:
+                        batch, future = pending.popleft()
+                        yield batch, future.result()
+                while pending:
+                    batch, future = pending.popleft()
+                    yield batch, future.result()
+            finally:
+                # don't wait on the rest when we stop early
+                for _, future in pending:
+                    future.cancel()
+
+    def search(
+        self,
+        candidates,
+        workers=None,
+        checkpoint=None,
+        progress=None,
+        batch_size=RECOVERY_BATCH,
+    ):
+        """
+        Returns the first of candidates that matches, None if none do.
+        If workers is more than 1, the candidates are tried in that many
+        processes.
+        checkpoint is a file where the number of candidates tried is saved
+        after each batch_size of them. If it's from an earlier run of this
+        search, the candidates tried then are skipped, so candidates should
+        come in the same order each time.
+        progress is called with this object after each batch, see tested,
+        elapsed and rate.
+        """
+        self.tested = self.resumed_at = (
+            self.load_checkpoint(checkpoint) if checkpoint else 0
+        )
+        self.elapsed = 0.0
+        start = time.monotonic()
+        batches = _batches(islice(candidates, self.tested, None), batch_size)
+        results = self._results(batches, workers)
+        try:
+            for batch, index in results:
+                self.elapsed = time.monotonic() - start
+                if index is not None:
+                    self.tested += index + 1
+                    return batch[index]
+                self.tested += len(batch)
+                if checkpoint:
+                    self.save_checkpoint(checkpoint)
+                if progress:
+                    progress(self)
+        finally:
+            results.close()
+        return None
@@ -1,18 +1,19 @@
 from io import BytesIO
 
 from buidl.bech32 import decode_bech32, encode_bech32_checksum
+from buidl.ecc import S256Point, Signature
 from buidl.helper import (
     decode_base58,
     encode_base58_checksum,
     encode_varstr,
     hash160,
     little_endian_to_int,
-    int_to_byte,
     int_to_little_endian,
     read_varint,
     sha256,
 )
 from buidl.op import (
+    decode_num,
     number_to_op_code,
     op_code_to_number,
     op_equal,
@@ -23,7 +24,124 @@ from buidl.op import (
 )
 
 
+# kinds of instructions in a decoded program, see _decode_program
+_PUSH = 0
+_OP = 1
+_FLOW = 2
+_ALTSTACK = 3
+_SIGNING = 4
+
+
+def _decode_program(commands):
+    """Turns script commands into (kind, command, operation) instructions
+    so the interpreter doesn't have to inspect each command as it runs"""
+    program = []
+    for command in commands:
+        if type(command) != int:
+            program.append((_PUSH, command, None))
+        elif command in (99, 100, 103, 104):
+            # op_if/op_notif/op_else/op_endif are run by the interpreter
+            program.append((_FLOW, command, None))
+        elif command in (107, 108):
+            program.append((_ALTSTACK, command, OP_CODE_FUNCTIONS[command]))
+        elif command in (172, 173, 174, 175):
+            program.append((_SIGNING, command, OP_CODE_FUNCTIONS[command]))
+        else:
+            program.append((_OP, command, OP_CODE_FUNCTIONS.get(command)))
+    return program
+
+
+def _check_sig(z, sec, sig):
+    """Returns whether sig (DER plus the sighash byte) signs z for sec"""
+    point = S256Point.parse_cached(sec)
+    return bool(point.verify(z, Signature.parse_cached(sig[:-1])))
+
+
+def _parse_multisig(raw_script):
+    """Returns (m, secs) if raw_script is
+    OP_m <sec> ... <sec> OP_n OP_CHECKMULTISIG, None otherwise"""
+    if len(raw_script) < 37 or raw_script[-1] != 0xAE:
+        return None
+    # OP_1 (0x51) through OP_16 (0x60)
+    quorum_m, quorum_n = raw_script[0] - 0x50, raw_script[-2] - 0x50
+    if not 1 <= quorum_m <= quorum_n <= 16:
+        return None
+    secs = []
+    i = 1
+    while i < len(raw_script) - 2:
+        length = raw_script[i]
+        if length not in (33, 65):
+            return None
+        secs.append(raw_script[i + 1 : i + 1 + length])
+        i += 1 + length
+    if i != len(raw_script) - 2 or len(secs) != quorum_n:
+        return None
+    return quorum_m, secs
+
+
+def _check_multisig(z, raw_script, items):
+    """Checks the items (dummy element then signatures) against the
+    multisig script raw_script.
+    Returns None if raw_script isn't a multisig or the items don't fit it."""
+    multisig = _parse_multisig(raw_script)
+    if multisig is None:
+        return None
+    quorum_m, secs = multisig
+    if len(items) != quorum_m + 1:
+        return None
+    # the first item is the OP_CHECKMULTISIG off-by-one dummy, anything
+    # but OP_0 (or an empty witness item) is left to the interpreter
+    if items[0] not in (0, b""):
+        return None
+    sigs = items[1:]
+    if any(type(sig) != bytes for sig in sigs):
+        return None
+    try:
+        # each signature has to match one of the remaining secs, in order,
+        # leaving enough secs for the signatures after it
+        start = 0
+        for i, sig in enumerate(sigs):
+            signature = Signature.parse_cached(sig[:-1])
+            for j in range(start, len(secs) - len(sigs) + i + 1):
+                if S256Point.parse_cached(secs[j]).verify(z, signature):
+                    start = j + 1
+                    break
+            else:
+                print("signatures no good or not in right order")
+                return False
+    except (ValueError, SyntaxError):
+        return False
+    return True
+
+
+def _evaluate_witness_template(z, program, witness):
+    """Checks the witness for a version 0 witness program (a 20 byte
+    hash160 for p2wpkh, a 32 byte sha256 for p2wsh).
+    Returns None if the witness isn't a template we know."""
+    items = witness.items
+    if len(program) == 20:
+        # p2wpkh: witness is <sig> <sec>
+        if len(items) != 2:
+            return None
+        sig, sec = items
+        if hash160(sec) != program:
+            return False
+        return _check_sig(z, sec, sig)
+    # p2wsh: the last witness item is the WitnessScript
+    if len(items) == 0:
+        return None
+    witness_script = items[-1]
+    if sha256(witness_script) != program:
+        print("bad sha256 {} vs {}".format(program.hex(), sha256(witness_script).hex()))
+        return False
+    return _check_multisig(z, witness_script, items[:-1])
+
+
 class Script:
+    # the serialization and the commands list it was made from
+    _raw = None
+    _raw_commands = None
+
     def __init__(self, commands=None, coinbase=None):
         if commands is None:
             self.commands = []
@@ -54,43 +172,48 @@ class Script:
     def parse(cls, s, coinbase_mode=False):
         # get the length of the entire field
         length = read_varint(s)
+        # read the entire field, we keep it as the serialization
+        raw = s.read(length)
         if coinbase_mode:
-            return cls([], coinbase=s.read(length))
+            return cls([], coinbase=raw)
+        if len(raw) != length:
+            raise RuntimeError("parsing script failed")
         # initialize the commands array
         commands = []
         # initialize the number of bytes we've read to 0
         count = 0
         # loop until we've read length bytes
         while count < length:
-            # get the current byte
-            current = s.read(1)
+            # get the current byte as an integer
+            current_byte = raw[count]
             # increment the bytes we've read
             count += 1
-            # convert the current byte to an integer
-            current_byte = current[0]
             # if the current byte is between 1 and 75 inclusive
             if current_byte >= 1 and current_byte <= 75:
                 # we have an command set n to be the current byte
                 n = current_byte
                 # add the next n bytes as an command
-                commands.append(s.read(n))
+                commands.append(raw[count : count + n])
                 # increase the count by n
                 count += n
             elif current_byte == 76:
                 # op_pushdata1
-                data_length = little_endian_to_int(s.read(1))
-                commands.append(s.read(data_length))
-                count += data_length + 1
+                data_length = raw[count]
+                count += 1
+                commands.append(raw[count : count + data_length])
+                count += data_length
             elif current_byte == 77:
                 # op_pushdata2
-                data_length = little_endian_to_int(s.read(2))
-                commands.append(s.read(data_length))
-                count += data_length + 2
+                data_length = little_endian_to_int(raw[count : count + 2])
+                count += 2
+                commands.append(raw[count : count + data_length])
+                count += data_length
             elif current_byte == 78:
                 # op_pushdata4
-                data_length = little_endian_to_int(s.read(4))
-                commands.append(s.read(data_length))
-                count += data_length + 4
+                data_length = little_endian_to_int(raw[count : count + 4])
+                count += 4
+                commands.append(raw[count : count + data_length])
+                count += data_length
             else:
                 # we have an op code. set the current byte to op_code
                 op_code = current_byte
@@ -98,39 +221,50 @@ class Script:
                 commands.append(op_code)
         if count != length:
             raise RuntimeError("parsing script failed")
-        return cls(commands)
+        script = cls(commands)
+        script._raw = raw
+        script._raw_commands = commands
+        return script
 
     def raw_serialize(self):
         if self.coinbase:
             return self.coinbase
-        # initialize what we'll send back
-        result = b""
+        # reuse the bytes we were parsed from or serialized to last time
+        # unless the commands were replaced since
+        # (changing the commands list in place isn't tracked)
+        if self._raw_commands is not self.commands:
+            self._raw = self._serialize_commands()
+            self._raw_commands = self.commands
+        return self._raw
+
+    def _serialize_commands(self):
+        """Encodes the commands in one pass"""
+        result = bytearray()
         # go through each command
         for command in self.commands:
             # if the command is an integer, it's an op code
             if type(command) == int:
-                # turn the command into a single byte integer using int_to_byte
-                result += int_to_byte(command)
+                result.append(command)
             else:
                 # otherwise, this is an element
                 # get the length in bytes
                 length = len(command)
                 # for large lengths, we have to use a pushdata op code
-                if length < 75:
-                    # turn the length into a single byte integer
-                    result += int_to_byte(length)
-                elif length > 75 and length < 0x100:
+                if length <= 75:
+                    # the length is the op code
+                    result.append(length)
+                elif length < 0x100:
                     # 76 is pushdata1
-                    result += int_to_byte(76)
-                    result += int_to_byte(length)
-                elif length >= 0x100 and length <= 520:
+                    result.append(76)
+                    result.append(length)
+                elif length <= 520:
                     # 77 is pushdata2
-                    result += int_to_byte(77)
+                    result.append(77)
                     result += int_to_little_endian(length, 2)
                 else:
                     raise ValueError("too long a command")
                 result += command
-        return result
+        return bytes(result)
 
     def serialize(self):
         # get the raw serialization (no prepended length)
@@ -139,36 +273,119 @@ class Script:
         return encode_varstr(result)
 
     def evaluate(self, z, witness):
-        # create a copy as we may need to add to this list if we have a
-        # RedeemScript
-        commands = self.commands[:]
+        # the standard templates are checked directly, anything else
+        # goes through the interpreter
+        result = self._evaluate_template(z, witness)
+        if result is None:
+            result = self._interpret(z, witness)
+        return result
+
+    def _evaluate_template(self, z, witness):
+        """Verifies p2pkh, p2wpkh, p2sh-p2wpkh and p2sh/p2wsh multisig
+        without running the stack machine.
+        Returns None if the script isn't one of those templates."""
+        commands = self.commands
+        # p2pkh: <sig> <sec> OP_DUP OP_HASH160 <20 byte hash> OP_EQUALVERIFY OP_CHECKSIG
+        if (
+            len(commands) == 7
+            and type(commands[0]) == bytes
+            and type(commands[1]) == bytes
+            and commands[2] == 0x76
+            and commands[3] == 0xA9
+            and type(commands[4]) == bytes
+            and len(commands[4]) == 20
+            and commands[5] == 0x88
+            and commands[6] == 0xAC
+        ):
+            if hash160(commands[1]) != commands[4]:
+                return False
+            return _check_sig(z, commands[1], commands[0])
+        # p2wpkh/p2wsh: OP_0 <20 or 32 byte hash>
+        if (
+            len(commands) == 2
+            and commands[0] == 0x00
+            and type(commands[1]) == bytes
+            and len(commands[1]) in (20, 32)
+        ):
+            return _evaluate_witness_template(z, commands[1], witness)
+        # p2sh: <items> <RedeemScript> OP_HASH160 <20 byte hash> OP_EQUAL
+        if (
+            len(commands) >= 4
+            and type(commands[-4]) == bytes
+            and commands[-3] == 0xA9
+            and type(commands[-2]) == bytes
+            and len(commands[-2]) == 20
+            and commands[-1] == 0x87
+        ):
+            raw_redeem = commands[-4]
+            if hash160(raw_redeem) != commands[-2]:
+                print("bad p2sh h160")
+                return False
+            # p2sh-p2wpkh/p2sh-p2wsh: the RedeemScript is a witness program
+            if (
+                len(commands) == 4
+                and len(raw_redeem) in (22, 34)
+                and raw_redeem[0] == 0x00
+                and raw_redeem[1] == len(raw_redeem) - 2
+            ):
+                return _evaluate_witness_template(z, raw_redeem[2:], witness)
+            return _check_multisig(z, raw_redeem, commands[:-4])
+        return None
+
+    def _interpret(self, z, witness):
+        """Runs the stack machine over the commands"""
+        program = _decode_program(self.commands)
         stack = []
         altstack = []
-        while len(commands) > 0:
-            command = commands.pop(0)
-            if type(command) == int:
-                # do what the op code says
-                operation = OP_CODE_FUNCTIONS[command]
+        # one entry per open OP_IF/OP_NOTIF, whether that branch runs
+        branches = []
+        # instruction pointer into program, which may grow as we go
+        # for the RedeemScript and the witness
+        ip = 0
+        while ip < len(program):
+            kind, command, operation = program[ip]
+            ip += 1
+            executing = False not in branches
+            if kind == _FLOW:
                 if command in (99, 100):
-                    # op_if/op_notif require the commands array
-                    if not operation(stack, commands):
-                        print("bad op: {}".format(OP_CODE_NAMES[command]))
-                        return False
-                elif command in (107, 108):
-                    # op_toaltstack/op_fromaltstack require the altstack
-                    if not operation(stack, altstack):
-                        print("bad op: {}".format(OP_CODE_NAMES[command]))
-                        return False
-                elif command in (172, 173, 174, 175):
-                    # these are signing operations, they need a sig_hash
-                    # to check against
-                    if not operation(stack, z):
-                        print("bad op: {}".format(OP_CODE_NAMES[command]))
-                        return False
+                    # op_if/op_notif
+                    taken = False
+                    if executing:
+                        if len(stack) < 1:
+                            print("bad op: {}".format(OP_CODE_NAMES[command]))
+                            return False
+                        taken = decode_num(stack.pop()) != 0
+                        if command == 100:
+                            taken = not taken
+                    branches.append(taken)
+                elif len(branches) == 0:
+                    # op_else/op_endif without an op_if
+                    print("bad op: {}".format(OP_CODE_NAMES[command]))
+                    return False
+                elif command == 103:
+                    # op_else
+                    branches[-1] = not branches[-1]
                 else:
-                    if not operation(stack):
-                        print("bad op: {}".format(OP_CODE_NAMES[command]))
-                        return False
+                    # op_endif
+                    branches.pop()
+                continue
+            if not executing:
+                continue
+            if kind == _OP:
+                if operation is None or not operation(stack):
+                    print("bad op: {}".format(OP_CODE_NAMES.get(command, command)))
+                    return False
+            elif kind == _ALTSTACK:
+                # op_toaltstack/op_fromaltstack require the altstack
+                if not operation(stack, altstack):
+                    print("bad op: {}".format(OP_CODE_NAMES[command]))
+                    return False
+            elif kind == _SIGNING:
+                # these are signing operations, they need a sig_hash
+                # to check against
+                if not operation(stack, z):
+                    print("bad op: {}".format(OP_CODE_NAMES[command]))
+                    return False
             else:
                 # add the command to the stack
                 stack.append(command)
@@ -176,17 +393,15 @@ class Script:
                 # OP_HASH160 <20 byte hash> OP_EQUAL this is the RedeemScript
                 # OP_HASH160 == 0xa9 and OP_EQUAL == 0x87
                 if (
-                    len(commands) == 3
-                    and commands[0] == 0xA9
-                    and type(commands[1]) == bytes
-                    and len(commands[1]) == 20
-                    and commands[2] == 0x87
+                    len(program) - ip == 3
+                    and program[ip][1] == 0xA9
+                    and program[ip + 1][0] == _PUSH
+                    and len(program[ip + 1][1]) == 20
+                    and program[ip + 2][1] == 0x87
                 ):
-                    redeem_script = encode_varstr(command)
                     # we execute the next three op codes
-                    commands.pop()
-                    h160 = commands.pop()
-                    commands.pop()
+                    h160 = program[ip + 1][1]
+                    ip += 3
                     if not op_hash160(stack):
                         return False
                     stack.append(h160)
@@ -197,21 +412,21 @@ class Script:
                         print("bad p2sh h160")
                         return False
                     # hashes match! now add the RedeemScript
-                    stream = BytesIO(redeem_script)
-                    commands.extend(Script.parse(stream).commands)
+                    stream = BytesIO(encode_varstr(command))
+                    program.extend(_decode_program(Script.parse(stream).commands))
                 # witness program version 0 rule. if stack commands are:
                 # 0 <20 byte hash> this is p2wpkh
                 if len(stack) == 2 and stack[0] == b"" and len(stack[1]) == 20:
                     h160 = stack.pop()
                     stack.pop()
-                    commands.extend(witness.items)
-                    commands.extend(P2PKHScriptPubKey(h160).commands)
+                    program.extend(_decode_program(witness.items))
+                    program.extend(_decode_program(P2PKHScriptPubKey(h160).commands))
                 # witness program version 0 rule. if stack commands are:
                 # 0 <32 byte hash> this is p2wsh
                 if len(stack) == 2 and stack[0] == b"" and len(stack[1]) == 32:
                     s256 = stack.pop()
                     stack.pop()
-                    commands.extend(witness.items[:-1])
+                    program.extend(_decode_program(witness.items[:-1]))
                     witness_script = witness.items[-1]
                     if s256 != sha256(witness_script):
                         print(
@@ -223,7 +438,10 @@ class Script:
                     # hashes match! now add the Witness Script
                     stream = BytesIO(encode_varstr(witness_script))
                     witness_script_commands = Script.parse(stream).commands
-                    commands.extend(witness_script_commands)
+                    program.extend(_decode_program(witness_script_commands))
+        if len(branches) > 0:
+            # op_if/op_notif without an op_endif
+            return False
         if len(stack) == 0:
             return False
         if stack.pop() == b"":
@@ -296,15 +514,19 @@ class ScriptPubKey(Script):
     def parse(cls, s):
         script_pubkey = super().parse(s)
         if script_pubkey.is_p2pkh():
-            return P2PKHScriptPubKey(script_pubkey.commands[2])
+            result = P2PKHScriptPubKey(script_pubkey.commands[2])
         elif script_pubkey.is_p2sh():
-            return P2SHScriptPubKey(script_pubkey.commands[1])
+            result = P2SHScriptPubKey(script_pubkey.commands[1])
         elif script_pubkey.is_p2wpkh():
-            return P2WPKHScriptPubKey(script_pubkey.commands[1])
+            result = P2WPKHScriptPubKey(script_pubkey.commands[1])
         elif script_pubkey.is_p2wsh():
-            return P2WSHScriptPubKey(script_pubkey.commands[1])
+            result = P2WSHScriptPubKey(script_pubkey.commands[1])
         else:
             return script_pubkey
+        # keep the bytes we parsed
+        result._raw = script_pubkey._raw
+        result._raw_commands = result.commands
+        return result
 
     def redeem_script(self):
         """Convert this ScriptPubKey to its RedeemScript equivalent"""
@@ -313,10 +535,9 @@ class ScriptPubKey(Script):
 
 class P2PKHScriptPubKey(ScriptPubKey):
     def __init__(self, h160):
-        super().__init__()
         if type(h160) != bytes:
             raise TypeError("To initialize P2PKHScriptPubKey, a hash160 is needed")
-        self.commands = [0x76, 0xA9, h160, 0x88, 0xAC]
+        super().__init__([0x76, 0xA9, h160, 0x88, 0xAC])
 
     def hash160(self):
         return self.commands[2]
@@ -332,10 +553,9 @@ class P2PKHScriptPubKey(ScriptPubKey):
 
 class P2SHScriptPubKey(ScriptPubKey):
     def __init__(self, h160):
-        super().__init__()
         if type(h160) != bytes:
             raise TypeError("To initialize P2SHScriptPubKey, a hash160 is needed")
-        self.commands = [0xA9, h160, 0x87]
+        super().__init__([0xA9, h160, 0x87])
 
     def hash160(self):
         return self.commands[1]
@@ -453,18 +673,16 @@ class SegwitPubKey(ScriptPubKey):
 
 class P2WPKHScriptPubKey(SegwitPubKey):
     def __init__(self, h160):
-        super().__init__()
         if type(h160) != bytes:
             raise TypeError("To initialize P2WPKHScriptPubKey, a hash160 is needed")
-        self.commands = [0x00, h160]
+        super().__init__([0x00, h160])
 
 
 class P2WSHScriptPubKey(SegwitPubKey):
     def __init__(self, s256):
-        super().__init__()
         if type(s256) != bytes:
             raise TypeError("To initialize P2WSHScriptPubKey, a sha256 is needed")
-        self.commands = [0x00, s256]
+        super().__init__([0x00, s256])
 
 
 class WitnessScript(Script):
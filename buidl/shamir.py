@@ -1,9 +1,9 @@
 import hmac
 
-from hashlib import pbkdf2_hmac
 from secrets import randbits
 
 from buidl.helper import big_endian_to_int, int_to_big_endian
+from buidl.kdf import pbkdf2_hmac
 from buidl.mnemonic import WordList, bytes_to_mnemonic, mnemonic_to_bytes
 
 
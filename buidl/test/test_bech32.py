@@ -1,9 +1,14 @@
 from unittest import TestCase
 
 from buidl.bech32 import (
+    bech32_polymod,
     encode_bech32_checksum,
+    encode_segwit_addresses,
     decode_bech32,
+    decode_segwit_addresses,
+    group_32,
     BECH32_ALPHABET,
+    GEN,
 )
 
 
@@ -54,3 +59,42 @@ class Bech32Test(TestCase):
                 self.assertEqual(got_network, network)
                 self.assertEqual(got_version, version)
                 self.assertEqual(got_raw, raw[2:])
+
+    def test_polymod(self):
+        # the loop from BIP173
+        def want_polymod(values):
+            chk = 1
+            for v in values:
+                b = chk >> 25
+                chk = (chk & 0x1FFFFFF) << 5 ^ v
+                for i in range(5):
+                    chk ^= GEN[i] if ((b >> i) & 1) else 0
+            return chk
+
+        values = [i * 7 % 32 for i in range(100)]
+        self.assertEqual(bech32_polymod(values), want_polymod(values))
+        self.assertEqual(bech32_polymod([]), 1)
+
+    def test_group_32(self):
+        for raw in (b"", b"\xff", bytes(range(5)), bytes(range(20)), bytes(range(33))):
+            bits = "".join(f"{b:08b}" for b in raw)
+            bits += "0" * (-len(bits) % 5)
+            want = [int(bits[i : i + 5], 2) for i in range(0, len(bits), 5)] or [0]
+            self.assertEqual(group_32(raw), want)
+
+    def test_segwit_addresses(self):
+        scripts = [bytes([0, 20]) + bytes([i]) * 20 for i in range(3)]
+        scripts.append(bytes([0, 32]) + bytes(range(32)))
+        for network in ("mainnet", "testnet"):
+            addresses = encode_segwit_addresses(scripts, network=network)
+            self.assertEqual(
+                addresses, [encode_bech32_checksum(s, network) for s in scripts]
+            )
+            self.assertEqual(
+                decode_segwit_addresses(addresses),
+                [[network, 0, s[2:]] for s in scripts],
+            )
+        with self.assertRaises(ValueError):
+            decode_segwit_addresses(["bc1qqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqq9e75rb"])
+        with self.assertRaises(ValueError):
+            decode_bech32("bc1qqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqqq9e75rB")
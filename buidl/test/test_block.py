@@ -1,7 +1,12 @@
 from unittest import TestCase
 from io import BytesIO
+from os.path import join
+from tempfile import TemporaryDirectory
 
-from buidl.block import Block
+from buidl.block import Block, BlockFileReader, LazyBlock, scan_block_files
+from buidl.helper import int_to_little_endian, merkle_root
+from buidl.network import MAGIC
+from buidl.tx import Tx
 
 
 class BlockTest(TestCase):
@@ -144,3 +149,74 @@ class BlockTest(TestCase):
         block = Block.parse_header(stream)
         block.tx_hashes = hashes
         self.assertTrue(block.validate_merkle_root())
+
+
+class BlockFileReaderTest(TestCase):
+    # legacy and segwit transactions from test_tx.py
+    raw_txs = [
+        bytes.fromhex(
+            "0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600"
+        ),
+        bytes.fromhex(
+            "01000000000101c70c4ede5731f1b47a89d133be9244927fa12e15778ec78a7e071273c0c58a870400000000ffffffff02809698000000000017a9144f34d55c56f827169921df008e8dfdc23678fc1787d464da1f00000000220020701a8d401c84fb13e6baf169d59684e17abd9fa216c8cc5b9fc63d622ff8c58d0400473044022050a5a50e78e6f9c65b5d94c78f8e4b339848456ff7c2231702b4a37439e2a3bd02201569cbf1c672bbb1608d6e9feea28705d8d6e54aa51d9fa396469be6ffc83c2d0147304402200b69a83cc3e3e1694037ef639049b0ece00f15718a03e9038aa42ac9d1bd0ea50220780c510821cd5205e5d178e6277005f4dd61a7fcccd4f8fae9e2d2adc355e728016952210375e00eb72e29da82b89367947f29ef34afb75e8654f6ea368e0acdfd92976b7c2103a1b26313f430c4b15bb1fdce663207659d8cac749a0e53d70eff01874496feff2103c96d495bfdd5ba4145e3e046fee45e84a8a48ad05bd8dbb395c011a32cf9f88053ae00000000"
+        ),
+    ]
+
+    def make_block(self, raw_txs, prev_block):
+        tx_hashes = [Tx.parse(BytesIO(raw)).hash() for raw in raw_txs]
+        root = merkle_root([h[::-1] for h in tx_hashes])[::-1]
+        block = Block(1, prev_block, root, 1231006505, b"\xff\xff\x00\x1d", b"\x00" * 4)
+        raw_block = block.serialize() + bytes([len(raw_txs)]) + b"".join(raw_txs)
+        return block, tx_hashes, raw_block
+
+    def write_block_file(self, filename, raw_blocks, network="mainnet"):
+        with open(filename, "wb") as f:
+            for raw_block in raw_blocks:
+                f.write(MAGIC[network] + int_to_little_endian(len(raw_block), 4))
+                f.write(raw_block)
+            # Bitcoin Core leaves zeros at the end of the file
+            f.write(b"\x00" * 64)
+
+    def test_blocks(self):
+        block_1, tx_hashes_1, raw_1 = self.make_block(self.raw_txs, b"\x00" * 32)
+        block_2, tx_hashes_2, raw_2 = self.make_block(self.raw_txs[1:], block_1.hash())
+        with TemporaryDirectory() as tempdir:
+            filename = join(tempdir, "blk00000.dat")
+            self.write_block_file(filename, [raw_1, raw_2], network="testnet")
+            with BlockFileReader(filename, network="testnet") as reader:
+                blocks = list(reader)
+                self.assertEqual(len(blocks), 2)
+                self.assertIsInstance(blocks[0], LazyBlock)
+                self.assertEqual(blocks[0].hash(), block_1.hash())
+                self.assertEqual(blocks[1].prev_block, block_1.hash())
+                self.assertEqual(blocks[0].num_txs(), 2)
+                # hashes are computed without decoding the transactions
+                self.assertEqual(blocks[0].tx_hashes, tx_hashes_1)
+                self.assertIsNone(blocks[0]._txs)
+                self.assertTrue(blocks[0].validate_merkle_root())
+                txs = blocks[1].txs
+                self.assertEqual([tx.hash() for tx in txs], tx_hashes_2)
+                self.assertEqual(txs[0].serialize(), self.raw_txs[1])
+                self.assertEqual(txs[0].network, "testnet")
+                want = [
+                    (block_1.hash(), 89, tx_hashes_1[0]),
+                    (block_1.hash(), 89 + len(self.raw_txs[0]), tx_hashes_1[1]),
+                    (block_2.hash(), 8 + len(raw_1) + 89, tx_hashes_2[0]),
+                ]
+                self.assertEqual(list(reader.tx_hashes()), want)
+            with self.assertRaises(RuntimeError):
+                list(BlockFileReader(filename, network="mainnet"))
+
+    def test_scan_block_files(self):
+        block_1, tx_hashes_1, raw_1 = self.make_block(self.raw_txs, b"\x00" * 32)
+        block_2, tx_hashes_2, raw_2 = self.make_block(self.raw_txs[1:], block_1.hash())
+        with TemporaryDirectory() as tempdir:
+            filenames = [join(tempdir, "blk00000.dat"), join(tempdir, "blk00001.dat")]
+            self.write_block_file(filenames[0], [raw_1])
+            self.write_block_file(filenames[1], [raw_2])
+            want = [
+                (filenames[0], block_1.hash(), 89, tx_hashes_1[0]),
+                (filenames[0], block_1.hash(), 89 + 226, tx_hashes_1[1]),
+                (filenames[1], block_2.hash(), 89, tx_hashes_2[0]),
+            ]
+            self.assertEqual(list(scan_block_files(filenames, processes=2)), want)
@@ -47,6 +47,22 @@ class P2WSHMultiTest(TestCase):
                 p2wsh_sortedmulti_obj.get_address(is_change=False, offset=cnt),
             )
 
+        self.assertEqual(
+            p2wsh_sortedmulti_obj.get_addresses(0, 3, is_change=True),
+            expected_change_addrs,
+        )
+        self.assertEqual(
+            p2wsh_sortedmulti_obj.get_addresses(1, 2), expected_receive_addrs[1:]
+        )
+        self.assertEqual(p2wsh_sortedmulti_obj.get_addresses(5, 0), [])
+
+        address_index = p2wsh_sortedmulti_obj.get_address_index(count=3)
+        self.assertEqual(len(address_index), 6)
+        self.assertEqual(address_index[expected_change_addrs[2]], (True, 2))
+        self.assertEqual(address_index[expected_receive_addrs[1]], (False, 1))
+        address_index = p2wsh_sortedmulti_obj.get_address_index(count=2, start=1)
+        self.assertNotIn(expected_receive_addrs[0], address_index)
+
         expected_key_records = [
             {
                 "xfp": "c7d0648a",
@@ -183,6 +199,10 @@ class P2WSHMultiTest(TestCase):
                 self.assertEqual(sorted_addr, unsorted_addr)
             else:
                 self.assertNotEqual(sorted_addr, unsorted_addr)
+        self.assertEqual(
+            p2wsh_sorted_obj.get_addresses(0, 10, sort_keys=False),
+            [p2wsh_sorted_obj.get_address(i, sort_keys=False) for i in range(10)],
+        )
 
         # manually checked on 2021-06-08 that when imported to Caravan it generates the same addresses as buidl
         want = """{"name": "foo", "addressType": "P2WSH", "network": "testnet", "client": {"type": "public"}, "quorum": {"requiredSigners": 1, "totalSigners": 2}, "extendedPublicKeys": [{"bip32Path": "m/48'/1'/0'/2'", "xpub": "tpubDEZRP2dRKoGRJnR9zn6EoLouYKbYyjFsxywgG7wMQwCDVkwNvoLhcX1rTQipYajmTAF82kJoKDiNCgD4wUPahACE7n1trMSm7QS8B3S1fdy", "xfp": "aa917e75", "name": "alice"}, {"bip32Path": "m/48'/1'/0'/2'", "xpub": "tpubDEiNuxUt4pKjKk7khdv9jfcS92R1WQD6Z3dwjyMFrYj2iMrYbk3xB5kjg6kL4P8SoWsQHpd378RCTrM7fsw4chnJKhE2kfbfc4BCPkVh6g9", "xfp": "2553c4b8", "name": "bob"}], "startingAddressIndex": 0}"""
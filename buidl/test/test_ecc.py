@@ -1,6 +1,17 @@
 from unittest import TestCase
+from unittest.mock import patch
 
-from buidl.ecc import G, S256Point, PrivateKey, Signature
+from buidl.ecc import (
+    DER_CACHE,
+    G,
+    N,
+    S256Point,
+    SEC_CACHE,
+    PrivateKey,
+    Signature,
+    tweak_add_batch,
+    verify_batch,
+)
 from buidl.bech32 import decode_bech32
 
 from random import randint
@@ -166,6 +177,65 @@ class S256Test(TestCase):
             der = bytes.fromhex(der_hex)
             self.assertTrue(point.verify(z, Signature.parse(der)))
 
+    def test_verify_batch(self):
+        keys = [PrivateKey(secret) for secret in (1, 0xDEADBEEF, 2 ** 200 + 1)]
+        items = []
+        for z in (0xABCD, 2 ** 255 + 7):
+            for key in keys:
+                items.append((key.point, z, key.sign(z)))
+        # wrong z, wrong key
+        items.append((keys[0].point, 0xABCE, items[0][2]))
+        items.append((keys[1].point, 0xABCD, items[0][2]))
+        want = [True] * 6 + [False, False]
+        self.assertEqual(verify_batch(items), want)
+        self.assertEqual(verify_batch(items, threads=3), want)
+        self.assertEqual(verify_batch([]), [])
+
+    def test_tweak_add_batch(self):
+        point = PrivateKey(0xDEADBEEF).point
+        tweaks = [1, 2 ** 200 + 1, 0xDEADBEEF ** 7]
+        want = [(point + tweak).sec() for tweak in tweaks]
+        self.assertEqual(tweak_add_batch(point, tweaks), want)
+        self.assertEqual(tweak_add_batch(point, []), [])
+        # a sum at infinity isn't a valid key in either backend
+        with self.assertRaises(ValueError):
+            tweak_add_batch(point, [1, N - 0xDEADBEEF])
+
+    def test_parse_cached(self):
+        SEC_CACHE.clear()
+        DER_CACHE.clear()
+        private_key = PrivateKey(0xDEADBEEF)
+        sec = private_key.point.sec()
+        der = private_key.sign(1).der()
+        point = S256Point.parse_cached(sec)
+        sig = Signature.parse_cached(der)
+        self.assertEqual(point, private_key.point)
+        self.assertIs(S256Point.parse_cached(sec), point)
+        self.assertIs(Signature.parse_cached(der), sig)
+        self.assertTrue(point.verify(1, sig))
+        self.assertEqual((SEC_CACHE.hits, SEC_CACHE.misses), (1, 1))
+        self.assertEqual((DER_CACHE.hits, DER_CACHE.misses), (1, 1))
+
+    def test_arithmetic(self):
+        a, b = 0xDEADBEEF, 2 ** 200 + 12345
+        point = a * G
+        want = (a + b) * G
+        self.assertEqual(point + b, want)
+        self.assertEqual(point + b * G, want)
+        self.assertEqual((a * b) * G, b * point)
+        # points from arithmetic serialize like parsed ones
+        self.assertEqual(S256Point.parse(want.sec()), want)
+        self.assertEqual(S256Point.parse(want.sec(False)).sec(), want.sec())
+        if S256Point.__module__ == "buidl.cecc":
+            # a _libsec without secp256k1_ec_pubkey_create/combine does the same
+            with patch("buidl.cecc._HAS_PUBKEY_CREATE", False), patch(
+                "buidl.cecc._HAS_PUBKEY_COMBINE", False
+            ):
+                self.assertEqual(a * G, point)
+                self.assertEqual(point + b * G, want)
+                with self.assertRaises(ValueError):
+                    point + (N - a) * G
+
     def test_parse(self):
         csec = bytes.fromhex(
             "0349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278a"
@@ -1,15 +1,19 @@
 from unittest import TestCase
+from weakref import ref
 
+from buidl import hd
 from buidl.hd import (
     calc_num_valid_seedpicker_checksums,
     calc_valid_seedpicker_checksums,
+    disable_derivation_cache,
+    enable_derivation_cache,
     get_unhardened_child_path,
     HDPublicKey,
     HDPrivateKey,
     is_valid_bip32_path,
     ltrim_path,
 )
-from buidl.helper import encode_base58_checksum
+from buidl.helper import Bip32Path, encode_base58_checksum
 from buidl.mnemonic import BIP39, InvalidBIP39Length, InvalidChecksumWordsError
 
 
@@ -57,6 +61,102 @@ class HDTest(TestCase):
             with self.assertRaises(ValueError):
                 pub.child(0x80000002)
 
+    def test_lazy_point(self):
+        seed = b"jimmy@programmingblockchain.com Jimmy Song"
+        priv = HDPrivateKey.from_seed(seed)
+        account = priv.traverse("m/48h/0h/0h/2h")
+        # hardened derivation doesn't compute any public points
+        self.assertIsNone(account.private_key._point)
+        self.assertIsNone(account._pub)
+        self.assertIsNone(priv.private_key._point)
+        self.assertEqual(
+            account.xpub(),
+            "xpub6DaEzZrjZMBQcujBDnEgUobp8v1Fp7QdfwuwEwzANhrbfSnwS27uS9yXsjvUG92i2khnYsgBdnWxwH281Ao6K7SFgFcvHi38C7eGBWC4Dhi",
+        )
+        self.assertEqual(
+            account.xprv(),
+            "xprv9zatb4Kqiyd7QRei7khg7ff5atAmQegnJizLSZaYpNKcneTntUoetMf42VUNwb5noPS9RyQYiwv3EwtRpS7HhtmogfxeD6bTzFiLXw2kuvc",
+        )
+        # only the parent's point is needed for the parent fingerprint
+        self.assertIsNone(priv.private_key._point)
+        # unhardened children need their parent's point
+        child = account.traverse("m/0/5")
+        self.assertIsNone(child.private_key._point)
+        self.assertEqual(child.xpub(), account.pub.traverse("m/0/5").xpub())
+        self.assertEqual(child.xprv(), account.child(0).child(5).xprv())
+        # children don't keep their parents (and their secrets) around
+        parent = HDPrivateKey.parse(account.xprv())
+        parent_ref = ref(parent)
+        child = parent.child(0x80000000)
+        del parent
+        self.assertIsNone(parent_ref())
+        self.assertEqual(child.parent_fingerprint, account.fingerprint())
+        with self.assertRaises(ValueError):
+            HDPrivateKey(child.private_key, child.chain_code, parent_fingerprint=None)
+
+    def test_derivation_cache(self):
+        seed = b"jimmy@programmingblockchain.com Jimmy Song"
+        priv = HDPrivateKey.from_seed(seed)
+        want_xprv = priv.traverse("m/48h/0h/0h/2h/0/5").xprv()
+        want_xpub = priv.pub.traverse("m/0/1/2").xpub()
+        cache = enable_derivation_cache(maxsize=4)
+        try:
+            self.assertEqual(priv.traverse("m/48h/0h/0h/2h/0/5").xprv(), want_xprv)
+            self.assertEqual((cache.hits, cache.misses), (0, 6))
+            # only the last 4 nodes are kept
+            self.assertEqual(len(cache), 4)
+            self.assertEqual(priv.traverse("m/48h/0h/0h/2h/0/5").xprv(), want_xprv)
+            self.assertEqual((cache.hits, cache.misses), (0, 12))
+            account = HDPrivateKey.parse(priv.traverse("m/48h/0h/0h/2h").xprv())
+            self.assertIs(account.child(0), account.child(0))
+            self.assertEqual(account.child(0).parent_fingerprint, account.fingerprint())
+            cache.clear()
+            self.assertEqual(priv.pub.traverse("m/0/1/2").xpub(), want_xpub)
+            self.assertEqual(priv.pub.traverse("m/0/1/2").xpub(), want_xpub)
+            self.assertEqual((cache.hits, cache.misses), (3, 3))
+            self.assertEqual(cache.hit_rate(), 0.5)
+            # the network is part of what's cached
+            testnet = HDPrivateKey.from_seed(seed, network="testnet")
+            self.assertTrue(testnet.child(0).xprv().startswith("tprv"))
+        finally:
+            disable_derivation_cache()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNot(account.child(0), account.child(0))
+
+    def test_derive_range(self):
+        seed = b"jimmy@programmingblockchain.com Jimmy Song"
+        root = HDPrivateKey.from_seed(seed, network="testnet")
+        account = root.traverse("m/84h/1h/0h")
+        external = account.pub.child(0)
+        want = [external.child(i) for i in range(3, 10)]
+        chunk = hd.DERIVE_RANGE_CHUNK
+        # small chunks so that the range is split up
+        hd.DERIVE_RANGE_CHUNK = 3
+        try:
+            for workers in (None, 2):
+                got = list(external.derive_range(3, 10, workers=workers))
+                self.assertEqual([i for i, _, _ in got], list(range(3, 10)))
+                self.assertEqual([sec for _, sec, _ in got], [c.sec() for c in want])
+                self.assertEqual([h for _, _, h in got], [c.hash160() for c in want])
+        finally:
+            hd.DERIVE_RANGE_CHUNK = chunk
+        tests = (
+            ("p2pkh", "address"),
+            ("p2wpkh", "bech32_address"),
+            ("p2sh_p2wpkh", "p2sh_p2wpkh_address"),
+        )
+        for address_type, method in tests:
+            got = external.derive_range(3, 10, address_type=address_type)
+            self.assertEqual([a for *_, a in got], [getattr(c, method)() for c in want])
+        secs, hash160s = external.derive_range_packed(3, 10)
+        self.assertEqual(secs, b"".join(c.sec() for c in want))
+        self.assertEqual(hash160s, b"".join(c.hash160() for c in want))
+        self.assertEqual(list(external.derive_range(5, 5)), [])
+        with self.assertRaises(ValueError):
+            list(external.derive_range(0, 2 ** 31 + 1))
+        with self.assertRaises(ValueError):
+            list(external.derive_range(0, 1, address_type="p2tr"))
+
     def test_traverse(self):
         seed = b"jimmy@programmingblockchain.com Jimmy Song"
         tests = (
@@ -77,6 +177,12 @@ class HDTest(TestCase):
                 priv.traverse(path).bech32_address(),
                 want,
             )
+            self.assertEqual(
+                priv.traverse(Bip32Path.parse(path)).private_key.secret,
+                priv.traverse(path).private_key.secret,
+            )
+            with self.assertRaises(ValueError):
+                pub.traverse(path)
 
     def test_prv_pub(self):
         tests = [
@@ -187,6 +293,12 @@ class HDTest(TestCase):
         xprv = "xprv9s21ZrQH143K25QhxbucbDDuQ4naNntJRi4KUfWT7xo4EKsHt2QJDu7KXp1A3u7Bi1j8ph3EGsZ9Xvz9dGuVrtHHs7pXeTzjuxBrCmmhgC6"
         hd_priv = HDPrivateKey.parse(xprv)
         self.assertEqual(hd_priv.xprv(), xprv)
+        # recently parsed xpubs are cached, private keys never are
+        self.assertIn(xpub, hd._XPUB_CACHE.entries)
+        self.assertNotIn(xprv, hd._XPUB_CACHE.entries)
+        with self.assertRaises(ValueError):
+            HDPublicKey.parse(xprv)
+        self.assertNotIn(xprv, hd._XPUB_CACHE.entries)
 
     def test_get_address(self):
         seedphrase = b"jimmy@programmingblockchain.com Jimmy Song"
@@ -461,6 +573,10 @@ class HDTest(TestCase):
         )
         self.assertEqual(account0_first_key.private_key.point.sec(), want)
         self.assertEqual(pub_first_key.address(), account0_first_key.address())
+        self.assertEqual(
+            account0_first_key.p2sh_p2wpkh_script().address("testnet"),
+            account0_first_key.p2sh_p2wpkh_address(),
+        )
 
     def test_bech32_address(self):
         mnemonic = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
@@ -670,6 +786,8 @@ class BIP32PathsTest(TestCase):
         with self.assertRaises(ValueError):
             ltrim_path("m/", 1)
 
+        self.assertEqual(ltrim_path(Bip32Path.parse("m/1/2/3h"), 2), "m/3h")
+
     def test_child_path_calc(self):
         self.assertEqual(get_unhardened_child_path("m/45h/0", "m/45h/0/0/1"), "m/0/1")
         self.assertEqual(get_unhardened_child_path("m/45h/0", "m/45h/0/0/1"), "m/0/1")
@@ -680,3 +798,5 @@ class BIP32PathsTest(TestCase):
 
         # Doesn't share a base
         self.assertIsNone(get_unhardened_child_path("m/0/1", "m/45h/0/0"))
+        # m/45h/1 is not an ancestor of m/45h/10/0
+        self.assertIsNone(get_unhardened_child_path("m/45h/1", "m/45h/10/0"))
@@ -1,13 +1,20 @@
 from unittest import TestCase
 
+from copy import deepcopy
 from io import BytesIO
+from pickle import dumps, loads
 
 from buidl.helper import (
+    Bip32Path,
     bit_field_to_bytes,
     bytes_to_bit_field,
     bytes_to_str,
+    BASE58_ALPHABET,
     decode_base58,
+    decode_base58_many,
+    encode_base58,
     encode_base58_checksum,
+    encode_base58_many,
     decode_golomb,
     encode_golomb,
     decode_gcs,
@@ -22,6 +29,11 @@ from buidl.helper import (
     merkle_parent_level,
     merkle_root,
     pack_bits,
+    parse_binary_path,
+    ParseCache,
+    path_network,
+    raw_decode_base58,
+    read_varint_at,
     read_varstr,
     _siphash,
     str_to_bytes,
@@ -66,6 +78,33 @@ class HelperTest(TestCase):
         got = encode_base58_checksum(b"\x00" + bytes.fromhex(h160))
         self.assertEqual(got, addr)
 
+    def test_base58_limbs(self):
+        # compare with the digit by digit definition
+        for raw in (b"", b"\x00", b"\x00\x00\x01", b"\xff" * 20, bytes(range(82))):
+            num = int.from_bytes(raw, "big")
+            want = ""
+            while num:
+                num, mod = divmod(num, 58)
+                want = BASE58_ALPHABET[mod] + want
+            want = "1" * (len(raw) - len(raw.lstrip(b"\x00"))) + want
+            self.assertEqual(encode_base58(raw), want)
+            self.assertEqual(decode_base58_many([want], checksum=False), [raw])
+            self.assertEqual(encode_base58_many([raw], checksum=False), [want])
+        with self.assertRaises(ValueError):
+            decode_base58_many(["10OI"], checksum=False)
+
+    def test_base58_many(self):
+        raws = [b"\x00" + hash256(bytes([i]))[:20] for i in range(5)]
+        addresses = encode_base58_many(raws)
+        self.assertEqual(addresses, [encode_base58_checksum(raw) for raw in raws])
+        self.assertEqual(decode_base58_many(addresses), raws)
+        self.assertEqual(raw_decode_base58(addresses[0]), raws[0])
+        bad = addresses[0][:-1] + ("2" if addresses[0][-1] != "2" else "3")
+        with self.assertRaises(RuntimeError):
+            raw_decode_base58(bad)
+        with self.assertRaises(RuntimeError):
+            decode_base58_many([bad])
+
     def test_encode_base58_checksum(self):
         raw = bytes.fromhex("005dedfbf9ea599dd4e3ca6a80b333c472fd0b3f69")
         want = "19ZewH8Kk1PDbSNdJ97FP4EiCjTRaZMZQA"
@@ -225,6 +264,17 @@ class HelperTest(TestCase):
         stream = BytesIO(want)
         self.assertEqual(read_varstr(stream), to_encode)
 
+    def test_read_varint_at(self):
+        buf = bytes.fromhex("0afd0001fe00000100ff0000000001000000")
+        self.assertEqual(read_varint_at(buf, 0), (10, 1))
+        self.assertEqual(read_varint_at(buf, 1), (0x100, 4))
+        self.assertEqual(read_varint_at(memoryview(buf), 4), (0x10000, 9))
+        self.assertEqual(read_varint_at(buf, 9), (0x100000000, 18))
+        with self.assertRaises(IOError):
+            read_varint_at(buf[:-1], 9)
+        with self.assertRaises(IOError):
+            read_varint_at(buf, len(buf))
+
     def test_siphash(self):
         zero_key = b"\x00" * 16
         result = _siphash(zero_key, b"Hello world")
@@ -379,3 +429,82 @@ class HelperTest(TestCase):
             prev_hash = bytes.fromhex(prev_hash_hex)[::-1]
             filter_header = hash256(hash256(cfilter) + prev_hash)[::-1]
             self.assertEqual(filter_header_hex, filter_header.hex(), notes)
+
+    def test_parse_cache(self):
+        calls = []
+
+        def parse(b):
+            calls.append(b)
+            if b == b"bad":
+                raise ValueError("bad")
+            return b.decode()
+
+        cache = ParseCache(maxsize=2)
+        self.assertEqual(cache.get(b"a", parse), "a")
+        self.assertIs(cache.get(b"a", parse), cache.get(b"a", parse))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        cache.get(b"b", parse)
+        cache.get(b"a", parse)
+        # b is the least recently used
+        cache.get(b"c", parse)
+        self.assertEqual(len(cache), 2)
+        cache.get(b"a", parse)
+        cache.get(b"b", parse)
+        self.assertEqual(calls, [b"a", b"b", b"c", b"b"])
+        # errors aren't cached, neither are unhashable keys
+        with self.assertRaises(ValueError):
+            cache.get(b"bad", parse)
+        self.assertEqual(cache.get(bytearray(b"d"), parse), "d")
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+    def test_bip32_path(self):
+        path = Bip32Path.parse("m/48h/1h/0h/2h")
+        hardened = 0x80000000
+        self.assertEqual(
+            path.child_numbers, (hardened + 48, hardened + 1, hardened, hardened + 2)
+        )
+        # equal paths are the same object however they're written
+        self.assertIs(Bip32Path.parse(" M/48'/1'//0'/2H "), path)
+        self.assertIs(Bip32Path.parse(path), path)
+        self.assertIs(Bip32Path(path.child_numbers), path)
+        self.assertIs(loads(dumps(path)), path)
+        self.assertIs(deepcopy(path), path)
+        self.assertEqual(str(path), "m/48'/1'/0'/2'")
+        self.assertEqual(path.to_string("h"), "m/48h/1h/0h/2h")
+        self.assertEqual(str(Bip32Path()), "m")
+        self.assertEqual(Bip32Path.parse("m"), Bip32Path())
+        bin_path = bytes.fromhex("300000800100008000000080020000800000000007000000")
+        self.assertIs(Bip32Path.parse_binary(bin_path), path.child(0).child(7))
+        self.assertEqual(path.child(0).child(7).serialize(), bin_path)
+        self.assertEqual(parse_binary_path(bin_path), "m/48'/1'/0'/2'/0/7")
+        with self.assertRaises(ValueError):
+            Bip32Path.parse_binary(b"\x00" * 5)
+        # ancestors
+        child = path + "m/0/7"
+        self.assertEqual(len(child), 6)
+        self.assertEqual(child[4], 0)
+        self.assertIs(child[:4], path)
+        self.assertIs(child.parent().parent(), path)
+        self.assertTrue(path.is_ancestor_of(child))
+        self.assertFalse(child.is_ancestor_of(path))
+        self.assertEqual(str(child.relative_to("m/48'/1'/0'/2'")), "m/0/7")
+        self.assertIsNone(child.relative_to("m/48'/1'/0'/1'"))
+        self.assertTrue(path.is_hardened())
+        self.assertFalse(child.relative_to(path).is_hardened())
+        with self.assertRaises(ValueError):
+            Bip32Path().parent()
+        with self.assertRaises(AttributeError):
+            path.child_numbers = ()
+        for invalid in ("m/", "n/1", "m/1/", "m/-1", "m/1/a", f"m/{2 ** 31}", "m/1hh"):
+            with self.assertRaises(ValueError):
+                Bip32Path.parse(invalid)
+        with self.assertRaises(ValueError):
+            Bip32Path([2 ** 32])
+        with self.assertRaises(TypeError):
+            Bip32Path.parse(None)
+        self.assertEqual(path_network("m/48'/1'/0'/2'"), "testnet")
+        self.assertEqual(path_network(path), "testnet")
+        self.assertEqual(path_network("m/48'/0'/0'/2'"), "mainnet")
+        self.assertEqual(path_network("m"), "mainnet")
@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+from importlib import import_module
+from os.path import dirname, realpath
+from unittest import TestCase
+
+import buidl
+
+
+class LazyImportTest(TestCase):
+    def test_import_loads_nothing(self):
+        code = "import sys, buidl; print(sorted(m for m in sys.modules if m.startswith('buidl.')))"
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            cwd=dirname(dirname(dirname(realpath(__file__)))),
+        )
+        self.assertEqual(output.strip(), b"[]")
+
+    def test_same_as_star_imports(self):
+        # what "from .X import *" of every submodule would have made
+        want = {}
+        for module in buidl._SUBMODULES:
+            namespace = import_module(f"buidl.{module}")
+            for name in getattr(namespace, "__all__", vars(namespace)):
+                if name.startswith("_"):
+                    continue
+                value = want[name] = getattr(namespace, name)
+                # everything the submodules define is part of the API
+                if getattr(value, "__module__", None) == namespace.__name__:
+                    self.assertIn(name, buidl.__all__)
+        for name in buidl.__all__:
+            self.assertIs(getattr(buidl, name), want[name], name)
+        # names that aren't part of the API still resolve
+        self.assertIs(buidl.BytesIO, want["BytesIO"])
+
+    def test_attributes(self):
+        from buidl import HDPrivateKey
+        from buidl.hd import HDPrivateKey as want
+
+        self.assertIs(HDPrivateKey, want)
+        self.assertIs(buidl.tx, import_module("buidl.tx"))
+        self.assertIn("PSBT", dir(buidl))
+        with self.assertRaises(AttributeError):
+            buidl.not_a_thing
+        with self.assertRaises(AttributeError):
+            buidl._private
@@ -0,0 +1,41 @@
+import hashlib
+
+from unittest import TestCase
+
+from buidl.kdf import get_kdf, KDFS, pbkdf2_hmac, pbkdf2_hmac_python, register_kdf
+
+
+class KDFTest(TestCase):
+    def test_pbkdf2_hmac(self):
+        tests = (
+            # hash_name, password, salt, iterations, dklen
+            ("sha512", b"password", b"salt", 2048, None),
+            ("sha512", b"password", b"salt", 1, 64),
+            ("sha256", b"i" + b"passphrase", b"shamir\x00\x07", 2500, 16),
+            ("sha1", b"password", b"salt", 4096, 20),
+        )
+        for hash_name, password, salt, iterations, dklen in tests:
+            want = hashlib.pbkdf2_hmac(hash_name, password, salt, iterations, dklen)
+            self.assertEqual(
+                pbkdf2_hmac_python(hash_name, password, salt, iterations, dklen), want
+            )
+            self.assertEqual(
+                pbkdf2_hmac(hash_name, password, salt, iterations, dklen), want
+            )
+
+    def test_register_kdf(self):
+        self.assertIs(get_kdf("pbkdf2_hmac"), KDFS["pbkdf2_hmac"])
+        with self.assertRaises(ValueError):
+            get_kdf("unknown")
+        with self.assertRaises(TypeError):
+            register_kdf("unknown", "not a function")
+        original = KDFS["pbkdf2_hmac"]
+        try:
+            register_kdf("pbkdf2_hmac", pbkdf2_hmac_python)
+            self.assertIs(get_kdf("pbkdf2_hmac"), pbkdf2_hmac_python)
+            self.assertEqual(
+                pbkdf2_hmac("sha512", b"password", b"salt", 2),
+                hashlib.pbkdf2_hmac("sha512", b"password", b"salt", 2),
+            )
+        finally:
+            register_kdf("pbkdf2_hmac", original)
@@ -1,6 +1,15 @@
 from unittest import TestCase
 
-from buidl.mnemonic import secure_mnemonic
+from buidl.mnemonic import (
+    BIP39,
+    InvalidBIP39Length,
+    InvalidChecksumWordsError,
+    mnemonic_to_bytes,
+    mnemonic_to_seed,
+    secure_mnemonic,
+    seeds_from_mnemonics,
+    valid_checksum_words,
+)
 from buidl.hd import HDPrivateKey
 
 
@@ -45,3 +54,54 @@ class MnemonicTest(TestCase):
             secure_mnemonic(extra_entropy="not an int")
         with self.assertRaises(ValueError):
             secure_mnemonic(extra_entropy=-1)
+
+    def test_valid_checksum_words(self):
+        for num_words in (12, 15, 18, 21, 24):
+            first_words = " ".join(BIP39[i * 97 % 2048] for i in range(num_words - 1))
+            want = []
+            for word in BIP39:
+                try:
+                    mnemonic_to_bytes(f"{first_words} {word}")
+                    want.append(word)
+                except InvalidChecksumWordsError:
+                    pass
+            self.assertEqual(list(valid_checksum_words(first_words)), want)
+            self.assertEqual(len(want), 2 ** (11 - num_words // 3))
+
+        # the first 4 letters of a word are enough
+        first_words = "abandon " * 11
+        want = list(valid_checksum_words(first_words))
+        self.assertEqual(want[0], "about")
+        self.assertEqual(list(valid_checksum_words("aban " * 11)), want)
+
+        for length in (0, 1, 10, 12, 22, 24):
+            with self.assertRaises(InvalidBIP39Length):
+                next(valid_checksum_words("able " * length))
+
+    def test_seeds_from_mnemonics(self):
+        # test vectors from https://github.com/trezor/python-mnemonic/blob/master/vectors.json
+        mnemonics = [
+            "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about",
+            "legal winner thank year wave sausage worth useful legal winner thank yellow",
+            "letter advice cage absurd amount doctor acoustic avoid letter advice cage above",
+        ]
+        want = [
+            "c55257c360c07c72029aebc1b53c05ed0362ada38ead3e3e9efa3708e53495531f09a6987599d18264c1e1c92f2cf141630c7a3c4ab7c81b2f001698e7463b04",
+            "2e8905819b8723fe2c1d161860e5ee1830318dbf49a83bd451cfb8440c28bd6fa457fe1296106559a3c80937a1c1069be3a3a5bd381ee6260e8d9739fce1f607",
+            "d71de856f81a8acc65e6fc851a38d4d7ec216fd0796d0a6827a3ad6ed5511a30fa280f12eb2e47ed2ac03b5c462a0358d18d69fe4f985ec81778c1b370b652a8",
+        ]
+        passphrases = [b"TREZOR"] * 3
+        for mnemonic, seed in zip(mnemonics, want):
+            self.assertEqual(mnemonic_to_seed(mnemonic, b"TREZOR").hex(), seed)
+        for workers in (None, 2):
+            seeds = seeds_from_mnemonics(mnemonics, passphrases, workers=workers)
+            self.assertEqual([seed.hex() for seed in seeds], want)
+        # no passphrases means b""
+        self.assertEqual(
+            seeds_from_mnemonics(mnemonics[:1]), [mnemonic_to_seed(mnemonics[0])]
+        )
+        self.assertEqual(seeds_from_mnemonics([]), [])
+        with self.assertRaises(ValueError):
+            seeds_from_mnemonics(mnemonics, passphrases[:2])
+        with self.assertRaises(InvalidChecksumWordsError):
+            seeds_from_mnemonics(["abandon " * 12], workers=2)
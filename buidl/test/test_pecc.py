@@ -1,6 +1,19 @@
 from unittest import TestCase
 
-from buidl.pecc import FieldElement, Point
+from buidl.pecc import (
+    FieldElement,
+    G,
+    N,
+    Point,
+    PrivateKey,
+    S256Field,
+    S256Point,
+    _LAMBDA,
+    _glv_split,
+    _wnaf,
+    tweak_add_batch,
+    verify_batch,
+)
 
 
 class FieldElementTest(TestCase):
@@ -203,3 +216,80 @@ class ECCTest(TestCase):
                 p2 = Point(x2, y2, a, b)
             # check that the product is equal to the expected point
             self.assertEqual(s * p1, p2)
+
+
+class S256Test(TestCase):
+    def affine(self, point):
+        # the same point with the plain affine arithmetic of Point
+        return Point(point.x, point.y, S256Field(0), S256Field(7))
+
+    def test_glv_split(self):
+        for k in (0, 1, _LAMBDA, N - 1, N // 2, 2 ** 128, 0xDEADBEEF ** 7 % N):
+            k1, k2 = _glv_split(k)
+            self.assertEqual((k1 + k2 * _LAMBDA - k) % N, 0)
+            self.assertTrue(abs(k1) < 2 ** 129 and abs(k2) < 2 ** 129)
+        # lambda*G is (beta*x, y)
+        self.assertEqual((_LAMBDA * G).y, G.y)
+
+    def test_wnaf(self):
+        for k in (1, 7, 31, 0xFFFF, N - 1):
+            digits = _wnaf(k)
+            self.assertEqual(sum(d << i for i, d in enumerate(digits)), k)
+            for i, d in enumerate(digits):
+                if d:
+                    self.assertTrue(d % 2 == 1 and abs(d) < 16)
+                    self.assertFalse(any(digits[i + 1 : i + 5]))
+
+    def test_rmul(self):
+        point = PrivateKey(12345).point
+        for k in (1, 2, 63, 64, 2 ** 255, N - 1, 0xDEADBEEF ** 7 % N):
+            want = k * self.affine(G)
+            got = k * G
+            self.assertEqual((got.x, got.y), (want.x, want.y))
+            want = k * self.affine(point)
+            got = k * point
+            self.assertEqual((got.x, got.y), (want.x, want.y))
+            # G parsed from its sec isn't G itself
+            self.assertEqual(k * S256Point.parse(G.sec()), k * G)
+        self.assertIsNone((N * G).x)
+        self.assertIsNone((0 * point).x)
+        self.assertIsNone((N * point).x)
+
+    def test_add(self):
+        point = PrivateKey(12345).point
+        self.assertEqual(point + G, 12346 * G)
+        self.assertEqual(point + point, 24690 * G)
+        self.assertEqual(point + 5, 12350 * G)
+        self.assertIsNone((point + (N - 12345) * G).x)
+        self.assertEqual(point + S256Point(None, None), point)
+
+    def test_tweak_add_batch(self):
+        point = PrivateKey(5).point
+        # 5 and 69 run into 5*G itself in the first window (doubling)
+        tweaks = [1, 5, 69, 64, N - 1, 0xDEADBEEF ** 7 % N]
+        want = [(point + tweak).sec() for tweak in tweaks]
+        self.assertEqual(tweak_add_batch(point, tweaks), want)
+        self.assertEqual(tweak_add_batch(point, []), [])
+        # the same error as cecc for a sum at infinity
+        with self.assertRaises(ValueError):
+            tweak_add_batch(point, [1, N - 5])
+
+    def test_sign_verify(self):
+        private_key = PrivateKey(12345)
+        z = 0xDEADBEEF ** 9 % N
+        sig = private_key.sign(z)
+        self.assertTrue(private_key.point.verify(z, sig))
+        self.assertFalse(private_key.point.verify(z + 1, sig))
+        self.assertFalse(G.verify(z, sig))
+
+    def test_verify_batch(self):
+        private_key = PrivateKey(12345)
+        sec = private_key.point.sec()
+        # equal points that are different objects share their tables
+        a, b = S256Point.parse(sec), S256Point.parse(sec)
+        items = [(a, z, private_key.sign(z)) for z in (1, 2)]
+        items += [(b, z, private_key.sign(z)) for z in (3, 4)]
+        items.append((b, 5, private_key.sign(6)))
+        self.assertEqual(verify_batch(items), [True] * 4 + [False])
+        self.assertIn("_wnaf_tables", a.__dict__)
+        self.assertNotIn("_wnaf_tables", b.__dict__)
@@ -0,0 +1,156 @@
+import json
+import os
+
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from buidl.hd import HDPrivateKey
+from buidl.recovery import (
+    mask_candidates,
+    PassphraseRecovery,
+    typo_candidates,
+    wordlist_candidates,
+)
+
+MNEMONIC = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+
+
+class CandidatesTest(TestCase):
+    def test_typo_candidates(self):
+        candidates = list(typo_candidates("ab", alphabet="abc"))
+        self.assertEqual(candidates[:5], ["ab", "Ab", "aB", "ba", "b"])
+        self.assertEqual(len(candidates), len(set(candidates)))
+        self.assertEqual(
+            set(candidates),
+            {"ab", "Ab", "aB", "ba", "b", "a", "bb", "cb", "aa", "ac"}
+            | {"aab", "bab", "cab", "abb", "acb", "aba", "abc"},
+        )
+        two_typos = list(typo_candidates("ab", max_typos=2, alphabet="abc"))
+        self.assertEqual(two_typos[: len(candidates)], candidates)
+        # the strings with more typos aren't remembered, but they're
+        # never ones with fewer typos
+        self.assertFalse(set(two_typos[len(candidates) :]) & set(candidates))
+        self.assertIn("AB", two_typos)
+        self.assertIn("", two_typos)
+        three_typos = set(typo_candidates("ab", max_typos=3, alphabet="abc"))
+        self.assertLess(set(two_typos), three_typos)
+        self.assertIn("ABc", three_typos)
+
+    def test_mask_candidates(self):
+        self.assertEqual(
+            list(mask_candidates("a?d")),
+            ["a0", "a1", "a2", "a3", "a4"] + ["a5", "a6", "a7", "a8", "a9"],
+        )
+        self.assertEqual(list(mask_candidates("??x")), ["?x"])
+        self.assertEqual(len(list(mask_candidates("?l?u"))), 26 * 26)
+        for mask in ("?x", "abc?"):
+            with self.assertRaises(ValueError):
+                mask_candidates(mask)
+
+    def test_wordlist_candidates(self):
+        with TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "wordlist.txt")
+            with open(filename, "w") as f:
+                f.write("one\ntwo words\r\n\nthree\n")
+            self.assertEqual(
+                list(wordlist_candidates(filename)), ["one", "two words", "", "three"]
+            )
+
+
+class PassphraseRecoveryTest(TestCase):
+    def setUp(self):
+        self.hd_priv = HDPrivateKey.from_mnemonic(MNEMONIC, password=b"Hodl42")
+
+    def test_targets(self):
+        path = "m/48h/0h/0h/2h"
+        recoveries = (
+            PassphraseRecovery(MNEMONIC, fingerprint=self.hd_priv.fingerprint()),
+            PassphraseRecovery(MNEMONIC, fingerprint=self.hd_priv.fingerprint().hex()),
+            PassphraseRecovery(MNEMONIC, xpub=self.hd_priv.xpub()),
+            PassphraseRecovery(
+                MNEMONIC, xpub=self.hd_priv.traverse(path).xpub(), path=path
+            ),
+            PassphraseRecovery(
+                MNEMONIC,
+                address=self.hd_priv.traverse("m/84h/0h/0h/0/0").bech32_address(),
+            ),
+            PassphraseRecovery(
+                MNEMONIC,
+                address=self.hd_priv.traverse("m/49h/0h/0h/0/0").p2sh_p2wpkh_address(),
+            ),
+            PassphraseRecovery(
+                MNEMONIC,
+                address=self.hd_priv.traverse("m/44h/0h/0h/0/0").address(),
+            ),
+            PassphraseRecovery(
+                MNEMONIC,
+                address=self.hd_priv.traverse(path).bech32_address(),
+                path=path,
+            ),
+        )
+        for recovery in recoveries:
+            self.assertTrue(recovery.matches("Hodl42"))
+            self.assertFalse(recovery.matches("hodl42"))
+            self.assertFalse(recovery.matches(""))
+        # the passphrase is NFKD normalized, so any form of it matches
+        hd_priv = HDPrivateKey.from_mnemonic(MNEMONIC, password="Cafe\u0301".encode())
+        recovery = PassphraseRecovery(MNEMONIC, fingerprint=hd_priv.fingerprint())
+        self.assertTrue(recovery.matches("Caf\u00e9"))
+        self.assertTrue(recovery.matches("Cafe\u0301"))
+
+        with self.assertRaises(ValueError):
+            PassphraseRecovery(MNEMONIC)
+        with self.assertRaises(ValueError):
+            PassphraseRecovery(
+                MNEMONIC, fingerprint="00", address="1BoatSLRHtKNngkdXEeobR76b53LETtpyT"
+            )
+        with self.assertRaises(ValueError):
+            # not a master xpub, so the path is needed
+            PassphraseRecovery(MNEMONIC, xpub=self.hd_priv.traverse(path).xpub())
+        with self.assertRaises(ValueError):
+            PassphraseRecovery(
+                MNEMONIC,
+                address="bc1qrp33g0q5c5txsp9arysrx4k6zdkfs4nce4xj0gdcccefvpysxf3qccfmv3",
+            )
+
+    def test_search(self):
+        recovery = PassphraseRecovery(MNEMONIC, fingerprint=self.hd_priv.fingerprint())
+        calls = []
+        candidates = ["a", "b", "c", "Hodl42", "d"]
+        for workers in (None, 2):
+            calls.clear()
+            found = recovery.search(
+                candidates, workers=workers, progress=calls.append, batch_size=2
+            )
+            self.assertEqual(found, "Hodl42")
+            self.assertEqual(recovery.tested, 4)
+            # progress is reported after each batch without the passphrase
+            self.assertEqual(calls, [recovery])
+        self.assertIsNone(recovery.search(["a", "b", "c"], batch_size=2))
+        self.assertEqual(recovery.tested, 3)
+        self.assertGreater(recovery.rate, 0)
+
+    def test_checkpoint(self):
+        recovery = PassphraseRecovery(MNEMONIC, fingerprint=self.hd_priv.fingerprint())
+        with TemporaryDirectory() as tmpdir:
+            checkpoint = os.path.join(tmpdir, "checkpoint.json")
+            self.assertIsNone(
+                recovery.search(["a", "b", "c"], checkpoint=checkpoint, batch_size=2)
+            )
+            with open(checkpoint, "r") as f:
+                saved = json.load(f)
+            self.assertEqual(saved["tested"], 3)
+            # the mnemonic isn't in the checkpoint
+            self.assertNotIn("abandon", json.dumps(saved))
+
+            # the first 3 candidates are skipped when resuming
+            candidates = ["Hodl42", "x", "y", "Hodl42"]
+            found = recovery.search(candidates, checkpoint=checkpoint, batch_size=2)
+            self.assertEqual(found, "Hodl42")
+            self.assertEqual(recovery.tested, 4)
+            self.assertEqual(recovery.resumed_at, 3)
+
+            # a different search can't use this checkpoint
+            other = PassphraseRecovery(MNEMONIC, fingerprint="00000000")
+            with self.assertRaises(ValueError):
+                other.search(candidates, checkpoint=checkpoint)
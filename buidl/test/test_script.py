@@ -2,7 +2,8 @@ from unittest import TestCase
 
 from io import BytesIO
 
-from buidl.helper import decode_base58
+from buidl.ecc import PrivateKey
+from buidl.helper import decode_base58, hash160, int_to_byte
 from buidl.hd import HDPrivateKey
 from buidl.script import (
     address_to_script_pubkey,
@@ -12,8 +13,10 @@ from buidl.script import (
     P2WSHScriptPubKey,
     RedeemScript,
     Script,
+    ScriptPubKey,
     WitnessScript,
 )
+from buidl.witness import Witness
 
 
 class ScriptTest(TestCase):
@@ -39,6 +42,110 @@ class ScriptTest(TestCase):
         script = Script.parse(script_pubkey)
         self.assertEqual(script.serialize().hex(), want)
 
+    def test_raw_serialize_cache(self):
+        # a 20 byte push written with OP_PUSHDATA1 keeps its encoding
+        raw = bytes.fromhex("a94c14") + b"\x01" * 20 + bytes.fromhex("87")
+        script_pubkey = ScriptPubKey.parse(BytesIO(bytes([len(raw)]) + raw))
+        self.assertIsInstance(script_pubkey, P2SHScriptPubKey)
+        self.assertEqual(script_pubkey.raw_serialize(), raw)
+        # replacing the commands re-encodes them
+        script_pubkey.commands = list(script_pubkey.commands)
+        self.assertEqual(script_pubkey.raw_serialize(), raw[:1] + raw[2:])
+        self.assertIs(script_pubkey.raw_serialize(), script_pubkey.raw_serialize())
+        script = Script([0x00, b"\x02" * 75, b"\x03" * 76, b"\x04" * 256])
+        want = (
+            bytes.fromhex("004b")
+            + b"\x02" * 75
+            + bytes.fromhex("4c4c")
+            + b"\x03" * 76
+            + bytes.fromhex("4d0001")
+            + b"\x04" * 256
+        )
+        self.assertEqual(script.raw_serialize(), want)
+        self.assertEqual(Script.parse(BytesIO(script.serialize())), script)
+        with self.assertRaises(ValueError):
+            Script([b"\x00" * 521]).raw_serialize()
+        with self.assertRaises(RuntimeError):
+            Script.parse(BytesIO(bytes.fromhex("03014c")))
+
+    def test_evaluate_templates(self):
+        z = 0xDEADBEEF
+        keys = [PrivateKey(secret) for secret in (1001, 1002, 1003)]
+        secs = [key.point.sec() for key in keys]
+        sigs = [key.sign(z).der() + int_to_byte(1) for key in keys]
+        # p2pkh
+        script_pubkey = P2PKHScriptPubKey(hash160(secs[0]))
+        combined = Script([sigs[0], secs[0]]) + script_pubkey
+        self.assertIs(combined._evaluate_template(z, Witness()), True)
+        self.assertTrue(combined._interpret(z, Witness()))
+        self.assertFalse(combined.evaluate(z + 1, Witness()))
+        combined = Script([sigs[1], secs[0]]) + script_pubkey
+        self.assertFalse(combined.evaluate(z, Witness()))
+        # p2wpkh and p2sh-p2wpkh
+        script_pubkey = P2WPKHScriptPubKey(hash160(secs[0]))
+        witness = Witness([sigs[0], secs[0]])
+        self.assertTrue(script_pubkey._evaluate_template(z, witness))
+        self.assertTrue(script_pubkey._interpret(z, witness))
+        self.assertFalse(script_pubkey.evaluate(z + 1, witness))
+        redeem_script = script_pubkey.redeem_script()
+        combined = (
+            Script([redeem_script.raw_serialize()]) + redeem_script.script_pubkey()
+        )
+        self.assertTrue(combined._evaluate_template(z, witness))
+        self.assertTrue(combined._interpret(z, witness))
+        # p2sh and p2wsh 2-of-3 multisig
+        redeem_script = RedeemScript.create_p2sh_multisig(
+            2, [sec.hex() for sec in secs], sort_keys=False
+        )
+        combined = (
+            Script([0, sigs[0], sigs[2], redeem_script.raw_serialize()])
+            + redeem_script.script_pubkey()
+        )
+        self.assertTrue(combined._evaluate_template(z, Witness()))
+        self.assertTrue(combined._interpret(z, Witness()))
+        # signatures have to be in the order of the pubkeys
+        combined = (
+            Script([0, sigs[2], sigs[0], redeem_script.raw_serialize()])
+            + redeem_script.script_pubkey()
+        )
+        self.assertFalse(combined.evaluate(z, Witness()))
+        # anything but OP_0 as the dummy element goes to the interpreter
+        for dummy, want in ((0x6A, False), (b"\x01", True)):
+            combined = (
+                Script([dummy, sigs[0], sigs[2], redeem_script.raw_serialize()])
+                + redeem_script.script_pubkey()
+            )
+            self.assertIsNone(combined._evaluate_template(z, Witness()))
+            self.assertEqual(combined.evaluate(z, Witness()), want)
+        witness_script = WitnessScript(redeem_script.commands)
+        script_pubkey = witness_script.script_pubkey()
+        witness = Witness([b"", sigs[1], sigs[2], witness_script.raw_serialize()])
+        self.assertTrue(script_pubkey._evaluate_template(z, witness))
+        self.assertTrue(script_pubkey._interpret(z, witness))
+        self.assertFalse(script_pubkey.evaluate(z + 1, witness))
+        witness.items[0] = b"\x01"
+        self.assertIsNone(script_pubkey._evaluate_template(z, witness))
+        self.assertTrue(script_pubkey.evaluate(z, witness))
+        witness = Witness([b"", sigs[1], sigs[2], redeem_script.raw_serialize()[1:]])
+        self.assertFalse(script_pubkey.evaluate(z, witness))
+
+    def test_evaluate_interpreter(self):
+        # not a template, falls back to the interpreter
+        script = Script([0x51, 0x52, 0x93, 0x53, 0x87])
+        self.assertIsNone(script._evaluate_template(0, Witness()))
+        self.assertTrue(script.evaluate(0, Witness()))
+        # OP_IF OP_2 OP_ELSE OP_IF OP_3 OP_ELSE OP_0 OP_ENDIF OP_ENDIF
+        branches = [0x63, 0x52, 0x67, 0x63, 0x53, 0x67, 0x00, 0x68, 0x68]
+        self.assertTrue(Script([b"\x01"] + branches).evaluate(0, Witness()))
+        self.assertTrue(Script([b"\x01", b""] + branches).evaluate(0, Witness()))
+        self.assertFalse(Script([b"", b""] + branches).evaluate(0, Witness()))
+        # unbalanced OP_IF/OP_ENDIF
+        self.assertFalse(Script([b"\x01", 0x63, 0x51]).evaluate(0, Witness()))
+        self.assertFalse(Script([0x51, 0x68]).evaluate(0, Witness()))
+        # OP_TOALTSTACK OP_FROMALTSTACK
+        script = Script([0x51, 0x6B, 0x00, 0x6C])
+        self.assertTrue(script.evaluate(0, Witness()))
+
 
 class P2PKHScriptPubKeyTest(TestCase):
     def test_address(self):
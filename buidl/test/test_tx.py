@@ -1,10 +1,67 @@
-from os.path import dirname, realpath, sep
+import pickle
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from os import environ
+from os.path import dirname, join, realpath, sep
+from socketserver import ThreadingMixIn
+from tempfile import TemporaryDirectory
+from threading import Thread
 from unittest import TestCase
+from unittest.mock import patch
+from urllib.error import HTTPError
 
 from buidl.ecc import PrivateKey, Signature
-from buidl.helper import decode_base58
-from buidl.script import P2PKHScriptPubKey, RedeemScript, WitnessScript
-from buidl.tx import Tx, TxIn, TxOut, TxFetcher
+from buidl.helper import decode_base58, hash256
+from buidl.script import P2PKHScriptPubKey, RedeemScript, Script, WitnessScript
+from buidl.tx import (
+    SQLiteTxCache,
+    Tx,
+    URL,
+    TxIn,
+    TxOut,
+    TxFetcher,
+    verify_inputs,
+)
+
+
+class LocalTxServer(ThreadingMixIn, HTTPServer):
+    """Serves /tx/<tx id>/hex like the block explorer does"""
+
+    daemon_threads = True
+
+    def __init__(self, txs):
+        self.txs = txs
+        self.requests = []
+        # the client ports, one per connection
+        self.clients = set()
+        super().__init__(("127.0.0.1", 0), LocalTxHandler)
+
+
+class LocalTxHandler(BaseHTTPRequestHandler):
+    # keep the connection alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.server.clients.add(self.client_address[1])
+        tx_id = self.path.split("/")[-2]
+        if "/old/" in self.path:
+            status, body = 301, ""
+        elif tx_id in self.server.txs:
+            status, body = 200, self.server.txs[tx_id].serialize().hex()
+        else:
+            status, body = 404, "Transaction not found"
+        self.send_response(status)
+        if status == 301:
+            self.send_header("Location", self.path.replace("/old/", "/api/"))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode("ascii"))
+
+    def log_message(self, *args):
+        pass
 
 
 class TxTest(TestCase):
@@ -72,6 +129,243 @@ class TxTest(TestCase):
         tx = Tx.parse_hex(raw_tx)
         self.assertEqual(tx.serialize().hex(), raw_tx)
 
+    def test_sizes_and_hashes(self):
+        raw_tx = "01000000000101c70c4ede5731f1b47a89d133be9244927fa12e15778ec78a7e071273c0c58a870400000000ffffffff02809698000000000017a9144f34d55c56f827169921df008e8dfdc23678fc1787d464da1f00000000220020701a8d401c84fb13e6baf169d59684e17abd9fa216c8cc5b9fc63d622ff8c58d0400473044022050a5a50e78e6f9c65b5d94c78f8e4b339848456ff7c2231702b4a37439e2a3bd02201569cbf1c672bbb1608d6e9feea28705d8d6e54aa51d9fa396469be6ffc83c2d0147304402200b69a83cc3e3e1694037ef639049b0ece00f15718a03e9038aa42ac9d1bd0ea50220780c510821cd5205e5d178e6277005f4dd61a7fcccd4f8fae9e2d2adc355e728016952210375e00eb72e29da82b89367947f29ef34afb75e8654f6ea368e0acdfd92976b7c2103a1b26313f430c4b15bb1fdce663207659d8cac749a0e53d70eff01874496feff2103c96d495bfdd5ba4145e3e046fee45e84a8a48ad05bd8dbb395c011a32cf9f88053ae00000000"
+        tx = Tx.parse_hex(raw_tx)
+        self.assertEqual(tx.size(), 380)
+        self.assertEqual(tx.weight(), 758)
+        self.assertEqual(tx.vsize(), 190)
+        want = "ab83ac53d10881c6c6eceec159af56c500f5e188e6be684af2e613425a9124c1"
+        self.assertEqual(tx.id(), want)
+        self.assertEqual(tx.hash(), hash256(tx.serialize_legacy())[::-1])
+        want = "64ed29c283a90b9537e86c6e43a3e7b8588aa2065178ea8288a271e3cc5a7820"
+        self.assertEqual(tx.witness_id(), want)
+        s = BytesIO()
+        tx.serialize_to(s)
+        self.assertEqual(s.getvalue().hex(), raw_tx)
+        # changes made to the inputs and outputs in place are seen
+        # once the caches are cleared
+        tx.tx_ins[0].witness.items.pop()
+        self.assertEqual(tx.size(), 380)
+        tx.clear_caches()
+        self.assertEqual(tx.size(), len(tx.serialize()))
+        self.assertEqual(tx.size(), 274)
+        self.assertNotEqual(tx.witness_id(), want)
+        self.assertEqual(tx.witness_hash(), hash256(tx.serialize())[::-1])
+        txid = tx.id()
+        script_pubkey = tx.tx_outs[0].script_pubkey
+        script_pubkey.commands = script_pubkey.commands + [0x75]
+        tx.clear_caches()
+        self.assertNotEqual(tx.id(), txid)
+        self.assertEqual(tx.hash(), hash256(tx.serialize_legacy())[::-1])
+        self.assertEqual(tx.weight(), len(tx.serialize_legacy()) * 3 + tx.size())
+        tx = Tx.parse_hex(raw_tx)
+        # changing the transaction changes the hashes and sizes
+        tx.locktime = 1
+        self.assertNotEqual(tx.id(), want)
+        self.assertEqual(tx.hash(), hash256(tx.serialize_legacy())[::-1])
+        tx.tx_outs.pop()
+        self.assertEqual(tx.size(), 380 - 43)
+        self.assertEqual(tx.weight(), 758 - 43 * 4)
+        # a legacy transaction has the same hashes and no witness discount
+        tx.segwit = False
+        self.assertEqual(tx.witness_hash(), tx.hash())
+        self.assertEqual(tx.weight(), tx.size() * 4)
+        self.assertEqual(tx.vsize(), tx.size())
+
+    def test_clear_caches(self):
+        raw_tx = "0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600"
+        for tx in (Tx.parse_hex(raw_tx), Tx.parse_buffer(bytes.fromhex(raw_tx))[0]):
+            tx_hash = tx.hash()
+            # the hashes are kept until the caches are cleared
+            tx.tx_ins[0].sequence = 0
+            self.assertIs(tx.hash(), tx_hash)
+            tx.clear_caches()
+            self.assertNotEqual(tx.hash(), tx_hash)
+            # the serialization is always up to date
+            self.assertEqual(tx.hash(), hash256(tx.serialize_legacy())[::-1])
+            tx_hash = tx.hash()
+            tx.tx_outs[0].script_pubkey = Script([0x6A])
+            self.assertNotEqual(hash256(tx.serialize_legacy())[::-1], tx_hash)
+            tx.clear_caches()
+            self.assertEqual(tx.hash(), hash256(tx.serialize_legacy())[::-1])
+            # replacing the lists or adding and removing items is seen
+            tx_hash = tx.hash()
+            tx.tx_outs.pop()
+            self.assertNotEqual(tx.hash(), tx_hash)
+            tx_hash = tx.hash()
+            tx.tx_ins = [tx.tx_ins[0]]
+            self.assertIsNot(tx.hash(), tx_hash)
+            self.assertEqual(tx.hash(), hash256(tx.serialize_legacy())[::-1])
+        # signing drops the hashes but keeps the sighash parts
+        tx = Tx.parse_hex(raw_tx)
+        tx.tx_ins[0]._script_pubkey = P2PKHScriptPubKey(b"\x00" * 20)
+        tx_hash = tx.hash()
+        sig_hash = tx.sig_hash(0)
+        hash_outputs = tx.hash_outputs()
+        tx.sign_p2pkh(0, PrivateKey(secret=1))
+        self.assertNotEqual(tx.hash(), tx_hash)
+        self.assertEqual(tx.hash(), hash256(tx.serialize_legacy())[::-1])
+        self.assertIs(tx.hash_outputs(), hash_outputs)
+        self.assertEqual(tx.sig_hash(0), sig_hash)
+
+    def test_parse_buffer(self):
+        raw_legacy = bytes.fromhex(
+            "0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600"
+        )
+        raw_segwit = bytes.fromhex(
+            "01000000000101c70c4ede5731f1b47a89d133be9244927fa12e15778ec78a7e071273c0c58a870400000000ffffffff02809698000000000017a9144f34d55c56f827169921df008e8dfdc23678fc1787d464da1f00000000220020701a8d401c84fb13e6baf169d59684e17abd9fa216c8cc5b9fc63d622ff8c58d0400473044022050a5a50e78e6f9c65b5d94c78f8e4b339848456ff7c2231702b4a37439e2a3bd02201569cbf1c672bbb1608d6e9feea28705d8d6e54aa51d9fa396469be6ffc83c2d0147304402200b69a83cc3e3e1694037ef639049b0ece00f15718a03e9038aa42ac9d1bd0ea50220780c510821cd5205e5d178e6277005f4dd61a7fcccd4f8fae9e2d2adc355e728016952210375e00eb72e29da82b89367947f29ef34afb75e8654f6ea368e0acdfd92976b7c2103a1b26313f430c4b15bb1fdce663207659d8cac749a0e53d70eff01874496feff2103c96d495bfdd5ba4145e3e046fee45e84a8a48ad05bd8dbb395c011a32cf9f88053ae00000000"
+        )
+        buf = memoryview(raw_legacy + raw_segwit)
+        tx, length = Tx.parse_buffer(buf)
+        self.assertEqual(length, len(raw_legacy))
+        self.assertFalse(tx.segwit)
+        self.assertEqual(tx.serialize(), raw_legacy)
+        self.assertEqual(tx.version, 1)
+        self.assertEqual(tx.locktime, 410393)
+        self.assertEqual(
+            tx.tx_ins[0].prev_tx.hex(),
+            "d1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81",
+        )
+        self.assertEqual(tx.tx_ins[0].sequence, 0xFFFFFFFE)
+        self.assertEqual(tx.tx_outs[1].amount, 10011545)
+        want = Tx.parse_hex(raw_legacy.hex())
+        self.assertEqual(tx.tx_ins[0].script_sig, want.tx_ins[0].script_sig)
+        self.assertEqual(tx.tx_outs[0].script_pubkey, want.tx_outs[0].script_pubkey)
+        self.assertEqual(tx.id(), want.id())
+        tx, length = Tx.parse_buffer(buf, offset=len(raw_legacy), network="testnet")
+        self.assertEqual(length, len(raw_segwit))
+        self.assertTrue(tx.segwit)
+        self.assertEqual(tx.network, "testnet")
+        self.assertEqual(tx.serialize(), raw_segwit)
+        want = Tx.parse_hex(raw_segwit.hex())
+        self.assertEqual(tx.tx_ins[0].witness.items, want.tx_ins[0].witness.items)
+        self.assertEqual(tx.hash(), want.hash())
+        # changes to the decoded fields show up in the serialization
+        tx.tx_ins[0].sequence = 0xFFFFFFFD
+        tx.tx_outs[0].amount -= 1
+        tx.tx_ins[0].witness.items.pop()
+        want.tx_ins[0].sequence = 0xFFFFFFFD
+        want.tx_outs[0].amount -= 1
+        want.tx_ins[0].witness.items.pop()
+        self.assertEqual(tx.serialize(), want.serialize())
+        # they can be pickled, the buffer is copied
+        for tx in (Tx.parse_buffer(buf)[0], tx):
+            copied = pickle.loads(pickle.dumps(tx))
+            self.assertEqual(copied.serialize(), tx.serialize())
+            self.assertEqual(copied.tx_ins[0].script_sig, tx.tx_ins[0].script_sig)
+            self.assertEqual(copied.tx_outs[1].amount, tx.tx_outs[1].amount)
+        tx = Tx.parse_buffer(buf, offset=len(raw_legacy))[0]
+        copied = pickle.loads(pickle.dumps(tx))
+        self.assertEqual(copied.serialize(), raw_segwit)
+        self.assertEqual(copied.tx_ins[0].witness.items, tx.tx_ins[0].witness.items)
+        # any truncation is an IOError, like Tx.parse gives
+        for raw in (raw_legacy, raw_segwit):
+            for length in range(len(raw)):
+                with self.assertRaises(IOError):
+                    Tx.parse_buffer(raw[:length])
+                with self.assertRaises(IOError):
+                    Tx.hash_buffer(raw[:length])
+
+    def test_sqlite_cache(self):
+        tx_ids = list(TxFetcher.cache.keys())[:5]
+        with TemporaryDirectory() as tmpdir:
+            filename = join(tmpdir, "tx.sqlite")
+            with SQLiteTxCache(filename, max_parsed=2, flush_every=3) as cache:
+                for tx_id in tx_ids:
+                    cache[tx_id] = TxFetcher.cache[tx_id]
+                self.assertEqual(len(cache.parsed), 2)
+                self.assertEqual(len(cache.pending), 2)
+                self.assertEqual(len(cache), 5)
+                self.assertEqual(cache.pending, {})
+            with SQLiteTxCache(filename, max_parsed=2) as cache:
+                self.assertEqual(sorted(cache.keys()), sorted(tx_ids))
+                self.assertNotIn("00" * 32, cache)
+                with self.assertRaises(KeyError):
+                    cache["00" * 32]
+                for tx_id in tx_ids:
+                    self.assertIn(tx_id, cache)
+                    self.assertEqual(
+                        cache[tx_id].serialize(), TxFetcher.cache[tx_id].serialize()
+                    )
+                self.assertEqual(list(cache.parsed.keys()), tx_ids[-2:])
+                # TxFetcher can use it in place of the dict
+                old_cache = TxFetcher.cache
+                try:
+                    TxFetcher.open_disk_cache(filename)
+                    tx = TxFetcher.fetch(tx_ids[0], network="testnet")
+                    self.assertEqual(tx.id(), old_cache[tx_ids[0]].id())
+                    self.assertEqual(tx.network, "testnet")
+                finally:
+                    TxFetcher.cache.close()
+                    TxFetcher.cache = old_cache
+
+    def test_fetch_many(self):
+        txs = dict(TxFetcher.cache)
+        server = LocalTxServer(txs)
+        Thread(target=server.serve_forever, daemon=True).start()
+        old_url, old_cache = URL["testnet"], TxFetcher.cache
+        URL["testnet"] = "http://127.0.0.1:{}/api".format(server.server_port)
+        TxFetcher.cache = {}
+        try:
+            tx_ids = list(txs.keys())[:6]
+            result = TxFetcher.fetch_many(
+                tx_ids + tx_ids[:2], network="testnet", max_concurrency=3
+            )
+            self.assertEqual(list(result.keys()), tx_ids)
+            for tx_id in tx_ids:
+                self.assertEqual(result[tx_id].serialize(), txs[tx_id].serialize())
+                self.assertEqual(result[tx_id].network, "testnet")
+            # each tx is requested once and cached ones aren't requested again
+            self.assertEqual(len(server.requests), 6)
+            TxFetcher.fetch_many(tx_ids, network="testnet")
+            self.assertEqual(len(server.requests), 6)
+            # the connections are kept for the next call
+            TxFetcher.fetch_many(
+                tx_ids, network="testnet", fresh=True, max_concurrency=3
+            )
+            self.assertEqual(len(server.requests), 12)
+            self.assertLessEqual(len(server.clients), 3)
+            for connections in TxFetcher._pool.values():
+                for conn in connections:
+                    self.assertEqual(conn.timeout, TxFetcher.timeout)
+            with self.assertRaises(HTTPError) as cm:
+                TxFetcher.fetch("00" * 32, network="testnet")
+            self.assertEqual(cm.exception.code, 404)
+            # redirects are followed
+            URL["testnet"] = URL["testnet"].replace("/api", "/old")
+            tx = TxFetcher.fetch(tx_ids[0], network="testnet", fresh=True)
+            self.assertEqual(tx.serialize(), txs[tx_ids[0]].serialize())
+            self.assertEqual(
+                server.requests[-2:],
+                [
+                    "/old/tx/{}/hex".format(tx_ids[0]),
+                    "/api/tx/{}/hex".format(tx_ids[0]),
+                ],
+            )
+            # and so are the proxy settings
+            URL["testnet"] = "http://example.invalid/api"
+            proxy = "http://127.0.0.1:{}".format(server.server_port)
+            with patch.dict(environ, {"http_proxy": proxy, "no_proxy": ""}):
+                TxFetcher.fetch(tx_ids[0], network="testnet", fresh=True)
+            want = "http://example.invalid/api/tx/{}/hex".format(tx_ids[0])
+            self.assertEqual(server.requests[-1], want)
+            # all the inputs of a tx get filled in with one call
+            tx = txs["78457666f82c28aa37b74b506745a7c7684dc7842a52a457b09f09446721e11c"]
+            tx = Tx.parse_hex(tx.serialize().hex(), network="testnet")
+            tx.prefetch_inputs()
+            for tx_in in tx.tx_ins:
+                prev_tx = txs[tx_in.prev_tx.hex()]
+                want = prev_tx.tx_outs[tx_in.prev_index]
+                self.assertEqual(tx_in._value, want.amount)
+                self.assertEqual(tx_in._script_pubkey, want.script_pubkey)
+            self.assertTrue(tx.verify())
+        finally:
+            URL["testnet"], TxFetcher.cache = old_url, old_cache
+            TxFetcher.close()
+            server.shutdown()
+            server.server_close()
+
     def test_input_value(self):
         tx_hash = "d1c789a9c60383bf715f3f6ad9d14b91fe55f3deb369fe5d9280cb1a01793f81"
         index = 0
@@ -101,6 +395,32 @@ class TxTest(TestCase):
             "27e0c5994dec7824e56dec6b2fcb342eb7cdb0d0957c2fce9882f715e85d81a6", 16
         )
         self.assertEqual(tx.sig_hash(0), want)
+        self.assertEqual(tx.sig_hashes(), [want])
+
+    def test_sig_hashes(self):
+        raw_tx = "0100000001813f79011acb80925dfe69b3def355fe914bd1d96a3f5f71bf8303c6a989c7d1000000006b483045022100ed81ff192e75a3fd2304004dcadb746fa5e24c5031ccfcf21320b0277457c98f02207a986d955c6e0cb35d446a89d3f56100f4d7f67801c31967743a9c8e10615bed01210349fc4e631e3624a545de3f89f5d8684c7b8138bd94bdd531d2e213bf016b278afeffffff02a135ef01000000001976a914bc3b654dca7e56b04dca18f2566cdaf02e8d9ada88ac99c39800000000001976a9141c4bc762dd5423e332166702cb75f40df79fea1288ac19430600"
+        tx = Tx.parse_hex(raw_tx)
+        redeem_script = RedeemScript([0x51])
+        tx.tx_ins.append(TxIn(tx.tx_ins[0].prev_tx, 0, sequence=5))
+        tx.tx_ins.append(TxIn(tx.tx_ins[0].prev_tx, 0))
+        want = [tx.sig_hash(0), tx.sig_hash(1, redeem_script), tx.sig_hash(2)]
+        self.assertEqual(tx.sig_hashes(redeem_scripts={1: redeem_script}), want)
+        self.assertEqual(len(set(want)), 3)
+        # the cached parts get thrown away when the tx changes
+        fresh = Tx.parse_hex(tx.serialize().hex())
+        self.assertEqual(fresh.sig_hashes({1: redeem_script}), want)
+        tx.tx_ins[1].sequence = 6
+        tx.clear_caches()
+        fresh.tx_ins[1].sequence = 6
+        fresh.clear_caches()
+        self.assertEqual(tx.sig_hash(0), fresh.sig_hash(0))
+        self.assertNotEqual(tx.sig_hash(0), want[0])
+        tx.tx_outs.pop()
+        fresh.tx_outs = fresh.tx_outs[:1]
+        self.assertEqual(tx.sig_hashes(), fresh.sig_hashes())
+        self.assertEqual(tx.hash_outputs(), fresh.hash_outputs())
+        tx.locktime = 0
+        self.assertNotEqual(tx.sig_hash(2), fresh.sig_hash(2))
 
     def test_sig_hash_bip143(self):
         raw_tx = "0100000000010115e180dc28a2327e687facc33f10f2a20da717e5548406f7ae8b4c811072f8560100000000ffffffff0100b4f505000000001976a9141d7cd6c75c2e86f4cbf98eaed221b30bd9a0b92888ac02483045022100df7b7e5cda14ddf91290e02ea10786e03eb11ee36ec02dd862fe9a326bbcb7fd02203f5b4496b667e6e281cc654a2da9e4f08660c620a1051337fa8965f727eb19190121038262a6c6cec93c2d3ecd6c6072efea86d02ff8e3328bbd0242b20af3425990ac00000000"
@@ -149,6 +469,46 @@ class TxTest(TestCase):
         )
         self.assertTrue(tx.verify())
 
+    def test_verify_inputs(self):
+        private_key = PrivateKey(secret=8675309)
+        redeem_script = private_key.point.p2sh_p2wpkh_redeem_script()
+        tx_ins = [
+            TxIn(
+                bytes.fromhex(
+                    "6bfa079532dd9fad6cfbf218edc294fdfa7dd0cb3956375bc864577fb36fad97"
+                ),
+                0,
+            ),
+            TxIn(
+                bytes.fromhex(
+                    "2e19b463bd5c8a3e0f10ae827f5a670f6794fca96394ecf8488321291d1c2ee9"
+                ),
+                1,
+            ),
+        ]
+        amount = sum([tx_in.value(network="testnet") for tx_in in tx_ins]) - 1000
+        h160 = decode_base58("mqYz6JpuKukHzPg94y4XNDdPCEJrNkLQcv")
+        tx_out = TxOut(amount=amount, script_pubkey=P2PKHScriptPubKey(h160))
+        tx = Tx(1, tx_ins, [tx_out], 0, network="testnet", segwit=True)
+        self.assertTrue(tx.sign_input(0, private_key))
+        self.assertTrue(tx.sign_input(1, private_key, redeem_script=redeem_script))
+        self.assertTrue(tx.verify(workers=2))
+        self.assertEqual(verify_inputs(tx), {0: True, 1: True})
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            report = verify_inputs(tx, executor=executor, chunk_size=1)
+        self.assertEqual(report, {0: True, 1: True})
+        # a transaction from a buffer can go to other processes
+        lazy_tx = Tx.parse_buffer(tx.serialize(), network="testnet")[0]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            report = verify_inputs(lazy_tx, executor=executor, chunk_size=1)
+        self.assertEqual(report, {0: True, 1: True})
+        # swap the signatures so neither input verifies
+        sig_0, sig_1 = tx_ins[0].witness.items[0], tx_ins[1].witness.items[0]
+        tx_ins[0].witness.items[0], tx_ins[1].witness.items[0] = sig_1, sig_0
+        self.assertFalse(tx.verify(workers=2))
+        self.assertEqual(verify_inputs(tx), {0: False})
+        self.assertEqual(verify_inputs(tx, indices=[1]), {1: False})
+
     def test_sign_p2pkh(self):
         private_key = PrivateKey(secret=8675309)
         tx_ins = []
@@ -1,6 +1,17 @@
+from base64 import b64encode
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
 from io import BytesIO
+from threading import Lock, RLock
+from urllib.error import HTTPError
+from urllib.parse import unquote, urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass
 
-from urllib.request import Request, urlopen
+import atexit
+import hashlib
+import socket
+import sqlite3
 
 import json
 
@@ -13,6 +24,8 @@ from buidl.helper import (
     int_to_little_endian,
     little_endian_to_int,
     read_varint,
+    read_varint_at,
+    sha256,
     SIGHASH_ALL,
 )
 from buidl.script import (
@@ -34,6 +47,16 @@ URL = {
 
 class TxFetcher:
     cache = {}
+    # seconds to wait on the server before giving up
+    timeout = 30
+    # how many redirects are followed, like urlopen does
+    max_redirects = 10
+    # idle open connections to the servers, shared by all threads
+    _pool = {}
+    _pool_lock = Lock()
+    # the threads of fetch_many, kept between calls
+    _executor = None
+    _executor_workers = 0
 
     @classmethod
     def get_url(cls, network="mainnet"):
@@ -42,24 +65,165 @@ class TxFetcher:
     @classmethod
     def fetch(cls, tx_id, network="mainnet", fresh=False):
         if fresh or (tx_id not in cls.cache):
-            url = "{}/tx/{}/hex".format(cls.get_url(network), tx_id)
-            req = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-            response = urlopen(req).read().decode("utf-8").strip()
+            cls._store(tx_id, cls._fetch_raw(tx_id, network), network)
+        tx = cls.cache[tx_id]
+        tx.network = network
+        return tx
+
+    @classmethod
+    def fetch_many(cls, tx_ids, network="mainnet", fresh=False, max_concurrency=8):
+        """Fetches all the tx_ids, up to max_concurrency at a time.
+        The threads and their connections to the server are kept for
+        the next call, see close.
+        Returns a dict of tx id to Tx"""
+        # get rid of duplicates but keep the order
+        tx_ids = list(dict.fromkeys(tx_ids))
+        to_fetch = [tx_id for tx_id in tx_ids if fresh or tx_id not in cls.cache]
+        if to_fetch:
+            executor = cls._get_executor(max_concurrency)
+            raws = executor.map(lambda tx_id: cls._fetch_raw(tx_id, network), to_fetch)
+            for tx_id, raw in zip(to_fetch, raws):
+                cls._store(tx_id, raw, network)
+        return {tx_id: cls.fetch(tx_id, network=network) for tx_id in tx_ids}
+
+    @classmethod
+    def close(cls):
+        """Closes the idle connections and stops the threads of fetch_many.
+        They're opened again as needed."""
+        with cls._pool_lock:
+            pool, cls._pool = cls._pool, {}
+            executor, cls._executor = cls._executor, None
+        for connections in pool.values():
+            for conn in connections:
+                conn.close()
+        if executor is not None:
+            executor.shutdown()
+
+    @classmethod
+    def _get_executor(cls, max_concurrency):
+        """Returns the executor of fetch_many with max_concurrency threads"""
+        with cls._pool_lock:
+            old = None
+            if cls._executor is None or cls._executor_workers != max_concurrency:
+                old = cls._executor
+                cls._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+                cls._executor_workers = max_concurrency
+            executor = cls._executor
+        if old is not None:
+            # lets whatever was submitted to it finish
+            old.shutdown(wait=False)
+        return executor
+
+    @classmethod
+    def _connect(cls, scheme, netloc):
+        """Returns a new connection to the server, through the proxy in
+        the environment (http_proxy, https_proxy, no_proxy) if there's one,
+        like urlopen"""
+        connection_class = HTTPSConnection if scheme == "https" else HTTPConnection
+        proxy = getproxies().get(scheme)
+        if not proxy or proxy_bypass(urlsplit("//" + netloc).hostname):
+            conn = connection_class(netloc, timeout=cls.timeout)
+            conn.url_prefix = ""
+            conn.proxy_headers = {}
+            return conn
+        if "://" not in proxy:
+            proxy = "http://" + proxy
+        proxy = urlsplit(proxy)
+        proxy_headers = {}
+        if proxy.username is not None:
+            credentials = "{}:{}".format(
+                unquote(proxy.username), unquote(proxy.password or "")
+            )
+            proxy_headers["Proxy-Authorization"] = "Basic {}".format(
+                b64encode(credentials.encode()).decode("ascii")
+            )
+        proxy_netloc = proxy.netloc.rpartition("@")[2]
+        conn = connection_class(proxy_netloc, timeout=cls.timeout)
+        if scheme == "https":
+            # tunnel to the server with CONNECT
+            conn.set_tunnel(netloc, headers=proxy_headers)
+            conn.url_prefix = ""
+            conn.proxy_headers = {}
+        else:
+            # the proxy gets the whole URL
+            conn.url_prefix = "{}://{}".format(scheme, netloc)
+            conn.proxy_headers = proxy_headers
+        return conn
+
+    @classmethod
+    def _get(cls, url):
+        """Returns the status, headers and body (a str) of the response
+        to a GET of url, made on one of the pooled connections"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        for attempt in range(2):
+            with cls._pool_lock:
+                idle = cls._pool.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                conn = cls._connect(*key)
+            headers = {"User-Agent": "Mozilla/5.0"}
+            headers.update(conn.proxy_headers)
             try:
-                raw = bytes.fromhex(response)
-            except ValueError:
-                raise ValueError("unexpected response: {}".format(response))
-            tx = Tx.parse(BytesIO(raw), network=network)
-            # make sure the tx we got matches to the hash we requested
-            if tx.segwit:
-                computed = tx.id()
+                conn.request("GET", conn.url_prefix + path, headers=headers)
+                response = conn.getresponse()
+                body = response.read().decode("utf-8").strip()
+            except socket.timeout:
+                conn.close()
+                raise
+            except (HTTPException, OSError):
+                # the server may have closed the kept-alive connection
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                conn.close()
             else:
-                computed = hash256(raw)[::-1].hex()
-            if computed != tx_id:
-                raise RuntimeError("server lied: {} vs {}".format(computed, tx_id))
-            cls.cache[tx_id] = tx
-        cls.cache[tx_id].network = network
-        return cls.cache[tx_id]
+                with cls._pool_lock:
+                    cls._pool.setdefault(key, []).append(conn)
+            return response.status, response.headers, body
+
+    @classmethod
+    def _fetch_raw(cls, tx_id, network="mainnet"):
+        """Returns the raw transaction from the server"""
+        url = "{}/tx/{}/hex".format(cls.get_url(network), tx_id)
+        for _ in range(cls.max_redirects + 1):
+            status, headers, response = cls._get(url)
+            if status not in (301, 302, 303, 307, 308) or "Location" not in headers:
+                break
+            url = urljoin(url, headers["Location"])
+        if status != 200:
+            raise HTTPError(
+                url, status, "unexpected response: {}".format(response), headers, None
+            )
+        try:
+            return bytes.fromhex(response)
+        except ValueError:
+            raise ValueError("unexpected response: {}".format(response))
+
+    @classmethod
+    def _store(cls, tx_id, raw, network="mainnet"):
+        tx = Tx.parse(BytesIO(raw), network=network)
+        # make sure the tx we got matches to the hash we requested
+        if tx.segwit:
+            computed = tx.id()
+        else:
+            computed = hash256(raw)[::-1].hex()
+        if computed != tx_id:
+            raise RuntimeError("server lied: {} vs {}".format(computed, tx_id))
+        cls.cache[tx_id] = tx
+
+    @classmethod
+    def open_disk_cache(cls, filename, max_parsed=1024, flush_every=100):
+        """Switches the cache to a SQLiteTxCache stored in filename"""
+        cls.cache = SQLiteTxCache(
+            filename, max_parsed=max_parsed, flush_every=flush_every
+        )
+        return cls.cache
 
     @classmethod
     def load_cache(cls, filename):
@@ -75,6 +239,119 @@ class TxFetcher:
             f.write(s)
 
 
+# don't leave connections open when the interpreter exits
+atexit.register(TxFetcher.close)
+
+
+class SQLiteTxCache:
+    """A TxFetcher cache that keeps the raw transactions in a sqlite3
+    database indexed by tx id, so nothing needs to be parsed at startup.
+    Transactions are parsed when they're first looked up and at most
+    max_parsed parsed Tx objects are kept in memory, the least recently
+    used ones get dropped. New transactions are written to disk in
+    batches of flush_every."""
+
+    def __init__(self, filename, max_parsed=1024, flush_every=100):
+        if max_parsed < 1:
+            raise ValueError("max_parsed has to be at least 1")
+        self.filename = filename
+        self.max_parsed = max_parsed
+        self.flush_every = flush_every
+        # fetches can come from more than one thread
+        self.lock = RLock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS txs "
+            "(tx_id BLOB PRIMARY KEY, raw BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self.conn.commit()
+        # tx id -> parsed Tx, in least to most recently used order
+        self.parsed = OrderedDict()
+        # tx id -> raw transaction not yet written to disk
+        self.pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        with self.lock:
+            self.flush()
+            return self.conn.execute("SELECT COUNT(*) FROM txs").fetchone()[0]
+
+    def __contains__(self, tx_id):
+        with self.lock:
+            if tx_id in self.parsed or tx_id in self.pending:
+                return True
+            return self._read(tx_id) is not None
+
+    def __getitem__(self, tx_id):
+        with self.lock:
+            tx = self.parsed.get(tx_id)
+            if tx is not None:
+                self.parsed.move_to_end(tx_id)
+                return tx
+            raw = self.pending.get(tx_id)
+            if raw is None:
+                raw = self._read(tx_id)
+            if raw is None:
+                raise KeyError(tx_id)
+            tx = Tx.parse_buffer(raw)[0]
+            self._remember(tx_id, tx)
+            return tx
+
+    def __setitem__(self, tx_id, tx):
+        with self.lock:
+            self.pending[tx_id] = tx.serialize()
+            self._remember(tx_id, tx)
+            if len(self.pending) >= self.flush_every:
+                self.flush()
+
+    def _read(self, tx_id):
+        row = self.conn.execute(
+            "SELECT raw FROM txs WHERE tx_id = ?", (bytes.fromhex(tx_id),)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def _remember(self, tx_id, tx):
+        self.parsed[tx_id] = tx
+        self.parsed.move_to_end(tx_id)
+        while len(self.parsed) > self.max_parsed:
+            self.parsed.popitem(last=False)
+
+    def keys(self):
+        with self.lock:
+            self.flush()
+            rows = self.conn.execute("SELECT tx_id FROM txs").fetchall()
+        for row in rows:
+            yield row[0].hex()
+
+    def items(self):
+        for tx_id in self.keys():
+            yield tx_id, self[tx_id]
+
+    def flush(self):
+        """Writes the pending transactions to disk"""
+        with self.lock:
+            if not self.pending:
+                return
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO txs (tx_id, raw) VALUES (?, ?)",
+                [(bytes.fromhex(k), raw) for k, raw in self.pending.items()],
+            )
+            self.conn.commit()
+            self.pending = {}
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
+
+
 class Tx:
     command = b"tx"
 
@@ -87,9 +364,47 @@ class Tx:
         self.locktime = locktime
         self.network = network
         self.segwit = segwit
+        self.clear_caches()
+
+    def clear_caches(self):
+        """Throws away the cached hashes and sizes. Replacing a field of the
+        Tx or the tx_ins/tx_outs lists is noticed, but this has to be called
+        after changing the inputs, outputs or their scripts in place."""
+        self._cache_key = self._get_cache_key()
+        self._input_parts = None
+        self._outputs_raw = None
+        self._legacy_parts = None
         self._hash_prevouts = None
         self._hash_sequence = None
         self._hash_outputs = None
+        self._clear_script_caches()
+
+    def _clear_script_caches(self):
+        """Throws away what depends on the ScriptSigs and Witnesses,
+        the sighash parts stay"""
+        self._txid = None
+        self._witness_hash = None
+        # serialized size without the witness data and with it
+        self._base_size = None
+        self._total_size = None
+
+    def _get_cache_key(self):
+        # the lists are compared by identity, their lengths catch
+        # inputs or outputs being added or removed
+        return (
+            self.version,
+            self.locktime,
+            self.segwit,
+            id(self.tx_ins),
+            len(self.tx_ins),
+            id(self.tx_outs),
+            len(self.tx_outs),
+        )
+
+    def _check_caches(self):
+        """Throws away the cached hashes if a field of the Tx changed since"""
+        if self._cache_key != self._get_cache_key():
+            self.clear_caches()
 
     def __repr__(self):
         tx_ins = ""
@@ -119,7 +434,24 @@ class Tx:
 
     def hash(self):
         """Binary hash of the legacy serialization"""
-        return hash256(self.serialize_legacy())[::-1]
+        self._check_caches()
+        if self._txid is None:
+            self._txid = hash256(self.serialize_legacy())[::-1]
+        return self._txid
+
+    def witness_id(self):
+        """Human-readable hexadecimal of the witness transaction hash"""
+        return self.witness_hash().hex()
+
+    def witness_hash(self):
+        """Binary hash of the serialization including the witness data
+        (the same as hash() if the transaction isn't segwit)"""
+        if not self.segwit:
+            return self.hash()
+        self._check_caches()
+        if self._witness_hash is None:
+            self._witness_hash = hash256(self.serialize_segwit())[::-1]
+        return self._witness_hash
 
     @classmethod
     def parse_hex(cls, s, network="mainnet"):
@@ -142,6 +474,102 @@ class Tx:
         s.seek(-5, 1)
         return parse_method(s, network=network)
 
+    @classmethod
+    def parse_buffer(cls, buf, offset=0, network="mainnet"):
+        """Parses a transaction from a bytes-like object (bytes, memoryview
+        or mmap) starting at offset without copying it.
+        Only the field offsets are recorded up front, the inputs, outputs
+        and witnesses are decoded when they're accessed.
+        Returns the Tx and the number of bytes it takes up in buf"""
+        buf = memoryview(buf)
+        start = offset
+        # version has 4 bytes, little-endian, interpret as int
+        version = little_endian_to_int(buf[offset : offset + 4])
+        offset += 4
+        # any transaction has at least 2 more bytes (the marker and flag or
+        # the number of inputs and more)
+        if offset + 2 > len(buf):
+            raise IOError("buffer ends before the transaction does")
+        # a 0 byte where the number of inputs would be is the segwit marker
+        segwit = buf[offset] == 0
+        if segwit:
+            if buf[offset + 1] != 1:
+                raise RuntimeError("Not a segwit transaction")
+            offset += 2
+        num_inputs, offset = read_varint_at(buf, offset)
+        inputs = []
+        for _ in range(num_inputs):
+            tx_in = LazyTxIn(buf, offset)
+            inputs.append(tx_in)
+            offset = tx_in._end
+        num_outputs, offset = read_varint_at(buf, offset)
+        outputs = []
+        for _ in range(num_outputs):
+            tx_out = LazyTxOut(buf, offset)
+            outputs.append(tx_out)
+            offset = tx_out._end
+        if segwit:
+            # skip over each witness, remembering where it is
+            for tx_in in inputs:
+                num_items, end = read_varint_at(buf, offset)
+                for _ in range(num_items):
+                    item_length, end = read_varint_at(buf, end)
+                    end += item_length
+                tx_in._witness_span = (offset, end)
+                offset = end
+        # locktime is 4 bytes, little-endian
+        locktime = little_endian_to_int(buf[offset : offset + 4])
+        offset += 4
+        if offset > len(buf):
+            raise IOError("buffer ends before the transaction does")
+        tx = cls(version, inputs, outputs, locktime, network=network, segwit=segwit)
+        return tx, offset - start
+
+    @classmethod
+    def hash_buffer(cls, buf, offset=0):
+        """Computes the hash of the transaction serialized in buf at offset
+        without decoding it into a Tx.
+        Returns the hash and the number of bytes the transaction takes up"""
+        buf = memoryview(buf)
+        start = offset
+        offset += 4
+        # any transaction has at least 2 more bytes (the marker and flag or
+        # the number of inputs and more)
+        if offset + 2 > len(buf):
+            raise IOError("buffer ends before the transaction does")
+        # a 0 byte where the number of inputs would be is the segwit marker
+        segwit = buf[offset] == 0
+        if segwit:
+            if buf[offset + 1] != 1:
+                raise RuntimeError("Not a segwit transaction")
+            offset += 2
+        # the legacy serialization has the inputs and outputs as they are
+        body_start = offset
+        num_inputs, offset = read_varint_at(buf, offset)
+        for _ in range(num_inputs):
+            # prev_tx and prev_index, script_sig and sequence
+            script_sig_length, offset = read_varint_at(buf, offset + 36)
+            offset += script_sig_length + 4
+        num_outputs, offset = read_varint_at(buf, offset)
+        for _ in range(num_outputs):
+            # amount and script_pubkey
+            script_pubkey_length, offset = read_varint_at(buf, offset + 8)
+            offset += script_pubkey_length
+        body_end = offset
+        if segwit:
+            for _ in range(num_inputs):
+                num_items, offset = read_varint_at(buf, offset)
+                for _ in range(num_items):
+                    item_length, offset = read_varint_at(buf, offset)
+                    offset += item_length
+        if offset + 4 > len(buf):
+            raise IOError("buffer ends before the transaction does")
+        # hash256 of version, inputs, outputs and locktime
+        h = hashlib.sha256(buf[start : start + 4])
+        h.update(buf[body_start:body_end])
+        h.update(buf[offset : offset + 4])
+        return hashlib.sha256(h.digest()).digest()[::-1], offset + 4 - start
+
     @classmethod
     def parse_legacy(cls, s, network="mainnet"):
         """Takes a byte stream and parses a legacy transaction"""
@@ -205,52 +633,79 @@ class Tx:
 
     def serialize_legacy(self):
         """Returns the byte serialization of the transaction"""
-        # serialize version (4 bytes, little endian)
-        result = int_to_little_endian(self.version, 4)
-        # encode_varint on the number of inputs
-        result += encode_varint(len(self.tx_ins))
-        # iterate inputs
-        for tx_in in self.tx_ins:
-            # serialize each input
-            result += tx_in.serialize()
-        # encode_varint on the number of outputs
-        result += encode_varint(len(self.tx_outs))
-        # iterate outputs
-        for tx_out in self.tx_outs:
-            # serialize each output
-            result += tx_out.serialize()
-        # serialize locktime (4 bytes, little endian)
-        result += int_to_little_endian(self.locktime, 4)
+        self._check_caches()
+        parts = []
+        self._write(parts.append, segwit=False)
+        result = b"".join(parts)
+        self._base_size = len(result)
+        if not self.segwit:
+            self._total_size = self._base_size
         return result
 
     def serialize_segwit(self):
         """Returns the byte serialization of the transaction"""
+        self._check_caches()
+        parts = []
+        self._write(parts.append, segwit=True)
+        result = b"".join(parts)
+        self._total_size = len(result)
+        return result
+
+    def serialize_to(self, s):
+        """Writes the serialization of the transaction to s
+        (anything with a write method like a file or BytesIO)"""
+        self._write(s.write, segwit=self.segwit)
+
+    def _write(self, write, segwit):
+        """Passes the serialization to write one piece at a time"""
         # serialize version (4 bytes, little endian)
-        result = int_to_little_endian(self.version, 4)
-        # segwit marker b'\x00\x01'
-        result += b"\x00\x01"
+        write(int_to_little_endian(self.version, 4))
+        if segwit:
+            # segwit marker b'\x00\x01'
+            write(b"\x00\x01")
         # encode_varint on the number of inputs
-        result += encode_varint(len(self.tx_ins))
+        write(encode_varint(len(self.tx_ins)))
         # iterate inputs
         for tx_in in self.tx_ins:
             # serialize each input
-            result += tx_in.serialize()
-        # encode_varint on the number of inputs
-        result += encode_varint(len(self.tx_outs))
+            write(tx_in.serialize())
+        # encode_varint on the number of outputs
+        write(encode_varint(len(self.tx_outs)))
         # iterate outputs
         for tx_out in self.tx_outs:
             # serialize each output
-            result += tx_out.serialize()
-        # add the witness data for each input
-        for tx_in in self.tx_ins:
-            # serialize the witness field
-            result += tx_in.witness.serialize()
+            write(tx_out.serialize())
+        if segwit:
+            # add the witness data for each input
+            for tx_in in self.tx_ins:
+                # serialize the witness field
+                write(tx_in.serialize_witness())
         # serialize locktime (4 bytes, little endian)
-        result += int_to_little_endian(self.locktime, 4)
-        return result
+        write(int_to_little_endian(self.locktime, 4))
+
+    def size(self):
+        """Returns the size of the serialization in bytes"""
+        self._check_caches()
+        if self._total_size is None:
+            self.serialize()
+        return self._total_size
+
+    def weight(self):
+        """Returns the weight (BIP141): the size without the witness data
+        counts 4 times, the witness data once"""
+        self._check_caches()
+        if self._base_size is None:
+            self.serialize_legacy()
+        return self._base_size * 3 + self.size()
+
+    def vsize(self):
+        """Returns the virtual size, the weight / 4 rounded up"""
+        return (self.weight() + 3) // 4
 
     def fee(self):
         """Returns the fee of this transaction in satoshi"""
+        # look up all the input values at once
+        self.prefetch_inputs()
         # initialize input sum and output sum
         input_sum, output_sum = 0, 0
         # iterate through inputs
@@ -264,75 +719,125 @@ class Tx:
         # return input sum - output sum
         return input_sum - output_sum
 
+    def _get_input_parts(self):
+        """Returns the serialized outpoints and sequences of the inputs"""
+        self._check_caches()
+        if self._input_parts is None:
+            prevouts = []
+            sequences = []
+            for tx_in in self.tx_ins:
+                prevouts.append(
+                    tx_in.prev_tx[::-1] + int_to_little_endian(tx_in.prev_index, 4)
+                )
+                sequences.append(int_to_little_endian(tx_in.sequence, 4))
+            self._input_parts = (prevouts, sequences)
+        return self._input_parts
+
+    def _get_outputs_raw(self):
+        """Returns the serialization of all the outputs"""
+        self._check_caches()
+        if self._outputs_raw is None:
+            self._outputs_raw = b"".join(
+                [tx_out.serialize() for tx_out in self.tx_outs]
+            )
+        return self._outputs_raw
+
+    def _get_legacy_parts(self):
+        """Returns the parts of the legacy sighash serialization that
+        are the same for every input: the header, the inputs with empty
+        ScriptSigs and everything after the inputs"""
+        self._check_caches()
+        if self._legacy_parts is None:
+            prevouts, sequences = self._get_input_parts()
+            # version and how many inputs there are
+            header = int_to_little_endian(self.version, 4) + encode_varint(
+                len(self.tx_ins)
+            )
+            # every input not being signed has an empty ScriptSig
+            empty_inputs = b"".join(
+                [prevout + b"\x00" + seq for prevout, seq in zip(prevouts, sequences)]
+            )
+            # outputs, locktime and SIGHASH_ALL
+            suffix = (
+                encode_varint(len(self.tx_outs))
+                + self._get_outputs_raw()
+                + int_to_little_endian(self.locktime, 4)
+                + int_to_little_endian(SIGHASH_ALL, 4)
+            )
+            self._legacy_parts = (header, empty_inputs, suffix)
+        return self._legacy_parts
+
+    def _legacy_script_code(self, input_index, redeem_script=None):
+        # if the RedeemScript was passed in, that's the ScriptSig
+        if redeem_script:
+            return redeem_script.serialize()
+        # otherwise the previous tx's ScriptPubkey is the ScriptSig
+        return self.tx_ins[input_index].script_pubkey(self.network).serialize()
+
     def sig_hash(self, input_index, redeem_script=None):
         """Returns the integer representation of the hash that needs to get
         signed for index input_index"""
-        # create the serialization per spec
-        # start with version: int_to_little_endian in 4 bytes
-        s = int_to_little_endian(self.version, 4)
-        # next, how many inputs there are: encode_varint
-        s += encode_varint(len(self.tx_ins))
-        # loop through each input: for i, tx_in in enumerate(self.tx_ins)
-        for i, tx_in in enumerate(self.tx_ins):
-            # if the input index is the one we're signing
-            if i == input_index:
-                # if the RedeemScript was passed in, that's the ScriptSig
-                if redeem_script:
-                    script_sig = redeem_script
-                # otherwise the previous tx's ScriptPubkey is the ScriptSig
-                else:
-                    script_sig = tx_in.script_pubkey(self.network)
-            # Otherwise, the ScriptSig is empty
-            else:
-                script_sig = None
-            # create a TxIn object with the prev_tx, prev_index and sequence
-            # the same as the current tx_in and the script_sig from above
-            new_tx_in = TxIn(
-                prev_tx=tx_in.prev_tx,
-                prev_index=tx_in.prev_index,
-                script_sig=script_sig,
-                sequence=tx_in.sequence,
+        prevouts, sequences = self._get_input_parts()
+        header, empty_inputs, suffix = self._get_legacy_parts()
+        # each empty input is 41 bytes: outpoint, 0 length ScriptSig, sequence
+        start, end = input_index * 41, (input_index + 1) * 41
+        s = b"".join(
+            [
+                header,
+                empty_inputs[:start],
+                prevouts[input_index],
+                self._legacy_script_code(input_index, redeem_script),
+                sequences[input_index],
+                empty_inputs[end:],
+                suffix,
+            ]
+        )
+        # hash256 the serialization and interpret as a big endian integer
+        return big_endian_to_int(hash256(s))
+
+    def sig_hashes(self, redeem_scripts=None):
+        """Returns the legacy sighashes of every input as a list.
+        redeem_scripts is a dict of input index to RedeemScript for
+        the p2sh inputs.
+        The shared parts are serialized once and the hash of everything
+        before each input is carried over to the next one."""
+        if redeem_scripts is None:
+            redeem_scripts = {}
+        prevouts, sequences = self._get_input_parts()
+        header, empty_inputs, suffix = self._get_legacy_parts()
+        prefix = hashlib.sha256(header)
+        result = []
+        for input_index in range(len(self.tx_ins)):
+            current = prefix.copy()
+            current.update(prevouts[input_index])
+            current.update(
+                self._legacy_script_code(input_index, redeem_scripts.get(input_index))
             )
-            # add the serialization of the TxIn object
-            s += new_tx_in.serialize()
-        # add how many outputs there are using encode_varint
-        s += encode_varint(len(self.tx_outs))
-        # add the serialization of each output
-        for tx_out in self.tx_outs:
-            s += tx_out.serialize()
-        # add the locktime using int_to_little_endian in 4 bytes
-        s += int_to_little_endian(self.locktime, 4)
-        # add SIGHASH_ALL using int_to_little_endian in 4 bytes
-        s += int_to_little_endian(SIGHASH_ALL, 4)
-        # hash256 the serialization
-        h256 = hash256(s)
-        # convert the result to an integer using big_endian_to_int(x)
-        return big_endian_to_int(h256)
+            current.update(sequences[input_index])
+            current.update(empty_inputs[(input_index + 1) * 41 :])
+            current.update(suffix)
+            result.append(big_endian_to_int(sha256(current.digest())))
+            prefix.update(empty_inputs[input_index * 41 : (input_index + 1) * 41])
+        return result
 
     def hash_prevouts(self):
+        self._check_caches()
         if self._hash_prevouts is None:
-            all_prevouts = b""
-            all_sequence = b""
-            for tx_in in self.tx_ins:
-                all_prevouts += tx_in.prev_tx[::-1] + int_to_little_endian(
-                    tx_in.prev_index, 4
-                )
-                all_sequence += int_to_little_endian(tx_in.sequence, 4)
-            self._hash_prevouts = hash256(all_prevouts)
-            self._hash_sequence = hash256(all_sequence)
+            prevouts, sequences = self._get_input_parts()
+            self._hash_prevouts = hash256(b"".join(prevouts))
+            self._hash_sequence = hash256(b"".join(sequences))
         return self._hash_prevouts
 
     def hash_sequence(self):
+        self._check_caches()
         if self._hash_sequence is None:
             self.hash_prevouts()  # this should calculate self._hash_prevouts
         return self._hash_sequence
 
     def hash_outputs(self):
+        self._check_caches()
         if self._hash_outputs is None:
-            all_outputs = b""
-            for tx_out in self.tx_outs:
-                all_outputs += tx_out.serialize()
-            self._hash_outputs = hash256(all_outputs)
+            self._hash_outputs = hash256(self._get_outputs_raw())
         return self._hash_outputs
 
     def sig_hash_bip143(self, input_index, redeem_script=None, witness_script=None):
@@ -419,14 +924,20 @@ class Tx:
         # evaluate the combined script
         return combined_script.evaluate(z, tx_in.witness)
 
-    def verify(self):
-        """Verify this transaction"""
+    def verify(self, workers=None):
+        """Verify this transaction
+        If workers is set, the inputs are checked across a thread pool
+        of that size (see verify_inputs)."""
         if self.fee() < 0:
             return False
-        for i in range(len(self.tx_ins)):
-            if not self.verify_input(i):
-                return False
-        return True
+        if workers is None or workers < 2:
+            for i in range(len(self.tx_ins)):
+                if not self.verify_input(i):
+                    return False
+            return True
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            report = verify_inputs(self, executor=executor)
+        return all(report.values())
 
     def sign_p2pkh(self, input_index, private_key):
         """Signs the input assuming that the previous output is a p2pkh using the private key"""
@@ -436,6 +947,8 @@ class Tx:
         sec = private_key.point.sec(compressed=private_key.compressed)
         # finalize the input using finalize_p2pkh
         self.tx_ins[input_index].finalize_p2pkh(sig, sec)
+        # the txid and sizes are stale now
+        self._clear_script_caches()
         # return whether sig is valid using self.verify_input
         return self.verify_input(input_index)
 
@@ -447,6 +960,8 @@ class Tx:
         sec = private_key.point.sec(compressed=private_key.compressed)
         # finalize the input using finalize_p2wpkh
         self.tx_ins[input_index].finalize_p2wpkh(sig, sec)
+        # the txid and sizes are stale now
+        self._clear_script_caches()
         # return whether sig is valid using self.verify_input
         return self.verify_input(input_index)
 
@@ -460,6 +975,8 @@ class Tx:
         sec = private_key.point.sec(compressed=private_key.compressed)
         # finalize the input using finalize_p2wpkh
         self.tx_ins[input_index].finalize_p2wpkh(sig, sec, redeem_script)
+        # the txid and sizes are stale now
+        self._clear_script_caches()
         # return whether sig is valid using self.verify_input
         return self.verify_input(input_index)
 
@@ -566,12 +1083,80 @@ class Tx:
     def get_input_tx_lookup(self):
         """Returns the tx lookup dictionary of hashes to the Tx objects
         for all the input transactions."""
+        tx_ids = [tx_in.prev_tx.hex() for tx_in in self.tx_ins]
         tx_lookup = {}
-        for tx_in in self.tx_ins:
-            tx_obj = TxFetcher.fetch(tx_in.prev_tx.hex(), network=self.network)
+        for tx_obj in TxFetcher.fetch_many(tx_ids, network=self.network).values():
             tx_lookup[tx_obj.hash()] = tx_obj
         return tx_lookup
 
+    def prefetch_inputs(self, max_concurrency=8):
+        """Looks up the previous transactions of all the inputs at once
+        and fills in the value and ScriptPubKey of each input"""
+        missing = [
+            tx_in
+            for tx_in in self.tx_ins
+            if tx_in._value is None or tx_in._script_pubkey is None
+        ]
+        if not missing:
+            return
+        tx_lookup = TxFetcher.fetch_many(
+            [tx_in.prev_tx.hex() for tx_in in missing],
+            network=self.network,
+            max_concurrency=max_concurrency,
+        )
+        for tx_in in missing:
+            tx_out = tx_lookup[tx_in.prev_tx.hex()].tx_outs[tx_in.prev_index]
+            tx_in._value = tx_out.amount
+            tx_in._script_pubkey = tx_out.script_pubkey
+
+
+def _verify_input_chunk(tx, indices):
+    """Verifies the inputs at indices in order, stopping at the first failure.
+    Returns a list of (input index, result) tuples"""
+    results = []
+    for input_index in indices:
+        result = tx.verify_input(input_index)
+        results.append((input_index, result))
+        if not result:
+            break
+    return results
+
+
+def verify_inputs(tx, indices=None, executor=None, chunk_size=16):
+    """Verifies the inputs of tx at indices (all inputs by default).
+    The checks are split into chunks of chunk_size inputs and submitted
+    to executor (a concurrent.futures executor) when one is given.
+    Returns a dict of input index to whether that input verified.
+    Work stops at the first failure, so inputs that were never
+    checked are missing from the result."""
+    if indices is None:
+        indices = range(len(tx.tx_ins))
+    indices = list(indices)
+    # look up the previous outputs and the BIP143 hashes up front so
+    # the workers only do the sighash and signature work
+    tx.prefetch_inputs()
+    if tx.segwit:
+        tx.hash_prevouts()
+        tx.hash_outputs()
+    if executor is None:
+        return dict(_verify_input_chunk(tx, indices))
+    pending = {
+        executor.submit(_verify_input_chunk, tx, indices[i : i + chunk_size])
+        for i in range(0, len(indices), chunk_size)
+    }
+    report = {}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            for input_index, result in future.result():
+                report[input_index] = result
+                if not result:
+                    # stop early, anything not yet started is dropped
+                    for other in pending:
+                        other.cancel()
+                    return report
+    return report
+
 
 class TxIn:
     def __init__(self, prev_tx, prev_index, script_sig=None, sequence=0xFFFFFFFF):
@@ -613,15 +1198,22 @@ class TxIn:
 
     def serialize(self):
         """Returns the byte serialization of the transaction input"""
-        # serialize prev_tx, little endian
-        result = self.prev_tx[::-1]
-        # serialize prev_index, 4 bytes, little endian
-        result += int_to_little_endian(self.prev_index, 4)
-        # serialize the script_sig
-        result += self.script_sig.serialize()
-        # serialize sequence, 4 bytes, little endian
-        result += int_to_little_endian(self.sequence, 4)
-        return result
+        return b"".join(
+            (
+                # serialize prev_tx, little endian
+                self.prev_tx[::-1],
+                # serialize prev_index, 4 bytes, little endian
+                int_to_little_endian(self.prev_index, 4),
+                # serialize the script_sig
+                self.script_sig.serialize(),
+                # serialize sequence, 4 bytes, little endian
+                int_to_little_endian(self.sequence, 4),
+            )
+        )
+
+    def serialize_witness(self):
+        """Returns the byte serialization of the witness of this input"""
+        return self.witness.serialize()
 
     def fetch_tx(self, network="mainnet"):
         return TxFetcher.fetch(self.prev_tx.hex(), network=network)
@@ -715,7 +1307,196 @@ class TxOut:
     def serialize(self):
         """Returns the byte serialization of the transaction output"""
         # serialize amount, 8 bytes, little endian
-        result = int_to_little_endian(self.amount, 8)
-        # serialize the script_pubkey
-        result += self.script_pubkey.serialize()
-        return result
+        # then the script_pubkey
+        return int_to_little_endian(self.amount, 8) + self.script_pubkey.serialize()
+
+
+class LazyTxIn(TxIn):
+    """A TxIn that lives in a buffer (see Tx.parse_buffer).
+    The fields are decoded the first time they're accessed and the input
+    serializes straight from the buffer until one of them is changed
+    or a mutable field (script_sig or witness) is handed out."""
+
+    def __init__(self, buf, offset):
+        self._buf = buf
+        self._offset = offset
+        # prev_tx (32 bytes) and prev_index (4 bytes) come before the script_sig
+        script_sig_length, script_sig_start = read_varint_at(buf, offset + 36)
+        self._script_sig_end = script_sig_start + script_sig_length
+        # sequence is the last 4 bytes
+        self._end = self._script_sig_end + 4
+        # where the witness is in the buffer, Tx.parse_buffer sets this
+        self._witness_span = None
+        # decoded or replaced fields
+        self._fields = {}
+        self._dirty = False
+        self._witness_dirty = False
+        self._value = None
+        self._script_pubkey = None
+
+    def _get(self, name, decode):
+        if name not in self._fields:
+            self._fields[name] = decode()
+        return self._fields[name]
+
+    def _set(self, name, value):
+        self._fields[name] = value
+        if name == "witness":
+            self._witness_dirty = True
+        else:
+            self._dirty = True
+
+    @property
+    def prev_tx(self):
+        # prev_tx is 32 bytes, little endian
+        return self._get(
+            "prev_tx", lambda: bytes(self._buf[self._offset : self._offset + 32])[::-1]
+        )
+
+    @prev_tx.setter
+    def prev_tx(self, value):
+        self._set("prev_tx", value)
+
+    @property
+    def prev_index(self):
+        # prev_index is 4 bytes, little endian, interpret as int
+        start = self._offset + 32
+        return self._get(
+            "prev_index", lambda: little_endian_to_int(self._buf[start : start + 4])
+        )
+
+    @prev_index.setter
+    def prev_index(self, value):
+        self._set("prev_index", value)
+
+    @property
+    def sequence(self):
+        # sequence is 4 bytes, little-endian, interpret as int
+        start = self._script_sig_end
+        return self._get(
+            "sequence", lambda: little_endian_to_int(self._buf[start : start + 4])
+        )
+
+    @sequence.setter
+    def sequence(self, value):
+        self._set("sequence", value)
+
+    @property
+    def script_sig(self):
+        if "script_sig" not in self._fields:
+            coinbase_mode = (
+                self.prev_tx == b"\x00" * 32 and self.prev_index == 0xFFFFFFFF
+            )
+            raw = self._buf[self._offset + 36 : self._script_sig_end]
+            self._fields["script_sig"] = Script.parse(BytesIO(raw), coinbase_mode)
+            # the caller can change the script in place
+            self._dirty = True
+        return self._fields["script_sig"]
+
+    @script_sig.setter
+    def script_sig(self, value):
+        self._set("script_sig", value)
+
+    @property
+    def witness(self):
+        if "witness" not in self._fields:
+            if self._witness_span is None:
+                self._fields["witness"] = Witness()
+            else:
+                start, end = self._witness_span
+                self._fields["witness"] = Witness.parse(BytesIO(self._buf[start:end]))
+            # the caller can change the witness in place
+            self._witness_dirty = True
+        return self._fields["witness"]
+
+    @witness.setter
+    def witness(self, value):
+        self._set("witness", value)
+
+    def serialize(self):
+        """Returns the byte serialization of the transaction input"""
+        if self._dirty:
+            return super().serialize()
+        return bytes(self._buf[self._offset : self._end])
+
+    def __getstate__(self):
+        # a memoryview can't be pickled, so keep just the bytes of this
+        # input and of its witness after them, with the offsets moved
+        state = self.__dict__.copy()
+        start = self._offset
+        buf = bytes(self._buf[start : self._end])
+        if self._witness_span is not None:
+            witness_start, witness_end = self._witness_span
+            state["_witness_span"] = (len(buf), len(buf) + witness_end - witness_start)
+            buf += bytes(self._buf[witness_start:witness_end])
+        state["_buf"] = buf
+        state["_offset"] = 0
+        state["_script_sig_end"] = self._script_sig_end - start
+        state["_end"] = self._end - start
+        return state
+
+    def serialize_witness(self):
+        """Returns the byte serialization of the witness of this input"""
+        if self._witness_dirty or self._witness_span is None:
+            return super().serialize_witness()
+        start, end = self._witness_span
+        return bytes(self._buf[start:end])
+
+
+class LazyTxOut(TxOut):
+    """A TxOut that lives in a buffer (see Tx.parse_buffer).
+    The amount and ScriptPubKey are decoded the first time they're accessed
+    and the output serializes straight from the buffer until one of them
+    is changed or the ScriptPubKey is handed out."""
+
+    def __init__(self, buf, offset):
+        self._buf = buf
+        self._offset = offset
+        # amount is 8 bytes and comes before the script_pubkey
+        script_pubkey_length, script_pubkey_start = read_varint_at(buf, offset + 8)
+        self._end = script_pubkey_start + script_pubkey_length
+        self._amount = None
+        self._script_pubkey = None
+        self._dirty = False
+
+    @property
+    def amount(self):
+        if self._amount is None:
+            # amount is 8 bytes, little endian, interpret as int
+            self._amount = little_endian_to_int(
+                self._buf[self._offset : self._offset + 8]
+            )
+        return self._amount
+
+    @amount.setter
+    def amount(self, value):
+        self._amount = value
+        self._dirty = True
+
+    @property
+    def script_pubkey(self):
+        if self._script_pubkey is None:
+            raw = self._buf[self._offset + 8 : self._end]
+            self._script_pubkey = ScriptPubKey.parse(BytesIO(raw))
+            # the caller can change the script in place
+            self._dirty = True
+        return self._script_pubkey
+
+    @script_pubkey.setter
+    def script_pubkey(self, value):
+        self._script_pubkey = value
+        self._dirty = True
+
+    def __getstate__(self):
+        # a memoryview can't be pickled, so keep just the bytes of this output
+        state = self.__dict__.copy()
+        state["_buf"] = bytes(self._buf[self._offset : self._end])
+        state["_offset"] = 0
+        state["_end"] = self._end - self._offset
+        return state
+
+    def serialize(self):
+        """Returns the byte serialization of the transaction output"""
+        if self._dirty:
+            return super().serialize()
+        return bytes(self._buf[self._offset : self._end])
@@ -6,13 +6,16 @@ import sys
 from cmd import Cmd
 from getpass import getpass
 from itertools import combinations
-from os import environ
+from os import cpu_count, environ, path
 from platform import platform
-from pkg_resources import DistributionNotFound, get_distribution
 
 import buidl  # noqa: F401 (used below with pkg_resources for versioning)
 from buidl.blinding import blind_xpub, secure_secret_path
-from buidl.descriptor import P2WSHSortedMulti, parse_any_key_record
+from buidl.descriptor import (
+    is_valid_xfp_hex,
+    P2WSHSortedMulti,
+    parse_any_key_record,
+)
 from buidl.hd import (
     calc_num_valid_seedpicker_checksums,
     calc_valid_seedpicker_checksums,
@@ -21,7 +24,13 @@ from buidl.hd import (
     DEFAULT_P2WSH_PATH,
 )
 from buidl.libsec_status import is_libsec_enabled
-from buidl.mnemonic import BIP39
+from buidl.mnemonic import BIP39, mnemonic_to_bytes
+from buidl.recovery import (
+    mask_candidates,
+    PassphraseRecovery,
+    typo_candidates,
+    wordlist_candidates,
+)
 from buidl.shamir import ShareSet
 from buidl.psbt import MixedNetwork, PSBT
 
@@ -68,6 +77,9 @@ def print_red(string):
 
 
 def _get_buidl_version():
+    # pkg_resources is slow to import, so only when it's needed
+    from pkg_resources import DistributionNotFound, get_distribution
+
     try:
         return get_distribution("buidl").version
     except DistributionNotFound:
@@ -368,6 +380,104 @@ def _print_footgun_warning(custom_str=""):
     print_blue("\n".join(to_print) + "\n")
 
 
+#####################################################################
+# Passphrase Recovery
+#####################################################################
+
+
+def _get_bip39_mnemonic():
+    readline.parse_and_bind("tab: complete")
+    old_completer = readline.get_completer()
+    completer = WordCompleter(wordlist=BIP39)
+    readline.set_completer(completer.complete)
+
+    bip39_prompt = blue_fg("Enter your full BIP39 seed phrase: ")
+    while True:
+        seed_phrase = input(bip39_prompt).strip()
+        try:
+            mnemonic_to_bytes(seed_phrase)
+        except Exception as e:
+            print_red(f"Invalid mnemonic: {e}")
+            continue
+
+        readline.set_completer(old_completer)
+        return seed_phrase
+
+
+def _get_passphrase_recovery(mnemonic):
+    target_prompt = blue_fg(
+        "Enter the wallet's master fingerprint, an xpub key record, an xpub or a single key address: "
+    )
+    while True:
+        target = input(target_prompt).strip()
+        try:
+            if is_valid_xfp_hex(target):
+                return PassphraseRecovery(mnemonic, fingerprint=target)
+            if target.startswith("["):
+                # the key record has the master fingerprint, which is the
+                #  quickest to check
+                key_record = parse_any_key_record(key_record_str=target)
+                return PassphraseRecovery(mnemonic, fingerprint=key_record["xfp"])
+            if target[1:4] == "pub":
+                if HDPublicKey.parse(target).depth == 0:
+                    return PassphraseRecovery(mnemonic, xpub=target)
+                print_yellow("This xpub isn't a master xpub, so we need its path.")
+                return PassphraseRecovery(
+                    mnemonic, xpub=target, path=_get_path_string()
+                )
+            recovery = PassphraseRecovery(mnemonic, address=target)
+            if not _get_bool(
+                prompt=f"Look for the address at {recovery.path}?", default=True
+            ):
+                recovery = PassphraseRecovery(
+                    mnemonic, address=target, path=_get_path_string()
+                )
+            return recovery
+        except Exception as e:
+            print_red(f"Could not use {target}: {e}")
+
+
+def _get_passphrase_candidates():
+    while True:
+        kind = _get_string(
+            "Try [t]ypos of a passphrase, a [m]ask or a [w]ordlist file?", default="t"
+        )
+        if kind in ("t", "typos"):
+            base = getpass(prompt=blue_fg("Enter the passphrase you remember: "))
+            max_typos = _get_int(
+                "How many typos could it have?", default=1, minimum=1, maximum=2
+            )
+            return typo_candidates(base, max_typos=max_typos)
+        if kind in ("m", "mask"):
+            mask = input(
+                blue_fg(
+                    "Enter the mask (?l ?u ?d ?s ?a for a lowercase letter, uppercase letter, digit, symbol or any, ?? for ?): "
+                )
+            )
+            try:
+                return mask_candidates(mask)
+            except ValueError as e:
+                print_red(e)
+                continue
+        if kind in ("w", "wordlist"):
+            filename = input(
+                blue_fg("Enter the wordlist file (one candidate per line): ")
+            ).strip()
+            if not path.isfile(filename):
+                print_red(f"{filename} is not a file")
+                continue
+            return wordlist_candidates(filename)
+        print_red("Please choose t, m or w")
+
+
+def _print_recovery_progress(recovery):
+    print(
+        f"\r{recovery.tested} candidates tried ({recovery.rate:.1f}/s)",
+        end="",
+        flush=True,
+    )
+
+
 #####################################################################
 # Command Line App Code Starts Here
 #####################################################################
@@ -414,20 +524,16 @@ class MultiWallet(Cmd):
             use_default_checksum = True
 
         if use_default_checksum:
-            # This will be VERY fast
             last_word = next(valid_checksums_generator)
         else:
             num_valid_seedpicker_checksums = calc_num_valid_seedpicker_checksums(
                 num_first_words=len(first_words.split())
             )
 
-            to_print = f"Generating the {num_valid_seedpicker_checksums} valid checksum words for this seed phrase"
-            if not is_libsec_enabled():
-                to_print += " (this is ~10x faster if you install libsec)"
-            to_print += ":\n"
-            print_yellow(to_print)
+            print_yellow(
+                f"The {num_valid_seedpicker_checksums} valid checksum words for this seed phrase:\n"
+            )
 
-            # This is slow, but will display progress in a UX-friendly way
             valid_checksum_words = []
             line = ""
             for i, word in enumerate(valid_checksums_generator):
@@ -695,6 +801,42 @@ class MultiWallet(Cmd):
         prompt = f"You will need {k} of these {n} share phrases{additional} to recover your seed phrase:\n\n{share_mnemonics}"
         print_green(prompt)
 
+    def do_recover_passphrase(self, arg):
+        """Find a forgotten BIP39 passphrase by trying candidates against the wallet's fingerprint, xpub or an address"""
+        mnemonic = _get_bip39_mnemonic()
+        recovery = _get_passphrase_recovery(mnemonic)
+        candidates = _get_passphrase_candidates()
+        workers = _get_int(
+            prompt="How many processes should try candidates?",
+            default=cpu_count() or 1,
+            minimum=1,
+        )
+        checkpoint = input(
+            blue_fg("File to save progress to and resume from (blank for none): ")
+        ).strip()
+
+        print_yellow("Trying candidates (Ctrl-C to stop):")
+        try:
+            passphrase = recovery.search(
+                candidates,
+                workers=workers,
+                checkpoint=checkpoint or None,
+                progress=_print_recovery_progress,
+            )
+        except KeyboardInterrupt:
+            print_red(f"\nStopped after {recovery.tested} candidates")
+            return
+        except (OSError, ValueError) as e:
+            print_red(f"\n{e}")
+            return
+        print()
+        if passphrase is None:
+            print_red(f"None of the {recovery.tested} candidates is the passphrase")
+        else:
+            print_green(
+                f"Found the passphrase after {recovery.tested} candidates: {passphrase}"
+            )
+
     def do_validate_address(self, arg):
         """Verify receive addresses for a multisig wallet using output descriptors (from Specter-Desktop)"""
         p2wsh_sortedmulti_obj = _get_p2wsh_sortedmulti()
@@ -720,14 +862,14 @@ class MultiWallet(Cmd):
 
         to_print = f"{p2wsh_sortedmulti_obj.m_of_n} Multisig {'Change' if is_change else 'Receive'} Addresses"
         if not is_libsec_enabled():
-            to_print += "\n(this is ~100x faster if you install libsec)"
+            to_print += "\n(this is ~10x faster if you install libsec)"
         print_yellow(to_print + ":")
-        for cnt in range(limit):
-            offset_to_use = offset + cnt
-            address = p2wsh_sortedmulti_obj.get_address(
-                is_change=is_change,
-                offset=offset_to_use,
-            )
+        addresses = p2wsh_sortedmulti_obj.get_addresses(
+            start=offset,
+            count=limit,
+            is_change=is_change,
+        )
+        for offset_to_use, address in enumerate(addresses, offset):
             print_green(f"#{offset_to_use}: {address}")
 
     def do_sign_transaction(self, arg):
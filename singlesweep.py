@@ -5,7 +5,6 @@ import sys
 from cmd import Cmd
 from getpass import getpass
 from platform import platform
-from pkg_resources import DistributionNotFound, get_distribution
 
 import buidl  # noqa: F401 (used below with pkg_resources for versioning)
 from buidl.ecc import PrivateKey
@@ -55,6 +54,9 @@ def print_red(string):
 
 
 def _get_buidl_version():
+    # pkg_resources is slow to import, so only when it's needed
+    from pkg_resources import DistributionNotFound, get_distribution
+
     try:
         return get_distribution("buidl").version
     except DistributionNotFound:
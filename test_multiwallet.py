@@ -151,6 +151,35 @@ class MultiwalletTest(unittest.TestCase):
         self.expect("1-of-2 Multisig Receive Addresses")
         self.expect(receive_addr)
 
+    def test_recover_passphrase(self):
+        mnemonic = "abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon abandon about"
+        # the master fingerprint with the passphrase Hodl42
+        fingerprint = "dc124d9a"
+
+        self.child.sendline("recover_passphrase")
+        self.expect("Enter your full BIP39 seed phrase")
+
+        self.child.sendline(mnemonic)
+        self.expect("master fingerprint")
+
+        self.child.sendline(fingerprint)
+        self.expect("Try [t]ypos of a passphrase, a [m]ask or a [w]ordlist file?")
+
+        self.child.sendline("t")
+        self.expect("Enter the passphrase you remember")
+
+        self.child.sendline("hodl42")
+        self.expect("How many typos could it have?")
+
+        self.child.sendline("1")
+        self.expect("How many processes should try candidates?")
+
+        self.child.sendline("1")
+        self.expect("File to save progress to and resume from")
+
+        self.child.sendline("")
+        self.expect("Found the passphrase after 2 candidates: Hodl42")
+
     def test_change_addr(self):
         account_map = "wsh(sortedmulti(1,[aa917e75/48h/1h/0h/2h]tpubDEZRP2dRKoGRJnR9zn6EoLouYKbYyjFsxywgG7wMQwCDVkwNvoLhcX1rTQipYajmTAF82kJoKDiNCgD4wUPahACE7n1trMSm7QS8B3S1fdy/0/*,[2553c4b8/48h/1h/0h/2h]tpubDEiNuxUt4pKjKk7khdv9jfcS92R1WQD6Z3dwjyMFrYj2iMrYbk3xB5kjg6kL4P8SoWsQHpd378RCTrM7fsw4chnJKhE2kfbfc4BCPkVh6g9/0/*))#t0v98kwu"
         change_addr = "tb1qjcsz3nmscxdecksnrn5k9dxrj0g3f7xkuclk53aqu33lg06r0cks5l8ew8"